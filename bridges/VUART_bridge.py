@@ -27,6 +27,7 @@ The VUART_bridge class allows to connect with WR devices over Etherbone or PCI b
 
 # System imports
 import re
+import sys
 import time
 from subprocess import check_output
 
@@ -34,8 +35,9 @@ from subprocess import check_output
 from bridges.consolebridge import ConsoleBridge
 from bridges.ethbone import EthBone
 from core.p7sException import *
-from bridges.sdb import SDBNode
+from bridges.sdb import SDBNode, SDBCache
 from core.gendrvr import *
+from core.gendrvr import _monotonic
 
 
 class VUART_bridge(ConsoleBridge):
@@ -60,6 +62,11 @@ class VUART_bridge(ConsoleBridge):
     VUART_RDY_MSK = 0x100
     VUART_RX_CNT_MSK = 0x1FFFE00
     VUART_RX_DAT_MKS = 0xFF
+    # Prompt that ends the output of a command
+    VUART_PROMPT = b'wrc#'
+    # Min/max time (sec) between two polls of the RX FIFO
+    VUART_POLL_MIN = 0.0002
+    VUART_POLL_MAX = 0.02
     VUART_OFFSET = None
     # Regular expression for a valid ip/mask
     valid_ip = r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$"
@@ -68,8 +75,12 @@ class VUART_bridge(ConsoleBridge):
 
     # Max timeout value (in seconds)
     MAX_TIMEOUT = 5
+    # Max time (sec) to wait for the output of flushInput() and the periodic commands
+    SHORT_TIMEOUT = 0.5
+    # Returned by sendCommand() when the TX FIFO does not get ready
+    NOT_READY = 'Error: virtual UART is not ready'
 
-    def __init__(self, interface, port, verbose=False):
+    def __init__(self, interface, port, verbose=False, session=None, sdb_refresh=False):
         '''
         Constructor
 
@@ -78,6 +89,9 @@ class VUART_bridge(ConsoleBridge):
             port (str) : Port number or IP/mask. Examples: "01:00.0" for pci, and
             "192.168.1.1" for ethernet.
             verbose (bool) : Enables verbose output
+            session (EBSession) : Etherbone session shared with other devices. If it
+            is given the device is taken from (and left in) the session cache.
+            sdb_refresh (bool) : Ignore the SDB cache and parse again the device.
 
         Raises:
             BadData exception if any of the input parameters are not valid.
@@ -97,6 +111,8 @@ class VUART_bridge(ConsoleBridge):
         #self.port = 'upd/10.2.7.185'
         self.bus = None
         self.verbose = verbose
+        self.session = session
+        self.sdb_refresh = sdb_refresh
 
         
     def open(self):
@@ -112,7 +128,10 @@ class VUART_bridge(ConsoleBridge):
 
         if self.interface == 'eth':
             try:
-                self.bus = EthBone(self.port, self.verbose)
+                if self.session is not None:
+                    self.bus = self.session.get(self.port, self.verbose)
+                else:
+                    self.bus = EthBone(self.port, self.verbose)
             except BusCritical as e:
             #except Exception as e:
                 #print(e)
@@ -122,16 +141,12 @@ class VUART_bridge(ConsoleBridge):
         elif self.interface == 'pci':
             raise Error(1, "PCI bus not implemented")
 
-        # Look for VUART address in the sdb bus
+        # Look for VUART address in the sdb bus (cached from previous runs)
         if self.verbose: print('Scanning SDB bus...')
-        sdb = SDBNode(bus=self.bus, base=None)
-        #sdb = SDBNode(bus=self.bus, base=None, debug=self.verbose)
-        if self.verbose: print('  set sdb node')
-        sdb.base = sdb.scan()
-        sdb.parse()
+        sdb = SDBCache().get(self.bus, self.port, refresh=self.sdb_refresh, lazy=True)
         if self.verbose: print('  finding vuart offset...')
         #print(sdb.findProduct(self.VENDOR_ID_CERN, self.WR_UART_ID))
-        self.VUART_OFFSET = sdb.findProduct(self.VENDOR_ID_CERN, self.WR_UART_ID)[0][1] # Check this assignment
+        self.VUART_OFFSET = sdb.findProduct(self.VENDOR_ID_CERN, self.WR_UART_ID, first=True)[0][1] # Check this assignment
         if self.verbose:
             #print("VUART address is 0x%x" % (self.VUART_OFFSET))
             print("  vuart at 0x{0}".format(self.VUART_OFFSET))
@@ -154,6 +169,12 @@ class VUART_bridge(ConsoleBridge):
         Raises:
             ConsoleError : When the connection fails closing.
         '''
+        if self.session is not None:
+            # The session keeps the device opened for the next user
+            if self.bus is not None:
+                self.session.release(self.port)
+                self.bus = None
+            return
         try:
             self.bus.close()
         except BusCritical as e:
@@ -174,10 +195,10 @@ class VUART_bridge(ConsoleBridge):
             print("Erasing old content of rx buffer in the VUART")
 
         #self.sendCommand("\x1b\r")
-        self.sendCommand("\x1b")
+        self.sendCommand("\x1b", self.SHORT_TIMEOUT)
 
         
-    def sendCommand(self, cmd):
+    def sendCommand(self, cmd, timeout=None):
         '''
         Method to pass a command to the Virtual UART module of a WR Device
 
@@ -194,6 +215,7 @@ class VUART_bridge(ConsoleBridge):
 
         Args:
             cmd (str) : Command
+            timeout (float) : Max time (sec) to wait for the prompt (MAX_TIMEOUT by default)
 
         Returns:
             A bytearray with the output of the command sent to the WR Device.
@@ -206,56 +228,31 @@ class VUART_bridge(ConsoleBridge):
         
         #bytes = []
         
-        # Wait for ready bit
-        timeout_cnt = 0
-        ready = self.bus.read(self.VUART_OFFSET+self.VUART_TX_REG) & self.VUART_RDY_MSK
-        if self.verbose: print('  ready = {0}'.format(ready))
-        
-        while not ready:
-            if self.verbose: print('not ready...')
-            time.sleep(1)
-            timeout_cnt += 1
-            if timeout_cnt >= self.MAX_TIMEOUT:
-                #raise Error()  # virtual uart is not ready
-                return 'Error: virtual UART is not ready' # virtual uart is not ready
-
         bytes = bytearray(cmd.encode())
         bytes.append(13) # insert \r
         #try:
-        for b in bytes:
-            if self.verbose: print('  writing command byte {0}'.format(b))
-            self.bus.devwrite(None, offset=self.VUART_OFFSET+self.VUART_TX_REG, width=4, datum=b)
-            time.sleep(0.0008)
-        time.sleep(0.5)
+        if not self.transmit(bytes):
+            #raise Error()  # virtual uart is not ready
+            return self.NOT_READY # virtual uart is not ready
         if self.verbose: print('  finished writing command to bus')
 
 
-        # reset bytes for read
-        bytes = bytearray()
-        rx_raw = self.bus.read(self.VUART_OFFSET+self.VUART_RX_REG)
-        if self.verbose: print('  rx_raw = {0}'.format(rx_raw))
-        if self.verbose: print('  ready mask = '.format(rx_raw & self.VUART_RDY_MSK))
-        if rx_raw & self.VUART_RDY_MSK:
-            cnt = (rx_raw & self.VUART_RX_CNT_MSK) >> 9
-            if self.verbose: print('  count = {0}'.format(cnt))
-            
-            while cnt > 0:
-                bytes.append(rx_raw&self.VUART_RX_DAT_MKS)
-                rx_raw = self.bus.read(self.VUART_OFFSET+self.VUART_RX_REG)
-                cnt -= 1
-            if self.verbose: print('  finished reading')
+        # read the output until the prompt
+        bytes = self.read_until(self.VUART_PROMPT, timeout)
+        if self.verbose: print('  finished reading')
             
         # The output from VUART contains the sent command twice, remove it
         if self.verbose: print('FULL BYTES = \n{0}\n'.format(bytes))
-        if 'wrc#'.encode() in bytes:
+        if self.VUART_PROMPT in bytes:
             r_bytes = bytes.index('\n'.encode())+1
             #print('return stripped bytes from sendCommand()')
             # remove first and last bits and decode
             # r_bytes is the index after the command echo
-            # -6 is the ending "\r\nwrc#"
+            # e_bytes is the beginning of the ending "\r\nwrc#"
             # can't decode 0x81 - adding ignore
-            return bytes[r_bytes:-6].decode('utf-8', errors='ignore')
-            #return bytes[r_bytes:-6]
+            e_bytes = bytes.rfind(self.VUART_PROMPT)
+            if bytes[:e_bytes].endswith(b'\r\n'): e_bytes -= 2
+            return bytes[r_bytes:max(r_bytes, e_bytes)].decode('utf-8', errors='ignore')
         
         else:
             #print('return all bytes from sendCommand()')
@@ -265,6 +262,127 @@ class VUART_bridge(ConsoleBridge):
         #   raise e
 
 
+    def transmit(self, data):
+        '''
+        Method to push bytes in the TX register of the Virtual UART
+
+        The TX register holds a single byte and the ready bit only tells that
+        it is free again, so the command can not be sent with a FIFO block
+        write. The ready bit is checked once before the first byte, then it
+        is read in the same round trip as each write (the read is queued
+        right after it) and it is only polled again when the LM32 has not
+        taken the byte yet.
+
+        Args:
+            data (bytearray) : Bytes to send
+
+        Returns:
+            False if the Virtual UART was not ready before MAX_TIMEOUT, True otherwise.
+        '''
+        tx_reg = self.VUART_OFFSET+self.VUART_TX_REG
+        if not self.wait_tx_ready():
+            return False
+        for i, b in enumerate(data):
+            if self.verbose: print('  writing command byte {0}'.format(b))
+            written = self.bus.write_async(tx_reg, b)
+            if i+1 == len(data):
+                written.result()
+                break
+            ready = self.bus.read_async(tx_reg)
+            written.result()
+            if not ready.result() & self.VUART_RDY_MSK and not self.wait_tx_ready():
+                return False
+        return True
+
+
+    def read_until(self, prompt, timeout=None):
+        '''
+        Method to read the output of the Virtual UART until a prompt is found
+
+        The RX FIFO is polled starting every VUART_POLL_MIN seconds, the delay
+        is doubled (up to VUART_POLL_MAX) while nothing is received.
+
+        Args:
+            prompt (bytes) : String that ends the output
+            timeout (float) : Max time (sec) to wait for the prompt (MAX_TIMEOUT by default)
+
+        Returns:
+            A bytearray with the characters received (without the prompt on timeout).
+        '''
+        deadline = _monotonic()+(self.MAX_TIMEOUT if timeout is None else timeout)
+        data = bytearray()
+        delay = self.VUART_POLL_MIN
+        start = 0
+        while True:
+            chunk = self.receive()
+            if chunk:
+                data += chunk
+                if data.find(prompt, start) >= 0:
+                    break
+                start = max(0, len(data)-len(prompt)+1)
+                delay = self.VUART_POLL_MIN
+            if _monotonic() > deadline:
+                if self.verbose: print('  prompt not found before timeout')
+                break
+            if not chunk:
+                time.sleep(delay)
+                delay = min(2*delay, self.VUART_POLL_MAX)
+        return data
+
+
+    def receive(self):
+        '''
+        Method to drain the RX FIFO of the Virtual UART
+
+        The count of the first read gives the number of pending characters
+        which are read with a FIFO block read (incr=0). They are already in
+        the FIFO so all the words are valid, and the characters are taken
+        with a slice of the data byte of each word. The count of the last
+        word gives the characters received meanwhile.
+
+        Returns:
+            A bytearray with the characters received.
+        '''
+        rx_reg = self.VUART_OFFSET+self.VUART_RX_REG
+        data = bytearray()
+        rx_raw = self.bus.read(rx_reg)
+        if self.verbose: print('  rx_raw = {0}'.format(rx_raw))
+        if not rx_raw & self.VUART_RDY_MSK:
+            return data
+        data.append(rx_raw & self.VUART_RX_DAT_MKS)
+        # Characters in the FIFO (including the one just read)
+        pending = (rx_raw & self.VUART_RX_CNT_MSK) >> 9
+        if self.verbose: print('  count = {0}'.format(pending))
+
+        # Position of the data byte inside each word in host order
+        dat_pos = 0 if sys.byteorder == 'little' else 3
+        while pending > 1:
+            words = self.bus.devblockread_buffer(0, rx_reg, 4*(pending-1), incr=0)
+            data += words.tobytes()[dat_pos::4]
+            pending = (words[-1] & self.VUART_RX_CNT_MSK) >> 9
+        return data
+
+
+    def wait_tx_ready(self):
+        '''
+        Method to wait for the ready bit of the TX register
+
+        The register is polled with GenDrvr.wait_until, starting every
+        VUART_POLL_MIN seconds and doubling the delay up to VUART_POLL_MAX.
+
+        Returns:
+            False if the bit is not set before MAX_TIMEOUT, True otherwise.
+        '''
+        try:
+            self.bus.wait_until(self.VUART_OFFSET+self.VUART_TX_REG, self.VUART_RDY_MSK,
+                                timeout=self.MAX_TIMEOUT, poll_min=self.VUART_POLL_MIN,
+                                poll_max=self.VUART_POLL_MAX)
+        except BusTimeout:
+            if self.verbose: print('not ready...')
+            return False
+        return True
+
+
     def devwrite(self, bar, offset, width, datum):
         '''
         Method to write a register through EtherBone bus
@@ -78,10 +78,17 @@ import struct
 import math
 import platform
 import binascii
+import array
+import threading
+import select
+import functools
+import collections
+from concurrent.futures import Future
 from subprocess import check_output
 
 # Import common modules
 from core.gendrvr import *
+from core.gendrvr import _monotonic
 from core.p7sException import *
 
 EB_PROTOCOL_VERSION = 1
@@ -90,7 +97,28 @@ EB_BUS_MODEL        = [0x44,0x88][sys.maxsize > 2**32]
 EB_MEMORY_MODEL     = 0x0000
 EB_ABI_CODE         = ((EB_ABI_VERSION << 8) + EB_BUS_MODEL + EB_MEMORY_MODEL)
 
+## eb_data_t follows the bus model announced in EB_ABI_CODE (32 or 64 bits)
+eb_data_t           = [c_uint32, c_uint64][sys.maxsize > 2**32]
+eb_address_t        = [c_uint32, c_uint64][sys.maxsize > 2**32]
+
+## void (*eb_callback_t)(eb_user_data_t, eb_device_t, eb_operation_t, eb_status_t)
+EB_CALLBACK         = CFUNCTYPE(None, c_void_p, c_uint16, c_uint16, c_int)
+
+## int (*eb_descriptor_callback_t)(eb_user_data_t, eb_descriptor_t, uint8_t mode)
+EB_DESCRIPTOR_CALLBACK = CFUNCTYPE(c_int, c_void_p, c_int, c_uint8)
+EB_DESCRIPTOR_IN    = 0x01
+EB_DESCRIPTOR_OUT   = 0x02
+
 PYDIR = os.path.dirname(os.path.abspath(__file__))
+LIBETHERBONE = "%s/../lib/libetherbone.so" % PYDIR
+
+def eb_locked(func):
+     '''Decorator to serialize the calls to libetherbone, which is not thread-safe'''
+     @functools.wraps(func)
+     def wrapper(self, *args, **kwargs):
+          with self.lock:
+               return func(self, *args, **kwargs)
+     return wrapper
 
 def py_cb_func(user, dev, op, status):
      if status:
@@ -127,20 +155,38 @@ class EthBone(GenDrvr):
 
     EB_OK        = 0  # success
 
+    EB_CYCLE_WORDS    = 128  # Max number of operations packed in one cycle
+    EB_CYCLE_SCATTER  = 64   # Max number of non-contiguous writes in one cycle (one record each)
+    EB_PIPELINE_DEPTH = 8    # Max number of cycles in flight at the same time
+    EB_CYCLE_TIMEOUT  = 5    # Seconds to wait for in-flight cycles
+    EB_POLL_US        = 1000 # Max time (us) a socket run can block the other calls
 
-    def __init__(self, LUN, verbose=False):
+    blockread = True
+    blockwrite = True
+
+    def __init__(self, LUN, verbose=False, session=None):
         '''Constructor
 
         Args:
             LUN : the logical unit, in etherbone we use a netaddress format given by:
             show_dbg : enables debug info
+            session : EBSession that provides the etherbone socket. If None a private
+            session is created (and closed with the device)
         '''
 
         #if verbose: print("LD_LIBRARY_PATH=%s" % (os.getenv('LD_LIBRARY_PATH')))
         
         #self.load_lib("/home/pdaq/wr-len/lib/libetherbone.so.1.0_old")
 
-        self.load_lib("%s/../lib/libetherbone.so" % PYDIR)
+        if session is None:
+            self.load_lib(LIBETHERBONE)
+            session = EBSession(self.libname, verbose=verbose)
+            self.own_session = True
+        else:
+            self.lib = session.lib
+            self.libname = session.libname
+            self.own_session = False
+        self.session = session
         #self.load_lib("%s/../lib/libetherbone.so.1.0_x86_64" % PYDIR)
 
         # building tags from https://ohwr.org/project/etherbone-core.git
@@ -155,10 +201,18 @@ class EthBone(GenDrvr):
 
         
         ##Create empty ptr on structure used by ethbone
-        self.socket    = c_uint(0)
         self.device    = c_uint(0)
         self.operation = c_uint(0)
         self.wcrc      = 0
+        self.wrate     = 0.0 # Throughput (MB/s) of the last block write
+
+        ##The calls on this device are serialized by its own lock, and the
+        ##calls to libetherbone (shared socket) by the session lock
+        self.lock      = threading.RLock()
+
+        ##Typed prototypes for the calls done once per word in the block functions
+        self.cycle_read  = CFUNCTYPE(None, c_uint, eb_address_t, c_uint8, POINTER(eb_data_t))(('eb_cycle_read', self.lib))
+        self.cycle_write = CFUNCTYPE(None, c_uint, eb_address_t, c_uint8, eb_data_t)(('eb_cycle_write', self.lib))
         
         ##Setup arguments
         self.LUN = LUN
@@ -183,22 +237,17 @@ class EthBone(GenDrvr):
         self.close()
 
         
+    @eb_locked
     def open(self, LUN):
         '''Open the device and map to the FPGA bus
         '''
-        status = self.lib.eb_socket_open(EB_ABI_CODE,
-                                         0,
-                                         self.addr_width|self.data_width,
-                                         self.getPtrData(self.socket)
-                                         )
-        if self.verbose: print('  socket status = {0}'.format(self.eb_status(status)))
-        if status:
-             raise BusCritical('failed to open Etherbone socket: %s' % (self.eb_status(status)))
+        if not self.session.isOpen():
+            self.session.open()
 
         if self.verbose:
              print("Connecting to '%s' with %d retry attempts..." % (LUN, self.attempts))
         """
-        print(self.getPtrData(self.socket),
+        print(self.getPtrData(self.session.socket),
               LUN,
               self.EB_ADDRX|self.EB_DATAX,
               self.attempts,
@@ -206,12 +255,13 @@ class EthBone(GenDrvr):
               )
         """
         # LUN.encode('ascii') required for py3 compatibility
-        status = self.lib.eb_device_open(self.socket,
-                                         LUN.encode('ascii'),
-                                         self.EB_ADDRX|self.EB_DATAX,
-                                         self.attempts,
-                                         self.getPtrData(self.device)
-                                         )
+        with self.session.lock:
+            status = self.lib.eb_device_open(self.session.socket,
+                                             LUN.encode('ascii'),
+                                             self.EB_ADDRX|self.EB_DATAX,
+                                             self.attempts,
+                                             self.getPtrData(self.device)
+                                             )
         if self.verbose: print('  device status = {0}'.format(self.eb_status(status)))
         if status:
              #print('device status = {0}'.format(self.eb_status(status)))
@@ -220,16 +270,18 @@ class EthBone(GenDrvr):
         
     def close(self):
         '''Close the device and unmap
-        '''
-        if (self.device.value & 0xFFFF)==0xFFFF: return 0
 
-        status=self.lib.eb_device_close(self.device)
-        if status: raise BusCritical("Close device: %s\n" % (self.eb_status(status)))
-        self.device=c_uint(0)
+        The socket is only closed when the session is private to this device.
+        '''
+        with self.lock, self.session.lock:
+            if (self.device.value & 0xFFFF)!=0xFFFF:
+                status=self.lib.eb_device_close(self.device)
+                if status: raise BusCritical("Close device: %s\n" % (self.eb_status(status)))
+                self.device=c_uint(0xFFFF) ##EB_NULL so that a second close() is ignored
+            self.session.forget(self)
 
-        status=self.lib.eb_socket_close(self.socket)
-        if status: raise BusCritical("Close socket: %s\n" % (self.eb_status(status)))
-        self.socket=c_uint(0)
+        if self.own_session:
+            self.session.close()
 
         
     def enable_silent_close(self,enable=True):
@@ -238,12 +290,13 @@ class EthBone(GenDrvr):
         self.silent=enable
 
 
+    @eb_locked
     def devread(self, bar, offset, width):
-        '''Method that do a cycle read on the devices using ed_device_read()
-
-        Convenience methods which create single-operation cycles and it is
-        equivalent to: eb_cycle_open, eb_cycle_read, eb_cycle_close.
+        '''Method that do a single cycle read on the device
 
+        It is equivalent to eb_device_read(): eb_cycle_open, eb_cycle_read,
+        eb_cycle_close, but the reply is waited without holding the session,
+        so the other devices are not blocked meanwhile.
 
         Args:
             bar : BAR used by PCIe bus (Not used)
@@ -251,26 +304,20 @@ class EthBone(GenDrvr):
             width : data size (1, 2, or 4 bytes) => Must be 4 bytes
         '''
         address = offset
-
-        UINT32P = POINTER(c_uint32)
-        data = c_uint32(0xBADC0FFE)
-        pData = cast(addressof(data), UINT32P)
-
-        user_data=c_uint32(0)
-        cb=c_uint(0)
-
-
-        status=self.lib.eb_device_read(self.device,c_uint(address),self.format,pData,user_data,cb)
-        if self.debug: print("R@x%08X > 0x%08x" %(address, pData[0]))
-        if status: raise BusWarning('Bad Etherbone Read: %s' % (self.eb_status(status)))
-        return pData[0]
+        try:
+            datum = self._read_cycles([address])[0]
+        except BusWarning as e:
+            raise BusWarning('Bad Etherbone Read @0x%08x: %s' % (address, e))
+        if self.debug: print("R@x%08X > 0x%08x" %(address, datum))
+        return datum
 
 
+    @eb_locked
     def devwrite(self, bar, offset, width, datum):
-        ''' Method that do a cycle write on the devices using ed_device_write()
+        ''' Method that do a single cycle write on the device
 
-        Convenience methods which create single-operation cycles and it is
-        equivalent to: eb_cycle_open, eb_cycle_write, eb_cycle_close.
+        It is equivalent to eb_device_write(): eb_cycle_open, eb_cycle_write,
+        eb_cycle_close, and waits the acknowledge of the device like it.
 
         Args:
             bar : BAR used by PCIe bus (Not used)
@@ -281,24 +328,19 @@ class EthBone(GenDrvr):
         address = offset
         data = c_uint32(datum)
 
-        user_data = c_uint32(0)
-        cb = c_uint(0)
-
         if self.debug:
              print("W@x%08X < 0x%08x" %( address, datum))
-        status = self.lib.eb_device_write(self.device, c_uint(address), self.format, data, user_data, cb)
-        if status:
-             raise BusWarning('Bad Wishbone Write @0x%08x > 0x%08x : %s' % (address, datum, self.eb_status(status)))
+        try:
+            self._write_cycles([address], [data.value], silently=False)
+        except BusWarning as e:
+             raise BusWarning('Bad Wishbone Write @0x%08x > 0x%08x : %s' % (address, datum, e))
         return data
 
 
     def devblockread(self, bar, offset, bsize, incr=0x4):
         '''Method that do a multiple cycle-read to read a data block
 
-        WARNING: THE CALLBACK CALL OF THIS FUNCTION IS NOT WORKING AT THE MOMENT.
-
-        Call back:
-        http://stackoverflow.com/questions/7259794/how-can-i-get-methods-to-work-as-callbacks-with-python-ctypes
+        This is a wrapper around devblockread_buffer() that keeps returning a list.
 
         Args:
             bar : BAR used by PCIe bus (Not used)
@@ -310,43 +352,266 @@ class EthBone(GenDrvr):
         Returns:
             A list of 32bits words
         '''
-        UINT32P = POINTER(c_uint32)
-        cycle       = c_uint(0)
+        return self.devblockread_buffer(bar, offset, bsize, incr).tolist()
 
-        #user_data   = c_uint32(0xDEADBEEF)
-        #CBFUNC = CFUNCTYPE(None, c_uint16, c_uint16, c_uint16,c_int)
-        #cb          = CBFUNC(py_cb_func)
-        #pUData = cast(addressof(user_data), UINT32P)
 
-        dataVec = (c_uint32*(bsize/4))()
+    @eb_locked
+    def devblockread_buffer(self, bar, offset, bsize, incr=0x4):
+        '''Method that do a pipelined multiple cycle-read to read a data block
 
-        ldata=[]
-        addr=offset
-        i=0
-        status= self.lib.eb_cycle_open(self.device,0,0,self.getPtrData(cycle))
-        if status: raise BusWarning('Cycle open : 0x%x, %s' % (offset,self.eb_status(status)))
-        while i<bsize:
-            pData = cast(addressof(dataVec)+i, UINT32P)
-            self.lib.eb_cycle_read(cycle,addr,self.format,pData)
-            addr=addr+incr
-            i=i+4
-        status=self.lib.eb_cycle_close(cycle)
-        if status: raise BusWarning('Cycle close: %s' % (self.eb_status(status)))
+        The block is split in cycles of EB_CYCLE_WORDS reads, and up to
+        EB_PIPELINE_DEPTH of them are kept in flight at the same time. Each
+        eb_cycle_read() writes directly into a ctypes array which is returned
+        as a memoryview, so no python work is done per word.
+
+        Args:
+            bar : BAR used by PCIe bus (Not used)
+            offset : address at the device
+            bsize: The size in bytes of data to read (Should be multiply by 4)
+            incr: By default we increment the direction by 4 because we are reading 32bit words,
+            but if we want to read from a FIFO we should use incr=0x0
 
-        ###Convert the c_uint32 array to list of c_uint32
-        ldata=[]
-        for d in dataVec: ldata.append(d)
+        Returns:
+            A memoryview of 32bits words (format 'I') backed by the ctypes storage.
+            It can be wrapped with numpy.asarray() or converted with tolist().
+        '''
+        nwords = bsize//4
+        if incr:
+            words = self._read_cycles(range(offset, offset+nwords*incr, incr))
+        else:
+            words = self._read_cycles([offset]*nwords)
 
         ## Print the result if we are using debug
         if self.debug:
             addr=offset
-            for d in dataVec:
+            for d in words:
                 print("@x%08X > %8x" % (addr, d))
                 addr=addr+incr
 
-        return ldata
+        return words
+
+
+    @eb_locked
+    def read_many(self, addresses):
+        '''Read a list of unrelated 32b registers packed in a single cycle
+
+        Args:
+            addresses: list of addresses
+
+        Returns:
+            The list of values read (in the same order)
+        '''
+        return self._read_cycles(list(addresses)).tolist()
+
+
+    @eb_locked
+    def write_many(self, pairs):
+        '''Write a list of unrelated 32b registers packed in a single cycle
+
+        Args:
+            pairs: list of (address, value) tupples
+        '''
+        pairs = list(pairs)
+        self._write_cycles([addr for addr, datum in pairs],
+                           array.array('I', [datum for addr, datum in pairs]),
+                           self.EB_CYCLE_SCATTER)
+
+
+    def _read_cycles(self, addresses):
+        '''Read the addresses in pipelined cycles of EB_CYCLE_WORDS operations
+
+        Args:
+            addresses: indexable sequence of addresses
+
+        Returns:
+            A memoryview of 32bits words (format 'I') backed by the ctypes storage
+        '''
+        nwords = len(addresses)
+        dataVec = (eb_data_t*nwords)()
+        base = addressof(dataVec)
+        DATAP = POINTER(eb_data_t)
+
+        inflight = []
+        try:
+            for first in range(0, nwords, self.EB_CYCLE_WORDS):
+                if len(inflight) >= self.EB_PIPELINE_DEPTH:
+                    self._wait_cycles(inflight[:1])
+                    inflight = inflight[1:]
+                with self.session.lock:
+                    cycle, cid = self._open_cycle(addresses[first])
+                    inflight.append(cid)
+                    last = min(first+self.EB_CYCLE_WORDS, nwords)
+                    for i in range(first, last):
+                        self.cycle_read(cycle, addresses[i], self.format,
+                                        cast(base+i*sizeof(eb_data_t), DATAP))
+                    self._close_cycle(cycle)
+            self._wait_cycles(inflight)
+        except BaseException:
+            ## libetherbone may still write the replies into dataVec
+            self.session.orphan(inflight, dataVec)
+            raise
+
+        ## eb_data_t might be 64bits: keep a (strided) view on the low 32bits
+        words = memoryview(dataVec).cast('B').cast('I')
+        if sizeof(eb_data_t) == 8:
+            words = words[(sys.byteorder == 'big')::2]
+        return words
+
+
+    def _write_cycles(self, addresses, words, maxops=None, silently=None):
+        '''Write the words to the addresses in pipelined cycles
+
+        Args:
+            addresses: indexable sequence of addresses
+            words: indexable sequence of 32bits words (same length)
+            maxops: Max number of writes by cycle (EB_CYCLE_WORDS by default)
+            silently: close the cycles without acknowledge (self.silent by default)
+        '''
+        maxops = maxops or self.EB_CYCLE_WORDS
+        if silently is None: silently = self.silent
+        nwords = len(words)
+        inflight = []
+        try:
+            for first in range(0, nwords, maxops):
+                if len(inflight) >= self.EB_PIPELINE_DEPTH:
+                    self._wait_cycles(inflight[:1])
+                    inflight = inflight[1:]
+                with self.session.lock:
+                    cycle, cid = self._open_cycle(addresses[first])
+                    inflight.append(cid)
+                    last = min(first+maxops, nwords)
+                    for i in range(first, last):
+                        self.cycle_write(cycle, addresses[i], self.format, words[i])
+                    self._close_cycle(cycle, silently)
+            self._wait_cycles(inflight)
+        except BaseException:
+            self.session.orphan(inflight)
+            raise
+
+
+    def _open_cycle(self, offset):
+        '''Open a cycle that will report its completion to _cycle_done()
+
+        It must be called with the session lock held.
+
+        Returns:
+            A tupple with (cycle, cycle id) where the id is used by _wait_cycles()
+        '''
+        cycle = c_uint(0)
+        cid = self.session.next_cycle_id()
+        status = self.lib.eb_cycle_open(self.device, c_void_p(cid), self.session.cycle_cb, self.getPtrData(cycle))
+        if status: raise BusWarning('Cycle open : 0x%x, %s' % (offset,self.eb_status(status)))
+        self.session.cycles[cid] = None
+        return (cycle, cid)
+
+
+    def _close_cycle(self, cycle, silently=False):
+        '''Close (send) a cycle opened by _open_cycle()
+
+        Args:
+            cycle: cycle to close
+            silently: do not ask the device for write acknowledges
+
+        Raises:
+            BusWarning: if libetherbone could not close the cycle
+        '''
+        if silently:
+            status = self.lib.eb_cycle_close_silently(cycle)
+        else:
+            status = self.lib.eb_cycle_close(cycle)
+        if status: raise BusWarning('Cycle close: %s' % (self.eb_status(status)))
+
+
+    def _wait_cycles(self, cids):
+        '''Run the etherbone socket until all the given cycles are completed
+
+        The completed cycles are removed from the session. On timeout they
+        are left there: the caller must give them to EBSession.orphan()
+        with the buffers that libetherbone could still write.
+
+        Args:
+            cids: list of cycle ids returned by _open_cycle()
+
+        Raises:
+            BusWarning: if a cycle failed or did not complete on time
+        '''
+        cycles = self.session.cycles
+        pending = lambda: any(cycles[cid] is None for cid in cids)
+        deadline = _monotonic()+self.EB_CYCLE_TIMEOUT
+        while pending():
+            if _monotonic() > deadline:
+                raise BusWarning('Cycle timeout: %s' % (self.eb_status(-7)))
+            self.session.run(pending)
+        with self.session.lock:
+            status = [cycles.pop(cid) for cid in cids]
+        for st in status:
+            if st: raise BusWarning('Cycle close: %s' % (self.eb_status(st)))
+
+
+    @eb_locked
+    def devread_async(self, bar, offset, width):
+        '''Method that do a non-blocking cycle read
+
+        The cycle is completed by the session poll thread, so many
+        reads can be outstanding at the same time.
+        To use it from asyncio: await asyncio.wrap_future(bus.devread_async(...))
+
+        Args:
+            bar : BAR used by PCIe bus (Not used)
+            offset : address within bar
+            width : data size (1, 2, or 4 bytes) => Must be 4 bytes
+
+        Returns:
+            A concurrent.futures.Future with the 32bits word read.
+        '''
+        data = eb_data_t(0xBADC0FFE)
+        with self.session.lock:
+            cycle, cid = self._open_cycle(offset)
+            self.cycle_read(cycle, offset, self.format, pointer(data))
+            return self._submit(cycle, cid, offset, lambda: data.value & 0xFFFFFFFF)
+
+
+    @eb_locked
+    def devwrite_async(self, bar, offset, width, datum):
+        '''Method that do a non-blocking cycle write
 
+        Args:
+            bar : BAR used by PCIe bus (Not used)
+            offset : address within bar
+            width : data size (1, 2, or 4 bytes) => Must be 4 bytes
+            datum : data value that need to be written
+
+        Returns:
+            A concurrent.futures.Future completed (with None) when the device acknowledged the write.
+        '''
+        with self.session.lock:
+            cycle, cid = self._open_cycle(offset)
+            self.cycle_write(cycle, offset, self.format, datum)
+            return self._submit(cycle, cid, offset, lambda: None)
 
+
+    def _submit(self, cycle, cid, offset, result):
+        '''Close an asynchronous cycle and return the future tracking it
+
+        Args:
+            cycle, cid: as returned by _open_cycle()
+            offset: address used to describe the errors
+            result: function returning the value of the future once the cycle is done
+        '''
+        fut = Future()
+        entry = (fut, offset, result, _monotonic()+self.EB_CYCLE_TIMEOUT)
+        self.session.futures[cid] = entry
+        try:
+            self._close_cycle(cycle)
+        except BusException:
+            del self.session.futures[cid]
+            self.session.orphan([cid], entry)
+            raise
+        self.session.start_poll()
+        return fut
+
+
+    @eb_locked
     def devblockwrite(self, bar, offset, ldata, incr=0x4):
         '''Method that do a multiple cycle-writes to write a data block
 
@@ -358,31 +623,75 @@ class EthBone(GenDrvr):
             but if we want to write into a FIFO we should use incr=0x0
         '''
 
-        cycle       = c_uint(0)
-        user_data   = c_uint32(0)
-        cb          = 0 #NULL pointer
-
-
+        t0=time.time()
         addr=offset
-        status= self.lib.eb_cycle_open(self.device,user_data,cb,self.getPtrData(cycle))
-        if status: raise BusWarning('Cycle open : 0x%x, %s' % (offset,self.eb_status(status)))
+        words=array.array('I')
         for data in ldata:
             ##Chequear endianess de format
             if self.debug: print("@x%08X > %8x" % (addr, data))
-            self.lib.eb_cycle_write(cycle,addr,self.format,c_uint32(data))
-            self.wcrc=binascii.crc32(c_uint32(data), self.wcrc)
+            words.append(data & 0xFFFFFFFF)
             addr=addr+incr
-        if self.silent:
-            status=self.lib.eb_cycle_close_silently(cycle) #Close without asking acknowledgment of the device (faster)
+        ##A single cycle like eb_cycle_open/eb_cycle_write/eb_cycle_close
+        if incr:
+            self._write_cycles(range(offset, offset+len(words)*incr, incr), words, len(words))
         else:
-            status=self.lib.eb_cycle_close(cycle)
-        if status: raise BusWarning('Cycle close: %s' % (self.eb_status(status)))
+            self._write_cycles([offset]*len(words), words, len(words))
+        self.wcrc=binascii.crc32(words, self.wcrc)
+        self._log_rate(4*len(ldata), t0)
+
+        return 0;
+
 
+    @eb_locked
+    def devblockwrite_buffer(self, bar, offset, data, incr=0x4):
+        '''Method that do a pipelined multiple cycle-writes to write a contiguous buffer
+
+        The buffer is walked in cycles of EB_CYCLE_WORDS writes (up to
+        EB_PIPELINE_DEPTH in flight) and the running CRC is computed once
+        over the whole buffer, giving the same value as devblockwrite().
+
+        Args:
+            bar : BAR used by PCIe bus (Not used)
+            offset : address in the device
+            data : bytes, bytearray, array('I'), memoryview or list of 32bits words.
+            Raw bytes are taken as 32bits words in the host byte order.
+            incr: By default we increment the direction by 4 because we are writing 32bit words,
+            but if we want to write into a FIFO we should use incr=0x0
+        '''
+        if not isinstance(data, (bytes, bytearray, memoryview, array.array)):
+            data = array.array('I', data)
+        words = memoryview(data)
+        if not words.contiguous:
+            words = memoryview(words.tobytes())
+        words = words.cast('B').cast('I')
+        nwords = len(words)
+
+        t0=time.time()
+        if incr:
+            self._write_cycles(range(offset, offset+nwords*incr, incr), words)
+        else:
+            self._write_cycles([offset]*nwords, words)
+
+        self.wcrc=binascii.crc32(words, self.wcrc)
+        if self.debug:
+            addr=offset
+            for datum in words:
+                print("@x%08X > %8x" % (addr, datum))
+                addr=addr+incr
+        self._log_rate(4*nwords, t0)
 
         return 0;
 
 
-    def eb_status(self,status):
+    def _log_rate(self, nbytes, t0):
+        '''Update the throughput (MB/s) of the last block write started at t0'''
+        elapsed = time.time()-t0
+        self.wrate = (nbytes/1e6)/elapsed if elapsed > 0 else 0.0
+        if self.debug: print("Block write: %d bytes at %.3f MB/s" % (nbytes, self.wrate))
+
+
+    @staticmethod
+    def eb_status(status):
         ''' Print the status code returned by libetherbone'''
 
         if status==0: return "OK"
@@ -447,6 +756,32 @@ class EthBone(GenDrvr):
         else: print("OK")
 
         
+    def test_wrspeed(self,RAM_offset=0x0, nwords=4096):
+        '''
+        Method to compare the throughput of devblockwrite() and devblockwrite_buffer()
+
+        Args:
+            RAM_offset=The offset of the RAM so we can write
+            nwords=The number of words to write with each method
+
+        Returns:
+            A tupple with the throughput in MB/s (per-word path, buffer path)
+        '''
+        dataw=array.array('I', [(i<<16 | i) & 0xFFFFFFFF for i in range(0,nwords)])
+        pktwords=self.EB_CYCLE_WORDS ##devblockwrite() must fit in a single cycle
+
+        t0=time.time()
+        for i in range(0,nwords,pktwords):
+            self.devblockwrite(0, RAM_offset+4*i, dataw[i:i+pktwords].tolist(), 4)
+        self._log_rate(4*nwords, t0)
+        rate_list=self.wrate
+        self.devblockwrite_buffer(0, RAM_offset, dataw, 4)
+        rate_buff=self.wrate
+        print("devblockwrite:        %8.3f MB/s" % (rate_list))
+        print("devblockwrite_buffer: %8.3f MB/s" % (rate_buff))
+        return (rate_list, rate_buff)
+
+
     def test_rwblock(self,RAM_offset=0x0, nwords=128):
         '''
         Method to test multiple read/write WB cycles using RAM_offset
@@ -487,64 +822,6 @@ class EthBone(GenDrvr):
             raise BaseException("Error reading data block")
 
 
-    def dataToByteArray(self, data_list, bytearray_list=[]):
-        '''
-        Convert list of hexadecimal characters to byte array
-
-        Args:
-            data_list=List of string in the format
-            bytearray_list=Optional byte array that can be append
-
-        Returns:
-            A list of bytearray for each lines
-        '''
-        
-        for line in (data_list):
-            # try old py2 way
-            try:
-                hex_line = line.decode("hex")
-            # new py3 way - mkauer 2024-12-22
-            except:
-                hex_line = b""
-                for i in range(0, len(line), 2):
-                    hex_line += bytes(int(line[i:i+2], 16).to_bytes(1, 'big'))
-            
-            hex_array = bytearray(hex_line)
-            bytearray_list.append((hex_array))
-            
-        return bytearray_list
-
-
-    def wordsToPackets(self, data_words, data_packets=[], packetLen=128):
-        '''Pack a list of words into a list of packets
-
-        Args:
-            data_words: A list of 32bits data
-            data_packets: The list where we will store each packets
-            packetLen: The number of words in the packets (Must be inferior to < MAXBYTE_PKTDATA/4)
-
-        Returns:
-            The list of data packets composed of {packetLen x 32bit words}
-        '''
-
-        packetLen = int(packetLen)
-        # the 4 bytes words are grouped in "packetLen" words packets
-        for i in range(0,len(data_words),packetLen):
-            if i<(len(data_words)-len(data_words)%packetLen):
-                tmpPacket=[]
-                for k in range(0,packetLen):
-                    tmpPacket.append(data_words[i+k])
-                #tmpPacket.append(0xa0b1c2d4)
-                data_packets.append(tmpPacket)
-            else:
-                last_packet=[]
-                for l in range(0,len(data_words)%packetLen):
-                    last_packet.append(data_words[i+l])
-                data_packets.append(last_packet)
-                
-        return data_packets
-
-
     @staticmethod
     def scan(options) :
         '''
@@ -623,3 +900,332 @@ class EthBone(GenDrvr):
         return devices
 
    
+
+
+
+class EBSession(object):
+    '''Etherbone socket shared by several EthBone devices
+
+    The session owns the eb_socket, the completion callback of the
+    asynchronous cycles and the thread that runs the socket for them.
+    It also keeps a cache of opened devices keyed by LUN so that the
+    periodic sweeps over many boards do not pay the connection setup
+    each time. Every get() must be balanced by a release(): when more
+    than max_devices are opened the least recently used one that is not
+    in use is closed.
+
+    The calls to libetherbone are serialized by the session lock, which
+    is only held while a cycle is built or the socket is polled, and
+    every device has its own lock for its operations.
+
+    Example:
+        session = EBSession()
+        for ip in ips:
+            dev = session.get("udp/"+ip)
+            dev.read(addr)
+            session.release("udp/"+ip)
+    '''
+
+    EB_POLL_US = EthBone.EB_POLL_US
+
+    opened = False
+
+    def __init__(self, libname=LIBETHERBONE, max_devices=64, verbose=False):
+        '''Constructor: load libetherbone and open the socket
+
+        Args:
+            libname : path of libetherbone.so
+            max_devices : Number of cached devices before closing the least recently used
+            verbose : enables debug info
+        '''
+        GenDrvr.load_lib(self, libname)
+        self.max_devices = max_devices
+        self.verbose = verbose
+
+        self.socket  = c_uint(0)
+        self.devices = collections.OrderedDict() # LUN -> EthBone (LRU order)
+        self.lastuse = {}                        # LUN -> time of last get() or release()
+        self.refs    = {}                        # LUN -> number of get() not released
+
+        ##Completion callback shared by all the asynchronous cycles
+        self.cycle_cb = EB_CALLBACK(self._cycle_done)
+        self.cycle_id = 0
+        self.cycles   = {}
+        self.futures  = {}
+        self.orphans  = {} # cycle id -> buffer kept alive until the late callback
+
+        ##Descriptors of the socket, listed by eb_socket_descriptors()
+        self.fds_cb   = EB_DESCRIPTOR_CALLBACK(self._add_fd)
+        self.rfds     = []
+        self.wfds     = []
+
+        ##Background thread running the socket for the asynchronous operations
+        self.lock     = threading.RLock()
+        self.wakeup   = threading.Event()
+        self.poller   = None
+
+        self.open()
+
+
+    def __del__(self):
+        self.close()
+
+
+    @classmethod
+    def for_workers(cls, session, workers, verbose=False):
+        '''Return the session shared by a pool of workers
+
+        Args:
+            session : the session given by the caller (None to create one)
+            workers : number of workers (the new session caches at least one device each)
+            verbose : enables debug info
+
+        Returns:
+            A tuple (session, own) where own is True if the session was created
+            here, and so it must be closed by the caller.
+        '''
+        if session is not None:
+            return (session, False)
+        return (cls(max_devices=max(64, workers), verbose=verbose), True)
+
+
+    @eb_locked
+    def open(self):
+        '''Open the etherbone socket'''
+        status = self.lib.eb_socket_open(EB_ABI_CODE,
+                                         0,
+                                         EthBone.EB_ADDRX|EthBone.EB_DATAX,
+                                         GenDrvr.getPtrData(self.socket)
+                                         )
+        if self.verbose: print('  socket status = {0}'.format(EthBone.eb_status(status)))
+        if status:
+             raise BusCritical('failed to open Etherbone socket: %s' % (EthBone.eb_status(status)))
+        self.opened = True
+
+
+    def isOpen(self):
+        '''Return True if the socket is opened'''
+        return self.opened
+
+
+    def close(self):
+        '''Close all the cached devices and the socket'''
+        if not self.isOpen(): return
+        for dev in list(self.devices.values()):
+            dev.close()
+        self.stop_poll()
+        with self.lock:
+            status=self.lib.eb_socket_close(self.socket)
+            if status: raise BusCritical("Close socket: %s\n" % (EthBone.eb_status(status)))
+            self.socket=c_uint(0)
+            self.opened=False
+
+
+    def get(self, LUN, verbose=False):
+        '''Return the EthBone device for LUN, opening it if it is not cached
+
+        The device is in use until release(LUN) is called.
+
+        Args:
+            LUN : the logical unit (i.e: udp/192.168.7.50)
+            verbose : enables debug info on the opened device
+        '''
+        with self.lock:
+            dev = self.devices.get(LUN)
+            if dev is None:
+                dev = EthBone(LUN, verbose, session=self)
+                self.devices[LUN] = dev
+            else:
+                self.devices.move_to_end(LUN)
+            self.refs[LUN] = self.refs.get(LUN, 0)+1
+            self.lastuse[LUN] = time.time()
+            evicted = self._pop_unused(len(self.devices)-self.max_devices)
+        for old in evicted:
+            if self.verbose: print("Closing least recently used device %s" % (old.LUN))
+            old.close()
+        return dev
+
+
+    def release(self, LUN):
+        '''Release a device returned by get(), it is kept opened for the next get()'''
+        with self.lock:
+            if LUN not in self.devices: return
+            self.refs[LUN] = max(0, self.refs.get(LUN, 0)-1)
+            self.lastuse[LUN] = time.time()
+
+
+    def close_idle(self, max_idle):
+        '''Close the devices not in use that have not been requested for max_idle seconds
+
+        Returns:
+            The number of devices closed
+        '''
+        with self.lock:
+            idle = self._pop_unused(len(self.devices), time.time()-max_idle)
+        for dev in idle:
+            dev.close()
+        return len(idle)
+
+
+    def _pop_unused(self, count, before=None):
+        '''Remove from the cache up to count devices not in use (least recently used first)
+
+        Args:
+            count : max number of devices to remove
+            before : only the devices released before this time
+
+        Returns:
+            The list of removed devices, that must be closed by the caller
+        '''
+        ret = []
+        for lun in list(self.devices):
+            if len(ret) >= count: break
+            if self.refs.get(lun, 0) > 0: continue
+            if before is not None and self.lastuse.get(lun, 0) >= before: continue
+            ret.append(self.devices[lun])
+            self.forget(self.devices[lun])
+        return ret
+
+
+    def forget(self, dev):
+        '''Remove a device from the cache (called when it is closed)'''
+        with self.lock:
+            if self.devices.get(dev.LUN) is dev:
+                del self.devices[dev.LUN]
+                self.refs.pop(dev.LUN, None)
+                self.lastuse.pop(dev.LUN, None)
+
+
+    def __len__(self):
+        return len(self.devices)
+
+
+    def __contains__(self, LUN):
+        return LUN in self.devices
+
+
+    def next_cycle_id(self):
+        '''Return a new id used as user data of the asynchronous cycles'''
+        self.cycle_id = (self.cycle_id % 0xFFFFFFFF) + 1
+        return self.cycle_id
+
+
+    def orphan(self, cids, keep=None):
+        '''Forget cycles abandoned by their caller (i.e: after a timeout)
+
+        The cycles already completed are removed. The ones still in flight
+        are removed by _cycle_done() when libetherbone calls back, and
+        until then keep (the buffer the replies are written to) is
+        referenced so it is not freed under the library.
+
+        Args:
+            cids: list of cycle ids returned by EthBone._open_cycle()
+            keep: object to keep alive while the cycles are in flight
+        '''
+        with self.lock:
+            for cid in cids:
+                if cid not in self.cycles: continue
+                if self.cycles[cid] is None:
+                    self.orphans[cid] = keep
+                else:
+                    del self.cycles[cid]
+
+
+    def _cycle_done(self, user, dev, op, status):
+        '''Callback called by libetherbone when an asynchronous cycle is completed'''
+        cid = user or 0
+        if cid in self.orphans:
+            del self.orphans[cid]
+            self.cycles.pop(cid, None)
+            return
+        self.cycles[cid] = status
+
+
+    def run(self, pending=None, timeout_us=None):
+        '''Run the socket without blocking the other threads meanwhile
+
+        The replies already received are processed with the lock held, then
+        the lock is released while waiting (select) for more data.
+
+        Args:
+            pending: function returning False when there is no need to wait
+            timeout_us: max time (us) to wait for new data (EB_POLL_US by default)
+        '''
+        if timeout_us is None: timeout_us = self.EB_POLL_US
+        with self.lock:
+            self.lib.eb_socket_run(self.socket, c_long(0))
+            if pending is not None and not pending(): return
+            self.rfds, self.wfds = [], []
+            self.lib.eb_socket_descriptors(self.socket, None, self.fds_cb)
+            rfds, wfds = self.rfds, self.wfds
+        if rfds or wfds:
+            select.select(rfds, wfds, [], timeout_us/1e6)
+        else:
+            time.sleep(timeout_us/1e6)
+
+
+    def _add_fd(self, user, fd, mode):
+        '''Callback called by eb_socket_descriptors() for each descriptor of the socket'''
+        if mode & EB_DESCRIPTOR_IN: self.rfds.append(fd)
+        if mode & EB_DESCRIPTOR_OUT: self.wfds.append(fd)
+        return 0
+
+
+    def _complete_futures(self):
+        '''Pop the futures whose cycle is done (or timed out)
+
+        Returns:
+            A list of (future, exception, value) to be resolved outside the lock
+        '''
+        ret = []
+        now = _monotonic()
+        for cid in list(self.futures):
+            fut, offset, result, deadline = self.futures[cid]
+            status = self.cycles.get(cid)
+            if status is not None:
+                del self.futures[cid]
+                del self.cycles[cid]
+                if status:
+                    ret.append((fut, BusWarning('Async cycle @0x%08x: %s' % (offset, EthBone.eb_status(status))), None))
+                else:
+                    ret.append((fut, None, result()))
+            elif now > deadline:
+                ## The buffer of the result must stay alive until libetherbone calls back
+                del self.futures[cid]
+                self.orphan([cid], result)
+                ret.append((fut, BusWarning('Async cycle @0x%08x: %s' % (offset, EthBone.eb_status(-7))), None))
+        return ret
+
+
+    def _poll_loop(self):
+        '''Body of the poll thread: run the socket while asynchronous cycles are pending'''
+        while self.poller is threading.current_thread():
+            if self.futures:
+                self.run()
+            with self.lock:
+                done = self._complete_futures()
+                pending = len(self.futures)
+            for fut, exc, value in done:
+                if fut.done(): continue
+                if exc is not None: fut.set_exception(exc)
+                else: fut.set_result(value)
+            if not pending:
+                self.wakeup.wait(0.1)
+                self.wakeup.clear()
+
+
+    def start_poll(self):
+        '''Start the background thread that runs the etherbone socket (if not running)'''
+        if self.poller is None:
+            self.poller = threading.Thread(target=self._poll_loop, name="eb-poll")
+            self.poller.daemon = True
+            self.poller.start()
+        self.wakeup.set()
+
+
+    def stop_poll(self):
+        '''Stop the background poll thread'''
+        poller, self.poller = self.poller, None
+        if poller is not None and poller is not threading.current_thread():
+            self.wakeup.set()
+            poller.join()
@@ -34,6 +34,14 @@ This file is based on the official version 1.1 of sdb.h
 
 # Import system modules
 import os
+import sys
+import json
+import array
+import struct
+import binascii
+import bisect
+import threading
+from collections import namedtuple
 from ctypes import *
 import ctypes
 
@@ -53,6 +61,10 @@ SDB_DATA_WRITE              = 0x02
 SDB_DATA_EXEC               = 0x01
 
 
+class SDBError(Exception):
+    """Raised when the SDB structure is not found or can not be decoded"""
+
+
 
 class StructStr(BigEndianStructure):
     """
@@ -257,7 +269,7 @@ class sdb_record(Union):
     def __str__(self):
         var= self.getTypedRecord()
         if (type(var)==sdb_empty) and (self.empty.record_type!=0xFF):
-            raise BaseException("Sdb unknown type %0x" %(self.empty.record_type))
+            raise SDBError("Sdb unknown type %0x" %(self.empty.record_type))
         return "%s:\n%s" %(type(var),var)
 
 
@@ -271,6 +283,14 @@ class SDBNode():
         * several records that can be linked to a child (another SDBNode)
     """
     base = None  # address of the SDB interconnect record.
+    probes = 0     # number of reads done by the last scan()
+    failures = 0   # number of reads of the last scan() that raised a bus error
+    index = None   # (vendor_id, device_id) -> list of (record, address, buspath) (root only)
+    ranges = None  # sorted list of (addr_first, addr_end, record, buspath) of the devices (root only)
+    placeholder = False # True for a lazy child that has not been parsed yet (see expand())
+    maxlevel = -1  # maxlevel used to parse a placeholder
+    cache = None   # SDBCache updated when a placeholder is expanded (root only)
+    lun = None     # key of the tree in the cache (root only)
     offset = 0     # offset of the nested interconnect (child crossbar)
     level = 0      # return its sub-level (0 for root)
     buspath_prefix = ""
@@ -296,7 +316,7 @@ class SDBNode():
         self.debug = debug
         
 
-    def parse(self, maxlevel=-1):
+    def parse(self, maxlevel=-1, lazy=False):
         """
         Parse the SDB structure
 
@@ -305,21 +325,22 @@ class SDBNode():
         Args:
             maxlevel: the maximum number of nested bus we can explore 
                       (if -1 we stop when we don't find new one)
+            lazy: the nested bus are not parsed, they are kept as placeholders
+                  that are parsed when walk(), findProduct() or ls() reach them.
         """
         ## Check that we have a correct base, otherwise we scan it
         if self.base==None:
             self.base=self.scan()
-        else:
-            if self.bus.read(self.base) != SDB_MAGIC:
-                raise BaseException("Sdb base offset 0x%08x has not a valid sdb magic" %(self.base))
 
         ## Read the interconnect info (Where the SDB is stored)
         self.readrecord(self.base,self.interconnect)
+        if self.interconnect.sdb_magic != SDB_MAGIC:
+            raise SDBError("Sdb base offset 0x%08x has not a valid sdb magic" %(self.base))
         #print self.interconnect
+        records=self.readtable(self.base+sizeof(sdb_record), self.interconnect.sdb_records-1)
         for i in range(1,self.interconnect.sdb_records):
             #print ">>>>>>>>>>>>>>>>>> Device %s%d" %(self.buspath_prefix,i)
-            el=sdb_record()
-            self.readrecord(self.base + sizeof(el)*i, el)
+            el=records[i-1]
             #print el
             n=None ##At the moment no node is appended
             if el.is_type(sdb_record.TYPE_BRIDGE) and (maxlevel>0 or maxlevel==-1):
@@ -329,16 +350,48 @@ class SDBNode():
                 n.offset=bridge.sdb_component.addr_first
                 if maxlevel>0: nextlevel=maxlevel-1
                 else: nextlevel=maxlevel
-                n.parse(nextlevel)
+                if lazy:
+                    n.placeholder=True
+                    n.maxlevel=nextlevel
+                else:
+                    n.parse(nextlevel)
             self.elements.append((el,n))
+        if self.parent is None and not lazy:
+            self.build_index()
+
+    def expand(self):
+        """
+        Parse a placeholder node (created by a lazy parse) if it is not done yet
+        """
+        if self.placeholder:
+            try:
+                self.parse(self.maxlevel, lazy=True)
+            except BaseException:
+                self.elements=[] # parsed again by the next expand()
+                raise
+            self.placeholder=False
+            root=self
+            while root.parent is not None:
+                root=root.parent
+            if root.cache is not None:
+                root.cache.store(root.lun, root)
+        return self
 
             
-    def scan(self, mask=0x10000000):
+    def scan(self, mask=0x10000000, hints=None):
         """
         This function scan the FPGA memory map to find a valid sdb root
 
-        It start to check all the address starting by mask and iterate
-        on the lowest address space at each iteration.
+        The hints (i.e: the root parsed the last time and the roots seen on
+        the other devices, see SDBCache.hints) are checked first, a hint is
+        only taken when the interconnect record at its base is still the one
+        of its tree: the same address may hold a nested crossbar in another
+        gateware. Then it checks all the addresses
+        starting by mask and iterate on the lowest address space at each
+        iteration. The 15 candidates of a level are read concurrently (one
+        asynchronous read per address, so a bus error on one of them does
+        not affect the others). The number of reads is kept in probes and
+        the number of them that failed with a bus error in failures.
 
         Below a short example of how we iterate to find the sdb root:
 
@@ -351,27 +404,94 @@ class SDBNode():
         0x0E000000 <=> SDB_MAGIC (so we return)
         ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+        Args:
+            mask: the first level of the scan
+            hints: list of root SDBNode parsed before to check before scanning
         """
-
-        if mask<=0x100:
-            raise BaseException("Could not find sdb root")
-
-        for i in range(14, -1, -1): ##TODO: Check that reverse scanning is always better
+        self.probes=0
+        self.failures=0
+        offset=None
+        for hint in hints or []:
+            self.probes+=1
             try:
-                offset = mask+i*mask
-                datar = self.bus.read(offset)
+                if hint.same_header():
+                    offset=hint.base
+                    break
+            except BusException as e:
+                self.failures+=1
                 if self.debug:
-                    print("@0x%08x > 0x%08x" %(offset,datar))
-                if datar == SDB_MAGIC:
-                    return offset
+                    print(e)
+        while offset is None and mask>0x100:
+            ##TODO: Check that reverse scanning is always better
+            candidates=[mask+i*mask for i in range(14, -1, -1)]
+            offset=self._probe(candidates)
+            mask >>= 4
+        if self.debug:
+            print("Sdb root %s after %d probes (%d failed)" %("not found" if offset is None else "@0x%08x" %(offset),
+                                                               self.probes, self.failures))
+        if offset is None:
+            raise SDBError("Could not find sdb root after %d probes (%d failed)" %(self.probes, self.failures))
+        return offset
+
+    def _probe(self, addresses):
+        """
+        Read concurrently a list of addresses
+
+        Return: The first address (in the list order) with a SDB magic or None
+        """
+        futures=[self.bus.read_async(addr) for addr in addresses]
+        self.probes+=len(futures)
+        found=None
+        for addr, fut in zip(addresses, futures):
+            try:
+                datar=fut.result()
             except BusWarning as e:
+                self.failures+=1
                 if self.debug:
                     print(e)
                 ##TODO: when bus error are well handle we can skip out of place
-        return self.scan(mask >> 4)
+                continue
+            if self.debug:
+                print("@0x%08x > 0x%08x" %(addr,datar))
+            if datar == SDB_MAGIC and found is None:
+                found=addr
+        return found
 
     
-    def findProduct(self, vendor_id, device_id, prods=None):
+    def walk(self):
+        """
+        Iterate over all the components of the tree (depth first)
+
+        Return: A generator of (sdb structure, full_wb_address, buspath)
+        """
+        for i in range(0,len(self.elements)):
+            if self.elements[i][0].is_component():
+                e=self.elements[i][0].getTypedRecord()
+                yield (e, self.offset+e.sdb_component.addr_first, "%s%d" %(self.buspath_prefix, i+1))
+            if self.elements[i][1] != None:
+                for item in self.elements[i][1].expand().walk():
+                    yield item
+
+    def build_index(self):
+        """
+        Build the product index and the address ranges of the devices
+
+        It is called at the end of parse() on the root node so that
+        findProduct() and findAddress() don't need to walk the tree.
+        """
+        self.index={}
+        self.ranges=[]
+        for e, addr, buspath in self.walk():
+            prod=e.sdb_component.product
+            key=(int(prod.vendor_id), int(prod.device_id))
+            self.index.setdefault(key, []).append((e, addr, buspath))
+            if e.sdb_component.product.record_type==sdb_record.TYPE_DEVICE:
+                size=e.sdb_component.addr_end-e.sdb_component.addr_first
+                self.ranges.append((addr, addr+size, e, buspath))
+        self.ranges.sort(key=lambda r: r[0])
+        self.range_starts=[r[0] for r in self.ranges]
+
+    def findProduct(self, vendor_id, device_id, prods=None, first=False):
         """
         Find SDB product according to vendor/device ID
 
@@ -381,6 +501,7 @@ class SDBNode():
         Args:
             vendor_id: The ID to describe the vendor (7501 <=> Seven Solutions)
             device_id: The ID to describe this device (WB Slave core)
+            first: stop at the first device found (the remaining placeholders are not parsed)
 
         Return:
             A list of all the device found that match the vendor/device ID
@@ -389,25 +510,40 @@ class SDBNode():
         if prods is None:
             prods = []
 
-        for i in range(0,len(self.elements)):
-            if self.elements[i][0].is_component():
-                e=self.elements[i][0].getTypedRecord()
-                prod=e.sdb_component.product
+        if self.index is not None:
+            prods.extend(self.index.get((vendor_id, device_id), [])[:1 if first else None])
+            return prods
+
+        for e, addr, buspath in self.walk():
+            prod=e.sdb_component.product
+            if self.debug:
+                print("%x:%x => %x:%x" %( vendor_id, device_id, prod.vendor_id, prod.device_id))
+            #if long(prod.vendor_id) == vendor_id and int(prod.device_id) == device_id:
+            if int(prod.vendor_id) == vendor_id and int(prod.device_id) == device_id:
                 if self.debug:
-                    print("%x:%x => %x:%x" %( vendor_id, device_id, prod.vendor_id, prod.device_id))
-                #if long(prod.vendor_id) == vendor_id and int(prod.device_id) == device_id:
-                if int(prod.vendor_id) == vendor_id and int(prod.device_id) == device_id:
-                    buspath = "%s%d" %(self.buspath_prefix, i+1)
-                    if self.debug:
-                        print("Found Device %s %s: %x\n%s" %(buspath,
-                                                             prod.name,
-                                                             self.offset+e.sdb_component.addr_first,
-                                                             e))
-                    prods.append((e, self.offset+e.sdb_component.addr_first, buspath))
-            if self.elements[i][1] != None:
-                self.elements[i][1].findProduct(vendor_id, device_id, prods)
+                    print("Found Device %s %s: %x\n%s" %(buspath, prod.name, addr, e))
+                prods.append((e, addr, buspath))
+                if first:
+                    break
         return prods
 
+    def findAddress(self, address):
+        """
+        Find the device that owns a WB address
+
+        Args:
+            address: full WB address
+
+        Return:
+            A tupple with the (sdb structure,full_wb_address,buspath) or None
+        """
+        if self.ranges is None:
+            self.build_index()
+        i=bisect.bisect_right(self.range_starts, address)-1
+        if i >= 0 and address <= self.ranges[i][1]:
+            return (self.ranges[i][2], self.ranges[i][0], self.ranges[i][3])
+        return None
+
     
     def ls(self, verbose=False):
         """
@@ -437,7 +573,7 @@ class SDBNode():
             print("%s+--- Device %s%d" %(prefix,self.buspath_prefix,i+1))
             self._print_indent(self.elements[i][0],nspaces, "|   ")
             if self.elements[i][1]!=None:
-                self.elements[i][1].ls_full()
+                self.elements[i][1].expand().ls_full()
 
     def ls_brief(self):
         for i in range(0,len(self.elements)):
@@ -446,7 +582,7 @@ class SDBNode():
                 buspath="%s%d" %(self.buspath_prefix,i+1)
                 self.ls_oneline(e,self.offset+e.sdb_component.addr_first, buspath)
             if self.elements[i][1]!=None:
-                self.elements[i][1].ls_brief()
+                self.elements[i][1].expand().ls_brief()
 
     @staticmethod
     def ls_oneline(e,offset,buspath=""):
@@ -454,6 +590,97 @@ class SDBNode():
         print("%-14s %016x:%08x  %16x  %s" %(buspath,prod.vendor_id,prod.device_id,offset,prod.name))
 
 
+    def to_dict(self):
+        """
+        Serialize the parsed tree (raw records in hex) to a dict that can be saved as JSON
+        """
+        return {
+            "base": self.base,
+            "offset": self.offset,
+            "prefix": self.buspath_prefix,
+            "placeholder": self.placeholder,
+            "maxlevel": self.maxlevel,
+            "interconnect": binascii.hexlify(string_at(addressof(self.interconnect), sizeof(self.interconnect))).decode("ascii"),
+            "elements": [(binascii.hexlify(string_at(addressof(el), sizeof(el))).decode("ascii"),
+                          n.to_dict() if n is not None else None) for el, n in self.elements],
+        }
+
+    @classmethod
+    def from_dict(cls, bus, d, parent=None):
+        """
+        Rebuild a tree serialized with to_dict() without accessing the bus
+        """
+        node=cls(bus, d["base"], parent)
+        node.offset=d["offset"]
+        node.buspath_prefix=d["prefix"]
+        node.placeholder=d.get("placeholder", False)
+        node.maxlevel=d.get("maxlevel", -1)
+        node.interconnect=sdb_interconnect.from_buffer_copy(binascii.unhexlify(d["interconnect"]))
+        for rec, child in d["elements"]:
+            el=sdb_record.from_buffer_copy(binascii.unhexlify(rec))
+            n=cls.from_dict(bus, child, node) if child is not None else None
+            node.elements.append((el,n))
+        if parent is None and node.is_expanded():
+            node.build_index()
+        return node
+
+    def is_expanded(self):
+        """
+        Return True if no placeholder is left in the tree
+        """
+        return not self.placeholder and all(n.is_expanded() for el, n in self.elements if n is not None)
+
+    def tables(self, tables=None):
+        """
+        Return the raw SDB tables of the parsed tree (see SDBDecoder)
+
+        Return: A dict of address -> bytes of the table (big-endian, as on the bus)
+        """
+        if tables is None:
+            tables = {}
+        if not self.placeholder:
+            raw=[string_at(addressof(self.interconnect), sizeof(self.interconnect))]
+            raw+=[string_at(addressof(el), sizeof(el)) for el, n in self.elements]
+            tables[self.base]=b"".join(raw)
+        for el, n in self.elements:
+            if n is not None:
+                n.tables(tables)
+        return tables
+
+    def validate(self):
+        """
+        Check that a cached tree still describes the gateware of the device
+
+        Only the interconnect header and the commit_id/date of the synthesis
+        record (if any) are read back and compared.
+
+        Return: True if the tree is still valid
+        """
+        try:
+            if not self.same_header():
+                return False
+            for i, (el, n) in enumerate(self.elements):
+                if el.is_type(sdb_record.TYPE_SYNTHESIS):
+                    # commit_id[16] + tool_name[8] + tool_version + date
+                    start=sdb_synthesis.commit_id.offset
+                    end=sdb_synthesis.date.offset+sizeof(c_uint32)
+                    rd=self._readBlock(self.base+sizeof(sdb_record)*(i+1)+start, end-start)
+                    return rd == string_at(addressof(el), sizeof(el))[start:end]
+        except BusException as e:
+            if self.debug:
+                print(e)
+            return False
+        return True
+
+    def same_header(self):
+        """
+        Check that the interconnect record on the bus is the one of the tree
+
+        Return: True if the record read at base is the same
+        """
+        hdr=self._readBlock(self.base, sizeof(self.interconnect))
+        return hdr == string_at(addressof(self.interconnect), sizeof(self.interconnect))
+
     def readrecord(self,address,record):
         """
         Read a record from the bus
@@ -464,27 +691,35 @@ class SDBNode():
 
         Return: The record after being read
         """
-        pData=cast(addressof(record), POINTER(c_uint8))
-        self._readWords(address, pData,sizeof(record))
+        buf=self._readBlock(address, sizeof(record))
+        memmove(addressof(record), buf, sizeof(record))
         return record
 
-    def _readWords(self,offset,pData,nbytes):
-        """ Read words on the bus and fill it using a pointer on a buffer data """
-        for i in range(0,nbytes):
-            #pData[i]=BitManip.swap32(self.bus.read(offset+i*4))
-            mod=i%4
-            if mod==0:
-                rd=self.bus.read(offset+i)
-                tmp=(rd & 0xFF000000) >> 24
-            elif mod==1:
-                tmp=(rd & 0x00FF0000) >> 16
-            elif mod==2:
-                tmp=(rd & 0x0000FF00) >> 8
-            else:
-                tmp=(rd & 0x000000FF)
-            pData[i]=tmp
-            #print("%d: 0x%x" %(i,pData[i]))
-        return pData
+    def readtable(self,address,nrecords):
+        """
+        Read consecutive records from the bus with a single block read
+
+        Args:
+            address: address of the first 64-bytes record on the WB bus.
+            nrecords: number of records to read
+
+        Return: A list of sdb_record
+        """
+        size=sizeof(sdb_record)
+        buf=self._readBlock(address, nrecords*size)
+        return [sdb_record.from_buffer_copy(buf, i*size) for i in range(nrecords)]
+
+    def _readBlock(self,offset,nbytes):
+        """ Read a block of words on the bus and return it as big-endian bytes """
+        if nbytes<=0:
+            return b""
+        if getattr(self.bus, "blockread", False):
+            words=array.array('I', self.bus.devblockread_buffer(0, offset, nbytes))
+        else:
+            words=array.array('I', self.bus.read_many(range(offset,offset+nbytes,4)))
+        if sys.byteorder=='little':
+            words.byteswap()
+        return words.tobytes()
 
 
     def _print_indent(self,obj,nspace,sep=""):
@@ -498,3 +733,294 @@ class SDBNode():
         """
         s = "%s" % (obj)
         print("\n".join((nspace * " ") + sep + i for i in s.splitlines()))
+
+
+
+class SDBCache(object):
+    """
+    Persistent cache of the parsed SDB trees indexed by LUN
+
+    The trees are saved in a JSON file and validated against the device
+    (see SDBNode.validate()) before being used, so a warm start only needs
+    a couple of reads instead of a scan and a full parse.
+    """
+
+    PATH = os.path.join(os.path.expanduser("~"), ".sdb_cache.json")
+
+    # Shared by all the instances (i.e: devices opened from several threads)
+    lock = threading.Lock()
+
+    def __init__(self, path=None, debug=False):
+        """
+        Args:
+            path: JSON file used to store the trees (PATH by default)
+            debug: Enable debug output
+        """
+        self.path = path or self.PATH
+        self.debug = debug
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get(self, bus, lun, refresh=False, base=None, maxlevel=-1, lazy=False):
+        """
+        Return the parsed root SDBNode of a device
+
+        Args:
+            bus: instance of the gendriver class.
+            lun: Key of the device in the cache (i.e: "udp/192.168.1.2")
+            refresh: Force a new scan/parse of the device
+            base: The SDB root address (scanned if None)
+            maxlevel, lazy: see SDBNode.parse()
+        """
+        entries=self._load()
+        entry=entries.get(lun)
+        cached=None
+        if entry is not None and (base is None or base==entry["base"]):
+            cached=SDBNode.from_dict(bus, entry)
+            cached.debug=self.debug
+            if not refresh:
+                if cached.validate():
+                    if self.debug: print("SDB cache hit for %s" % (lun))
+                    cached.cache, cached.lun = self, lun
+                    return cached
+                if self.debug: print("SDB cache outdated for %s" % (lun))
+
+        node=SDBNode(bus, base, debug=self.debug)
+        if base is None:
+            # The last known root is the first place to look at
+            hints=[cached] if cached is not None else []
+            node.base=node.scan(hints=hints+self.hints(bus, entries, lun))
+        node.parse(maxlevel, lazy)
+        self.store(lun, node)
+        node.cache, node.lun = self, lun
+        return node
+
+    def hints(self, bus, entries, lun=None):
+        """
+        Return the roots seen on the cached devices (the hint table)
+
+        The roots are grouped by gateware (synthesis name, or the root
+        crossbar record when there is no synthesis record) and the group
+        of the device lun (if cached) comes first. Each root is only given
+        once, as a SDBNode with its interconnect record so that scan()
+        can check it with a single read.
+
+        Args:
+            bus: instance of the gendriver class of the scanned device.
+            entries: content of the cache (see _load())
+            lun: Key of the scanned device (its own root is not returned)
+        """
+        table={}  # gateware -> list of (base, interconnect)
+        for key in sorted(entries):
+            if key==lun:
+                continue
+            root=(entries[key]["base"], entries[key]["interconnect"])
+            roots=table.setdefault(self._gateware(entries[key]), [])
+            if root not in roots:
+                roots.append(root)
+        first=self._gateware(entries[lun]) if lun in entries else None
+        hints=[]
+        for gateware in sorted(table, key=lambda g: g!=first):
+            for base, interconnect in table[gateware]:
+                if lun in entries and (base, interconnect)==(entries[lun]["base"], entries[lun]["interconnect"]):
+                    continue
+                node=SDBNode(bus, base, debug=self.debug)
+                node.interconnect=sdb_interconnect.from_buffer_copy(binascii.unhexlify(interconnect))
+                hints.append(node)
+        return hints
+
+    @staticmethod
+    def _gateware(entry):
+        """
+        Key of a cached tree in the hint table
+        """
+        for rec, child in entry["elements"]:
+            el=sdb_record.from_buffer_copy(binascii.unhexlify(rec))
+            if el.is_type(sdb_record.TYPE_SYNTHESIS):
+                return el.getTypedRecord().syn_name.decode("ascii", "replace")
+        return entry["interconnect"]
+
+    def store(self, lun, node):
+        """
+        Save the tree of a device in the cache file
+        """
+        with self.lock:
+            entries=self._load()  # Keep the devices saved by other processes
+            entries[lun]=node.to_dict()
+            self._save(entries)
+
+    def invalidate(self, lun=None):
+        """
+        Remove a device (or all of them if lun is None) from the cache
+        """
+        with self.lock:
+            entries=self._load() if lun is not None else {}
+            entries.pop(lun, None)
+            self._save(entries)
+
+    def _save(self, entries):
+        """
+        Replace the cache file (a temporary file is renamed, so the readers
+        of other processes never see a partial file)
+        """
+        tmp="%s.%d.%d.tmp" % (self.path, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as e:
+            if self.debug: print("SDB cache not saved: %s" % (e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+
+#-------------------------------------------------------------------------------
+#                          Raw SDB decoder (no ctypes)                        --
+#-------------------------------------------------------------------------------
+
+SDBInterconnect = namedtuple("SDBInterconnect", "sdb_magic sdb_records sdb_version sdb_bus_type "
+                             "addr_first addr_end vendor_id device_id version date name record_type")
+SDBDevice = namedtuple("SDBDevice", "abi_class abi_ver_major abi_ver_minor bus_specific "
+                       "addr_first addr_end vendor_id device_id version date name record_type")
+SDBBridge = namedtuple("SDBBridge", "sdb_child addr_first addr_end vendor_id device_id version date name record_type")
+SDBIntegration = namedtuple("SDBIntegration", "vendor_id device_id version date name record_type")
+SDBRepoUrl = namedtuple("SDBRepoUrl", "repo_url record_type")
+SDBSynthesis = namedtuple("SDBSynthesis", "syn_name commit_id tool_name tool_version date user_name record_type")
+SDBEmpty = namedtuple("SDBEmpty", "record_type")
+
+
+class SDBDecoder(object):
+    """
+    Decode raw SDB tables (bytes/memoryview in big-endian) into namedtuples
+
+    It does not need the bus nor ctypes, so it can be used offline on the
+    dumps saved to disk (raw images, SDBNode.tables() or the SDBCache file).
+    The text fields are returned as str without the padding.
+
+    Example:
+        dec=SDBDecoder.from_file("sdb.bin", base=0x30000)
+        for rec, addr, buspath in dec.walk(0x30000):
+            print(buspath, hex(addr), rec.name)
+    """
+
+    RECORD_SIZE = 64
+
+    # record_type -> (struct, namedtuple, index of the text fields)
+    FORMATS = {
+        sdb_record.TYPE_INTERCONNECT: (struct.Struct(">IHBBQQQIII19sB"), SDBInterconnect, (10,)),
+        sdb_record.TYPE_DEVICE:       (struct.Struct(">HBBIQQQIII19sB"), SDBDevice, (10,)),
+        sdb_record.TYPE_BRIDGE:       (struct.Struct(">QQQQIII19sB"), SDBBridge, (7,)),
+        sdb_record.TYPE_INTEGRATION:  (struct.Struct(">24xQIII19sB"), SDBIntegration, (4,)),
+        sdb_record.TYPE_REPO_URL:     (struct.Struct(">63sB"), SDBRepoUrl, (0,)),
+        sdb_record.TYPE_SYNTHESIS:    (struct.Struct(">16s16s8sII15sB"), SDBSynthesis, (0, 1, 2, 5)),
+        sdb_record.TYPE_EMPTY:        (struct.Struct(">63xB"), SDBEmpty, ()),
+    }
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables: dict of address -> raw bytes (a table or a whole image starting at address)
+        """
+        self.chunks=sorted((addr, memoryview(data)) for addr, data in tables.items())
+
+    @classmethod
+    def from_file(cls, path, base=0):
+        """
+        Load a raw binary image of the bus memory starting at base
+        """
+        with open(path, "rb") as f:
+            return cls({base: f.read()})
+
+    @classmethod
+    def from_cache(cls, lun, path=None):
+        """
+        Load the tables of a device saved in the SDB cache (see SDBCache)
+        """
+        tables={}
+        def add(d):
+            tables[d["base"]]=binascii.unhexlify(d["interconnect"])+b"".join(binascii.unhexlify(rec) for rec, child in d["elements"])
+            for rec, child in d["elements"]:
+                if child is not None and not child.get("placeholder", False):
+                    add(child)
+        add(SDBCache(path)._load()[lun])
+        return cls(tables)
+
+    def _view(self, address, size):
+        """ Return a memoryview of size bytes at address """
+        for base, data in self.chunks:
+            if base <= address and address+size <= base+len(data):
+                return data[address-base:address-base+size]
+        raise KeyError("No SDB data at 0x%08x" %(address))
+
+    @classmethod
+    def decode_record(cls, buf, offset=0):
+        """
+        Decode one 64-bytes record
+
+        Args:
+            buf: bytes/bytearray/memoryview in big-endian
+            offset: position of the record in buf
+        """
+        rtype=bytearray(buf[offset+cls.RECORD_SIZE-1:offset+cls.RECORD_SIZE])[0]
+        fmt, rec, texts = cls.FORMATS.get(rtype, cls.FORMATS[sdb_record.TYPE_EMPTY])
+        values=fmt.unpack_from(buf, offset)
+        if texts:
+            values=list(values)
+            for i in texts:
+                values[i]=values[i].rstrip(b"\0").decode("latin-1")
+        return rec._make(values)
+
+    @classmethod
+    def decode_table(cls, buf, offset=0):
+        """
+        Decode a SDB table (interconnect header + records)
+
+        Return: The list of records, the first one is the SDBInterconnect
+        """
+        hdr=cls.decode_record(buf, offset)
+        if not isinstance(hdr, SDBInterconnect) or hdr.sdb_magic != SDB_MAGIC:
+            raise ValueError("No valid sdb magic at offset 0x%x" %(offset))
+        size=cls.RECORD_SIZE
+        # All the record types are taken at once (last byte of each record)
+        rtypes=bytearray(memoryview(buf)[offset+2*size-1:offset+hdr.sdb_records*size:size].tobytes())
+        formats=cls.FORMATS
+        empty=formats[sdb_record.TYPE_EMPTY]
+        records=[hdr]
+        for i, rtype in enumerate(rtypes):
+            fmt, rec, texts = formats.get(rtype, empty)
+            values=fmt.unpack_from(buf, offset+(i+1)*size)
+            if texts:
+                values=list(values)
+                for j in texts:
+                    values[j]=values[j].rstrip(b"\0").decode("latin-1")
+            records.append(rec._make(values))
+        return records
+
+    def table(self, address):
+        """
+        Decode the table at address
+        """
+        nrec=struct.unpack_from(">H", self._view(address+4, 2))[0]
+        return self.decode_table(self._view(address, nrec*self.RECORD_SIZE))
+
+    def walk(self, base, offset=0, prefix=""):
+        """
+        Iterate over all the components (same order and addresses as SDBNode.walk())
+
+        Return: A generator of (record, full_wb_address, buspath)
+        """
+        records=self.table(base)
+        for i, rec in enumerate(records[1:]):
+            if rec.record_type in (sdb_record.TYPE_INTERCONNECT, sdb_record.TYPE_DEVICE, sdb_record.TYPE_BRIDGE):
+                yield (rec, offset+rec.addr_first, "%s%d" %(prefix, i+1))
+            if rec.record_type == sdb_record.TYPE_BRIDGE:
+                for item in self.walk(rec.sdb_child, rec.addr_first, "%s%d." %(prefix, i+1)):
+                    yield item
@@ -0,0 +1,161 @@
+#!   /usr/bin/env   python
+# -*- coding: utf-8 -*
+'''
+This file contains the class SDBImage which is a child of the abstract class GenDrv (gendrvr.py)
+
+It replays the SDB tables exported from a device (i.e: sdb_tool.py --export)
+so the SDB tools can be used offline.
+
+@file
+@copyright LGPL v2.1
+@see http://www.ohwr.org
+@see http://www.sevensols.com
+@ingroup bridges
+'''
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+#-------------------------------------------------------------------------------
+#                                  Import                                     --
+#-------------------------------------------------------------------------------
+# Import system modules
+import sys
+import json
+import array
+import binascii
+import time
+# Import common modules
+from core.gendrvr import *
+
+
+class SDBImage(GenDrvr):
+    '''
+    Bus driver that serves the reads from an exported SDB image.
+
+    The image is a JSON file with the raw SDB tables (big-endian, as read on
+    the bus) and the resolved tree (one line per component) which is useful
+    to diff the memory map of two gateware builds. Only the addresses of the
+    tables can be read, the others raise a BusWarning like an unmapped address.
+    The writes are kept in memory.
+    '''
+
+    VERSION = 1
+
+    blockread = True
+
+    def __init__(self, fpath=None):
+        """Constructor method: call open() if a file is given"""
+        self.words = {}
+        self.root = None
+        self.libname = "sdbimage"
+        if fpath is not None:
+            self.open(fpath)
+
+    def open(self, fpath):
+        """Load the image file"""
+        self.fpath = fpath
+        with open(fpath) as f:
+            image = json.load(f)
+        self.root = image["root"]
+        self.words = {}
+        for addr, data in image["tables"].items():
+            words = array.array('I', binascii.unhexlify(data))
+            if sys.byteorder == 'little':
+                words.byteswap()
+            base = int(addr, 0)
+            for i, word in enumerate(words):
+                self.words[base+4*i] = word
+
+    def close(self):
+        """Nothing to close: the image is in memory"""
+        pass
+
+    def devread(self, bar, offset, width):
+        '''
+        Method that do a read on the image
+
+        Args:
+            bar : BAR used by PCIe bus (not need here)
+            offset : address within bar
+            width : data size (1, 2, or 4 bytes)
+        '''
+        try:
+            return self.words[offset]
+        except KeyError:
+            raise BusWarning("Address 0x%08x is not in the image" % (offset))
+
+    def devwrite(self, bar, offset, width, datum):
+        '''
+        Method that do a write on the image (in memory only)
+
+        Args:
+            bar : BAR used by PCIe bus (not need here)
+            offset : address within bar
+            width : data size (1, 2, or 4 bytes)
+            datum : data value that need to be written
+        '''
+        self.words[offset] = datum & 0xFFFFFFFF
+
+    def devblockread(self, bar, offset, bsize, incr=0x4):
+        '''
+        Method that read a data block from the image
+
+        Args:
+            bar : BAR used by PCIe bus (not need here)
+            offset : address within bar
+            bsize : size in bytes
+            incr : address increment (0 to read a FIFO)
+        '''
+        return [self.devread(bar, offset+i*incr, 4) for i in range(bsize//4)]
+
+    @staticmethod
+    def scan(options=None):
+        '''
+        No device to scan: the images are files
+        '''
+        return []
+
+    def info(self):
+        """get a string describing the image"""
+        return "SDB image: %s" % (getattr(self, "fpath", ""))
+
+    @classmethod
+    def export(cls, node, fpath, lun=""):
+        '''
+        Save a parsed SDBNode tree to an image file
+
+        The placeholders of a lazy parse are expanded first.
+
+        Args:
+            node : the root SDBNode
+            fpath : path of the image file
+            lun : name of the device (only informative)
+        '''
+        tree = []
+        for e, addr, buspath in node.walk(): # walk() expands the whole tree
+            prod = e.sdb_component.product
+            tree.append("%-14s %016x:%08x  %16x  %s" % (buspath, prod.vendor_id, prod.device_id,
+                                                      addr, prod.name.decode("latin-1").rstrip()))
+        image = {
+            "version": cls.VERSION,
+            "lun": lun,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "root": node.base,
+            "tables": dict(("0x%08x" % (addr), binascii.hexlify(data).decode("ascii"))
+                           for addr, data in node.tables().items()),
+            "tree": tree,
+        }
+        with open(fpath, "w") as f:
+            json.dump(image, f, indent=1, sort_keys=True)
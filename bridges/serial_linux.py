@@ -31,6 +31,7 @@ The serial_linux class allows to connect with WR devices over serial port in Lin
 from core.p7sException import *
 from core.serial_str_cleaner import *
 from bridges.consolebridge import ConsoleBridge
+from bridges.serial_script import SerialScript
 from core.ewberrno import *
 import subprocess
 import os
@@ -39,7 +40,7 @@ import time
 import string
 
 
-class SerialLinux(ConsoleBridge) :
+class SerialLinux(SerialScript, ConsoleBridge) :
     '''
     Class that simplifies serial communication for use with WR LEN PTS in Linux.
 
@@ -0,0 +1,123 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+The SerialScript class implements the register batches of the serial bridges.
+
+@file
+@copyright LGPL v2.1
+@ingroup bridges
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import serial
+import time
+
+from core.p7sException import *
+from core.ewberrno import Ewberrno
+
+
+class SerialScript(object) :
+    '''
+    Mixin with the read_many()/write_many() of the bridges using the WRPC console.
+
+    All the "wb read"/"wb write" commands of a batch are written as a single
+    script and the output lines are read back at once. The class using it
+    must provide: _serial (an opened serial.Serial), verbose, INTERCHARTIMEOUT
+    and WRTIMEOUT.
+    '''
+
+    def read_many(self, addresses) :
+        '''
+        Method that reads several registers with a single console script
+
+        All the "wb read" commands are written at once and the values are
+        picked from the returned lines (the echoed commands are skipped).
+
+        Args:
+            addresses (list) : addresses of the registers
+
+        Returns:
+            The list of values read (in the same order)
+        '''
+        addresses = list(addresses)
+        script = "".join(["wb read 0x%X\r" % (addr) for addr in addresses])
+        values = []
+        for line in self._run_script(script, len(addresses)*2) :
+            try :
+                values.append(int(line,0))
+            except ValueError :
+                pass # echo of the command
+        if len(values) != len(addresses) :
+            raise Retry(Ewberrno.EIO, "Batch read failed : %d values of %d" % (len(values), len(addresses)))
+        return values
+
+
+    def write_many(self, pairs) :
+        '''
+        Method that writes several registers with a single console script
+
+        Args:
+            pairs (list) : list of (address, value)
+        '''
+        pairs = list(pairs)
+        script = "".join(["wb write 0x%X 0x%X\r" % (addr, datum) for addr, datum in pairs])
+        lines = self._run_script(script, len(pairs))
+        if len(lines) != len(pairs) :
+            raise Retry(Ewberrno.EIO, "Batch write failed : %d echoes of %d" % (len(lines), len(pairs)))
+
+
+    def _run_script(self, script, nlines) :
+        '''
+        Write a console script and read back its output
+
+        Args:
+            script (str) : Commands, each one ended by '\\r'
+            nlines (int) : Number of lines expected
+
+        Returns:
+            The list of non empty lines read, without the line endings
+            (stops before nlines on read timeout)
+        '''
+        if self.verbose :
+            print("\t %s" % (script))
+        try :
+            self._serial.flushInput()
+            self._serial.flushOutput()
+            data = script.encode('ascii')
+            bwr = 0
+            # Is necessary to write char by char because is needed to make a
+            # timeout between each write
+            for i in range(len(data)) :
+                bwr += self._serial.write(data[i:i+1])
+                time.sleep(self.INTERCHARTIMEOUT) # Intern interCharTimeout isn't working, so put a manual timeout
+            self._serial.flush()
+
+            if bwr != len(data):
+                raise Retry(Ewberrno.EIO, "Write of script failed. Bytes writed : %d of %d." % (bwr,len(data)))
+
+            time.sleep(self.WRTIMEOUT)
+            lines = []
+            while len(lines) < nlines :
+                rd = self._serial.readline()
+                if not rd : break # read timeout
+                line = rd.decode('ascii', 'replace').strip()
+                if line : lines.append(line)
+            return lines
+
+        except serial.SerialTimeoutException as e :
+            raise Retry(Ewberrno.EIO, "Write timeout (%d sec) exceeded : %s" % (self.WRTIMEOUT,e))
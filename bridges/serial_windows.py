@@ -31,6 +31,7 @@ The serial_windows class allows to connect with WR devices over serial port in W
 from core.p7sException import *
 from core.serial_str_cleaner import *
 from bridges.consolebridge import ConsoleBridge
+from bridges.serial_script import SerialScript
 from bridges.serial_bridge import *
 from core.ewberrno import *
 import subprocess
@@ -41,7 +42,7 @@ import string
 
 
 
-class SerialWindows(ConsoleBridge) :
+class SerialWindows(SerialScript, ConsoleBridge) :
     '''
     Class that simplifies serial communication for use with WR LEN PTS in Linux.
 
@@ -29,13 +29,14 @@ Implement the access to wishbone UART
 from core.p7sException import *
 from core.serial_str_cleaner import *
 from core.gendrvr import *
+from bridges.serial_script import SerialScript
 import subprocess
 import os
 import serial
 import time
 import string
 
-class wb_UART(GenDrvr) :
+class wb_UART(SerialScript, GenDrvr) :
     '''
     Class that simplifies serial communication for use with WR LEN PTS.
 
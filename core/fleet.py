@@ -0,0 +1,176 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Class to run WRPC command scripts on several WR devices at the same time.
+
+@file
+@copyright LGPL v2.1
+@ingroup tools
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# User defined modules
+from bridges.VUART_bridge import VUART_bridge
+from bridges.ethbone import EBSession
+from core.gendrvr import BusException, BusWarning
+from core.p7sException import *
+from core.ewberrno import Ewberrno
+
+
+# Result of a command executed on a device.
+# index is the position of the command in the script (-1 when the device
+# could not be opened), latency is in seconds and error is None on success.
+FleetResult = namedtuple("FleetResult", "ip index cmd output latency error")
+
+
+class VUART_fleet(object):
+    '''
+    This class runs the same WRPC command script on a list of WR devices.
+
+    Every device is handled by a worker of a bounded thread pool, so its
+    commands are sent strictly in order, while the devices run concurrently.
+    All the devices share one Etherbone session (a single socket). The
+    results are returned as soon as each command completes. Example:
+
+        fleet = VUART_fleet(["192.168.7.10", "192.168.7.11"], workers=16)
+        for res in fleet.run(["ver", "stat"]):
+            print(res.ip, res.cmd, res.latency)
+
+    If a command fails the remaining commands of that device are skipped.
+    '''
+
+    def __init__(self, ips, workers=16, verbose=False, session=None, retry=3, timeout=None,
+                 sdb_refresh=False):
+        '''
+        Constructor
+
+        Args:
+            ips (list) : IP addresses of the devices
+            workers (int) : Max number of devices handled at the same time
+            verbose (bool) : Enables verbose output
+            session (EBSession) : Etherbone session to use (a new one by default)
+            retry (int) : How many times a command is sent again after a bus error
+            timeout (float) : Max time (sec) to wait for the output of a command
+            sdb_refresh (bool) : Ignore the SDB cache and parse again the devices
+        '''
+        self.ips = list(ips)
+        self.workers = max(1, min(workers, len(self.ips) or 1))
+        self.verbose = verbose
+        self.retry = retry
+        self.timeout = timeout
+        self.sdb_refresh = sdb_refresh
+        self.session, self.own_session = EBSession.for_workers(session, self.workers, verbose)
+
+    @staticmethod
+    def load_script(script):
+        '''
+        Return the list of commands of a script (empty lines and '#' comments are skipped)
+
+        Args:
+            script : a list of commands or an opened file
+        '''
+        cmds = []
+        for line in script:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                cmds.append(line)
+        return cmds
+
+    def run(self, script):
+        '''
+        Run a command script on all the devices
+
+        Args:
+            script : a list of commands or an opened file
+
+        Returns:
+            A generator of FleetResult in completion order.
+        '''
+        cmds = self.load_script(script)
+        results = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for ip in self.ips:
+                pool.submit(self._run_device, ip, cmds, results)
+            for i in range(len(self.ips)):
+                while True:
+                    res = results.get()
+                    if res is None: break # this device is done
+                    yield res
+        finally:
+            pool.shutdown(wait=True)
+            if self.own_session:
+                self.session.close()
+
+    def _run_device(self, ip, cmds, results):
+        '''
+        Worker: open one device and send it the commands in order
+        '''
+        try:
+            t0 = time.time()
+            vuart = None
+            try:
+                vuart = VUART_bridge("eth", ip, self.verbose, session=self.session,
+                                     sdb_refresh=self.sdb_refresh)
+                vuart.open()
+                vuart.flushInput()
+            except Exception as e:
+                if vuart is not None:
+                    vuart.close() # release the device if it was opened
+                results.put(FleetResult(ip, -1, None, None, time.time()-t0, e))
+                return
+
+            try:
+                for index, cmd in enumerate(cmds):
+                    t0 = time.time()
+                    try:
+                        out = self._send(vuart, cmd)
+                    except (BusException, p7sException) as e:
+                        results.put(FleetResult(ip, index, cmd, None, time.time()-t0, e))
+                        break
+                    results.put(FleetResult(ip, index, cmd, out, time.time()-t0, None))
+            finally:
+                vuart.close()
+        finally:
+            results.put(None)
+
+    def _send(self, vuart, cmd):
+        '''
+        Send a command, retrying on bus errors like VUART_shell does
+        '''
+        attempts = 0
+        while True:
+            try:
+                out = vuart.sendCommand(cmd, self.timeout)
+            except BusWarning as e:
+                if attempts >= self.retry:
+                    raise Error(Ewberrno.EIO, "Too many errors executing the command %s" % cmd)
+                attempts += 1
+                continue
+            if out == vuart.NOT_READY:
+                raise Error(Ewberrno.EBUSY, "%s: %s" % (vuart.NOT_READY, cmd))
+            return out
@@ -32,6 +32,9 @@ File with generic abstract class for bus access
 # Import system modules
 import abc
 import os
+import array
+import time
+from concurrent.futures import Future
 from ctypes import *
 #import ctypes
 
@@ -44,6 +47,12 @@ class BusCritical(BusException):
 class BusWarning(BusException):
     pass
 
+class BusTimeout(BusWarning):
+    pass
+
+# Monotonic clock for the timeouts (not available in python 2)
+_monotonic = getattr(time, "monotonic", time.time)
+
 
 class GenDrvr(object):
     '''
@@ -61,6 +70,8 @@ class GenDrvr(object):
     hdev=-1
     bar=0
     ndev=1 ##Actual number detected device on the bus
+    blockread=False ##devblockread() is implemented by the driver
+    blockwrite=False ##devblockwrite() is implemented by the driver
 
 
     def load_lib(self, libname=""):
@@ -139,6 +150,18 @@ class GenDrvr(object):
         raise NameError('Undef function')
         return 0;
 
+    def devblockread_buffer(self, bar, offset, bsize, incr=0x4):
+        '''
+        Method that do a block read and return a buffer of 32bits words
+            bar : BAR used by PCIe bus
+            offset : address within bar
+            bsize : size in bytes
+
+        By default it copies the list returned by devblockread(), children
+        should redefine it when they can fill the buffer directly.
+        '''
+        return memoryview(array.array('I', self.devblockread(bar, offset, bsize, incr)))
+
     def devblockwrite(self, bar, offset, ldata, incr=0x4):
         '''
         Abstract method that do a read on the devices
@@ -149,6 +172,45 @@ class GenDrvr(object):
         raise NameError('Undef function')
         return 0;
 
+    def devblockwrite_buffer(self, bar, offset, data, incr=0x4):
+        '''
+        Method that do a block write from a buffer of 32bits words
+            bar : BAR used by PCIe bus
+            offset : address within bar
+            data : array('I'), memoryview or list of 32bits words
+
+        By default it calls devblockwrite() with a list, children
+        should redefine it when they can send the buffer directly.
+        '''
+        return self.devblockwrite(bar, offset, list(data), incr)
+
+
+    def devread_async(self, bar, offset, width):
+        '''
+        Method that do a non-blocking read and return a concurrent.futures.Future
+
+        By default the read is done synchronously and the future is already completed.
+        '''
+        fut = Future()
+        try:
+            fut.set_result(self.devread(bar, offset, width))
+        except BusException as e:
+            fut.set_exception(e)
+        return fut
+
+    def devwrite_async(self, bar, offset, width, datum):
+        '''
+        Method that do a non-blocking write and return a concurrent.futures.Future
+
+        By default the write is done synchronously and the future is already completed.
+        '''
+        fut = Future()
+        try:
+            self.devwrite(bar, offset, width, datum)
+            fut.set_result(None)
+        except BusException as e:
+            fut.set_exception(e)
+        return fut
 
     def irqena(self):
         """enable the interrupt line"""
@@ -186,6 +248,66 @@ class GenDrvr(object):
         ''' Perform a simple 32b write '''
         self.devwrite(self.bar, offset, 4, datum)
 
+    def read_many(self, addresses):
+        ''' Perform several 32b reads (can be redefined to use less round trips) '''
+        return [self.read(addr) for addr in addresses]
+
+    def write_many(self, pairs):
+        ''' Perform several 32b writes from a list of (address, value) '''
+        for addr, datum in pairs:
+            self.write(addr, datum)
+
+    def wait_until(self, offset, mask, value=None, timeout=1.0, poll_min=0.0002, poll_max=0.05,
+                   on_change=None, restart=False):
+        '''
+        Wait until a 32b register matches a mask condition
+
+        The condition is "any bit of mask set" when value is None and
+        (reg & mask) == value otherwise. The register is read again after a
+        delay that starts at poll_min and is doubled up to poll_max, so
+        short waits return quickly and long ones do not load the bus.
+
+        Args:
+            offset : address of the register
+            mask : bits to check
+            value : expected value of the masked bits (None: any bit set)
+            timeout : max time in seconds (monotonic clock)
+            poll_min, poll_max : first and max delay between reads
+            on_change : function called with the new value when the register changes
+            restart : restart the timeout when the register changes
+
+        Returns:
+            The last value read
+
+        Raises:
+            BusTimeout: when the condition is not true before the timeout
+        '''
+        deadline = _monotonic()+timeout
+        delay = poll_min
+        old = None
+        while True:
+            reg = self.read(offset)
+            if (reg & mask) if value is None else (reg & mask) == value:
+                return reg
+            if reg != old:
+                if old is not None:
+                    if on_change is not None: on_change(reg)
+                    if restart: deadline = _monotonic()+timeout
+                old = reg
+            now = _monotonic()
+            if now >= deadline:
+                raise BusTimeout("Timeout waiting 0x%08x & 0x%08x (last 0x%08x)" % (offset, mask, reg))
+            time.sleep(min(delay, deadline-now))
+            delay = min(2*delay, poll_max)
+
+    def read_async(self, offset):
+        ''' Perform a simple 32b non-blocking read (return a Future) '''
+        return self.devread_async(self.bar, offset, 4)
+
+    def write_async(self, offset, datum):
+        ''' Perform a simple 32b non-blocking write (return a Future) '''
+        return self.devwrite_async(self.bar, offset, 4, datum)
+
     def write32(self, offset, datum):
         ''' Perform a simple 32b write '''
         self.devwrite(self.bar, offset, 4, datum)
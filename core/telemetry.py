@@ -0,0 +1,329 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Collector of the WR servo parameters (stat command) of several WR devices.
+
+@file
+@copyright LGPL v2.1
+@ingroup tools
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import time
+import array
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# User defined modules
+from bridges.VUART_bridge import VUART_bridge
+from bridges.ethbone import EBSession
+from core.gendrvr import _monotonic
+from core.p7sException import *
+from core.ewberrno import Ewberrno
+from core.wrstat import parse_stat
+
+# Fields of the stat command sampled by default (all of them in ps)
+METRICS = ("mu", "dms", "dtxm", "drxm", "dtxs", "drxs", "asym", "crtt", "cko", "setp")
+
+# Numeric fields of the stat command that can be sampled
+NUMERIC_FIELDS = METRICS + ("sv", "aux", "sec", "nsec", "hd", "md", "ad", "temp")
+
+
+def _csv_value(v):
+    '''
+    Format a sample for the CSV file (empty when it is missing)
+    '''
+    if math.isnan(v):
+        return ""
+    return "%d" % v if v == int(v) else repr(v)
+
+
+class RingBuffer(object):
+    '''
+    Fixed size buffer of float values backed by an array.
+
+    When it is full the oldest value is overwritten. The missing values are
+    stored as NaN and are skipped by stats().
+    '''
+
+    def __init__(self, size, typecode='d'):
+        '''
+        Constructor
+
+        Args:
+            size (int) : Max number of values
+            typecode (str) : array typecode of the values
+        '''
+        self.size = size
+        self.data = array.array(typecode, [0]) * size
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        '''
+        Add a value (None is stored as NaN)
+        '''
+        self.data[self.pos] = float("nan") if value is None else value
+        self.pos = (self.pos + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def values(self):
+        '''
+        Return an array with the values from the oldest to the newest
+        '''
+        if self.count < self.size:
+            return self.data[:self.count]
+        return self.data[self.pos:] + self.data[:self.pos]
+
+    def stats(self, percentiles=(50, 90, 99)):
+        '''
+        Return a dict with count, min, max, mean and the percentiles ("p50"...)
+
+        The percentiles are interpolated between the closest values. All of
+        them are None when the buffer has no valid values.
+        '''
+        vals = sorted(v for v in self.values() if not math.isnan(v))
+        n = len(vals)
+        ret = {"count": n}
+        if n == 0:
+            ret.update(min=None, max=None, mean=None)
+            for p in percentiles:
+                ret["p%g" % p] = None
+            return ret
+        ret.update(min=vals[0], max=vals[-1], mean=math.fsum(vals)/n)
+        for p in percentiles:
+            k = (n - 1) * p / 100.0
+            lo = int(k)
+            hi = min(lo + 1, n - 1)
+            ret["p%g" % p] = vals[lo] + (vals[hi] - vals[lo]) * (k - lo)
+        return ret
+
+
+class WRTelemetry(object):
+    '''
+    This class samples the output of the stat command of a list of WR devices.
+
+    Every device has one RingBuffer per metric plus one with the timestamps
+    (seconds since the epoch), so the memory used does not grow with the
+    time. The devices are sampled at the same time by a thread pool and
+    share one Etherbone session. Example:
+
+        tm = WRTelemetry(["192.168.7.10", "192.168.7.11"], rate=2.0)
+        tm.open()
+        tm.run(duration=60)
+        print(tm.stats("192.168.7.10", "cko"))
+        tm.to_csv("servo.csv")
+        tm.close()
+
+    The samples of a device that fails (or could not be opened, see
+    open_errors) are stored as NaN and counted in errors[ip].
+    '''
+
+    def __init__(self, ips, rate=1.0, size=3600, metrics=METRICS, workers=16,
+                 verbose=False, session=None, timeout=None, sdb_refresh=False):
+        '''
+        Constructor
+
+        Args:
+            ips (list) : IP addresses of the devices
+            rate (float) : Samples per second
+            size (int) : Number of samples kept for each metric
+            metrics (tuple) : Fields of the stat command to sample
+            workers (int) : Max number of devices sampled at the same time
+            verbose (bool) : Enables verbose output
+            session (EBSession) : Etherbone session to use (a new one by default)
+            timeout (float) : Max time (sec) to wait for the output of stat
+            sdb_refresh (bool) : Ignore the SDB cache and parse again the devices
+
+        Raises:
+            Error : When a metric is not a numeric field of the stat command.
+        '''
+        self.ips = list(ips)
+        self.rate = float(rate)
+        self.size = size
+        self.metrics = tuple(metrics)
+        for m in self.metrics:
+            if m not in NUMERIC_FIELDS:
+                raise Error(Ewberrno.EINVAL, "'%s' is not a numeric field of stat (%s)" % (m, ", ".join(NUMERIC_FIELDS)))
+        self.workers = max(1, min(workers, len(self.ips) or 1))
+        self.verbose = verbose
+        self.timeout = timeout
+        self.sdb_refresh = sdb_refresh
+        self.session, self.own_session = EBSession.for_workers(session, self.workers, verbose)
+        self.vuarts = {}
+        self.errors = dict((ip, 0) for ip in self.ips)
+        self.open_errors = {}   # ip -> exception raised opening the device
+        self.buffers = {}
+        for ip in self.ips:
+            self.buffers[ip] = dict((m, RingBuffer(size)) for m in ("time",) + self.metrics)
+        self.pool = None
+
+    def open(self):
+        '''
+        Open the virtual UART of all the devices
+
+        A device that can not be opened does not stop the others: its
+        error is kept in open_errors and it is not sampled.
+        '''
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        list(self.pool.map(self._open_device, self.ips))
+
+    def _open_device(self, ip):
+        '''
+        Worker: open the virtual UART of a device
+        '''
+        vuart = None
+        try:
+            vuart = VUART_bridge("eth", ip, self.verbose, session=self.session,
+                                 sdb_refresh=self.sdb_refresh)
+            vuart.open()
+            vuart.flushInput()
+        except Exception as e:
+            if vuart is not None:
+                vuart.close() # release the device if it was opened
+            if self.verbose: print("%s: %s" % (ip, e))
+            self.open_errors[ip] = e
+            return
+        self.vuarts[ip] = vuart
+
+    def close(self):
+        '''
+        Release the devices
+        '''
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        for vuart in self.vuarts.values():
+            vuart.close()
+        self.vuarts = {}
+        if self.own_session:
+            self.session.close()
+
+    def record(self, ip, stat, timestamp=None):
+        '''
+        Store one sample of a device
+
+        Args:
+            ip (str) : IP address of the device
+            stat : WRStat from parse_stat() or None when the sample failed
+            timestamp (float) : time of the sample (now by default)
+        '''
+        bufs = self.buffers[ip]
+        bufs["time"].append(time.time() if timestamp is None else timestamp)
+        for m in self.metrics:
+            value = None if stat is None else stat.fields.get(m)
+            bufs[m].append(value if isinstance(value, (int, float)) else None)
+
+    def _sample_device(self, ip):
+        '''
+        Worker: read and store the stat output of a device
+        '''
+        t = time.time()
+        vuart = self.vuarts.get(ip)
+        stat = None
+        if vuart is not None:
+            try:
+                out = vuart.sendCommand("stat", self.timeout)
+                if out == vuart.NOT_READY:
+                    raise Error(Ewberrno.EBUSY, out)
+                stat = parse_stat(out)
+            except Exception as e:
+                # A failed device must not stop the sampling of the others
+                if self.verbose: print("%s: %s" % (ip, e))
+        if stat is None:
+            self.errors[ip] += 1
+        self.record(ip, stat, t)
+
+    def sample(self):
+        '''
+        Take one sample of all the devices
+        '''
+        if self.pool is None:
+            raise Error(Ewberrno.EBADF, "The telemetry collector is not open")
+        list(self.pool.map(self._sample_device, self.ips))
+
+    def run(self, duration=None, samples=None, callback=None):
+        '''
+        Sample the devices at the configured rate
+
+        It stops after the duration or the number of samples (ctrl-c
+        otherwise). The period does not drift with the time spent reading.
+
+        Args:
+            duration (float) : Seconds to sample
+            samples (int) : Number of samples to take
+            callback : function called with this object after every sample
+        '''
+        period = 1.0 / self.rate
+        start = _monotonic()
+        n = 0
+        while True:
+            self.sample()
+            n += 1
+            if callback is not None:
+                callback(self)
+            if samples is not None and n >= samples:
+                break
+            next_t = start + n * period
+            if duration is not None and next_t - start >= duration:
+                break
+            delay = next_t - _monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stats(self, ip, metric, percentiles=(50, 90, 99)):
+        '''
+        Return the statistics of a metric of a device (see RingBuffer.stats)
+        '''
+        return self.buffers[ip][metric].stats(percentiles)
+
+    def to_csv(self, fpath):
+        '''
+        Save the samples to a CSV file (one row per device and sample)
+        '''
+        with open(fpath, "w") as f:
+            f.write("ip,time,%s\n" % ",".join(self.metrics))
+            for ip in self.ips:
+                cols = [self.buffers[ip][m].values() for m in ("time",) + self.metrics]
+                for row in zip(*cols):
+                    f.write("%s,%.6f,%s\n" % (ip, row[0],
+                            ",".join(_csv_value(v) for v in row[1:])))
+
+    def to_npz(self, fpath):
+        '''
+        Save the samples to a numpy .npz file (one array "<ip>/<metric>" per metric)
+
+        Raises:
+            Error : When numpy is not installed.
+        '''
+        if numpy is None:
+            raise Error(Ewberrno.ENOSYS, "numpy is required to export .npz files")
+        arrays = {}
+        for ip in self.ips:
+            for m, buf in self.buffers[ip].items():
+                arrays["%s/%s" % (ip, m)] = numpy.frombuffer(buf.values(), dtype=numpy.float64)
+        numpy.savez(fpath, **arrays)
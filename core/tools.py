@@ -29,6 +29,7 @@ The class and methods here still needs a little bit of clean-up
 #-------------------------------------------------------------------------------
 # Import system modules
 import sys, select
+import socket
 #import tty,termios, time
 from ctypes import *
 
@@ -39,6 +40,31 @@ except NameError:
     pass
 
 # Import custom modules
+from core.p7sException import *
+from core.ewberrno import Ewberrno
+
+
+def load_ips(ips=(), fpath=None):
+    """
+    Return the IP addresses of the command line plus the ones listed in a file
+
+    Args:
+        ips (list) : IP addresses
+        fpath (str) : File with one IP by line (empty lines and '#' comments are skipped)
+
+    Raises:
+        Error : When an IP address is not valid.
+    """
+    ips = list(ips)
+    if fpath:
+        with open(fpath) as f:
+            ips += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    for ip in ips:
+        try:
+            socket.inet_aton(ip)
+        except socket.error:
+            raise Error(Ewberrno.EBADIP, "Illegal IP address passed (%s)" % ip)
+    return ips
 
 
 class KeyInput:
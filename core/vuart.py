@@ -44,6 +44,7 @@ from bridges.VUART_bridge import VUART_bridge
 from core.gendrvr import BusCritical, BusWarning
 from core.p7sException import *
 from core.ewberrno import Ewberrno
+from core.wrstat import parse_stat
 
 
 class VUART_shell():
@@ -65,54 +66,26 @@ class VUART_shell():
 
     # Get the IP
     IP_REGEX = '\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}'
-    # Get the WR mode
-    MODE_REGEX = '[a-zA-Z]+_[a-zA-Z]+_[a-zA-Z]+'
     # Get the temp value
     TEMP_REGEX = '\d{1,3}\.\d{4}'
     # Get the servo state
     SERVO_REGEX = 'ss:\'\w*\''
     # Get TAI Time (from "time" command)
     TIME_REGEX = '^\w{3}.*\w{3}.*\d+.*\d{4}.*\d{2}:\d{2}:\d{2}'
-    # Get Link, RX, TX y lock of each WR port (append wrX at the begining of the regexp)
-    PORT_REGEX = '.*lnk:(\d).*rx:(\d+).*tx:(\d+).*lock:(\d+)'
-    INDEX_LNK = 1
-    INDEX_RX = 2
-    INDEX_TX = 3
-    INDEX_LOCK = 4
-    # Get servo state
-    SS_REGEX = 'ss:\'(\w+)\''
-    # Get sync source
-    SYNCS_REGEX = 'syncs:(wr\d{1})'
-    # Get Round-trip time
-    RTT_REGEX = 'mu:(\d+)'
-    # Get Master-slave delay
-    MSDEL_REGEX = 'dms:(\d+)'
-    # Get Master PHY delays
-    MPHYDEL_REGEX = 'dtxm:(\d+).*drxm:(\d+)'
-    # Get Slave PHY delays
-    SPHYDEL_REGEX = 'dtxs:(\d+).*drxs:(\d+)'
-    # Get total link asymmetry (it could be a negative number)
-    ASYM_REGEX = 'asym:(.?\d+)'
-    # Get rtt delay
-    CRTT_REGEX = 'crtt:(\d+)'
-    # Get clock offset
-    CKO_REGEX = 'cko:(.?\d+)'
-    # Get phase setpoint
-    PSETP_REGEX = 'setp:(\d+)'
-
-
-    def __init__(self, ip, verbose=False):
+
+    def __init__(self, ip, verbose=False, sdb_refresh=False):
         '''
         Constructor
 
         Args:
             ip (str) : IP direction for the device
             verbose (bool) : Enables verbose output
+            sdb_refresh (bool) : Ignore the SDB cache and parse again the device.
 
         Raises:
             ConsoleError : When the specified device fails opening.
         '''
-        self.vuart = VUART_bridge("eth", ip, verbose)
+        self.vuart = VUART_bridge("eth", ip, verbose, sdb_refresh=sdb_refresh)
         if verbose: print('Openning vuart bridge...')
         
         attemps = 3
@@ -138,22 +111,9 @@ class VUART_shell():
         #self.__get_firm_date__(ver.decode('utf8', errors='ignore'))
         self.__get_firm_date__(ver)
 
-        # Compile regular expresions
-        self.mode_regex = re.compile(self.MODE_REGEX)
+        # Compile regular expresions (the stat output is parsed by parse_stat)
         self.time_regex = re.compile(self.TIME_REGEX)
-        self.wr0_regex = re.compile("%s%s" % ("wr0", self.PORT_REGEX))
-        self.wr1_regex = re.compile("%s%s" % ("wr1", self.PORT_REGEX))
         self.ip_regex = re.compile(self.IP_REGEX)
-        self.syncs_regex = re.compile(self.SYNCS_REGEX)
-        self.rtt_regex = re.compile(self.RTT_REGEX)
-        self.msdel_regex = re.compile(self.MSDEL_REGEX)
-        self.mphydel_regex = re.compile(self.MPHYDEL_REGEX)
-        self.sphydel_regex = re.compile(self.SPHYDEL_REGEX)
-        self.asym_regex = re.compile(self.ASYM_REGEX)
-        self.crtt_regex = re.compile(self.CRTT_REGEX)
-        self.cko_regex = re.compile(self.CKO_REGEX)
-        self.psetp_regex = re.compile(self.PSETP_REGEX)
-        self.ss_regex = re.compile(self.SS_REGEX)
 
         
     def __secure_sendCommand__(self, cmd, retry=3):
@@ -225,21 +185,21 @@ class VUART_shell():
         sync_info_valid = 2
         #raw = stat.decode('utf8')
         #time = time.decode('utf8')
-        raw = stat
+        st = parse_stat(stat)
         time = time
-        board_mode = self.mode_regex.search(raw).group(0)
+        board_mode = st.mode
 
         if board_mode is None:
             raise Error(p7sException.err[Ewberrno.ENODEV], "Could not retrieve mode from WR-LEN")
 
-        wr0 = self.wr0_regex.search(raw)
-        wr1 = self.wr1_regex.search(raw)
+        wr0 = st.ports.get("wr0")
+        wr1 = st.ports.get("wr1")
         if wr0 is None or wr1 is None:
             print("\n")
             return
 
-        wr0_enable = wr0.group(1) == '1'
-        wr1_enable = wr1.group(1) == '1'
+        wr0_enable = wr0.lnk == 1
+        wr1_enable = wr1.lnk == 1
 
         sys.stdout.write("\033[94;1mWR PTP Core Sync Monitor: PPSI - WRLEN\033[0m\n")
         sys.stdout.write("\033[2mEsc = ctrl-c\033[0m\n\n")
@@ -264,7 +224,7 @@ class VUART_shell():
         if wr0_enable:
             m = "WR Master" if mode == "master" or mode == "slave_wr1" else "WR Slave"
             sys.stdout.write("\033[1mwr0 :\033[92m Link up  \033[0m\033[2m(RX: %s, TX: %s), mode: \033[0m\033[1m%s \033[0m\033[1;92m%s\033[0m\n\n" %\
-            (wr0.group(self.INDEX_RX), wr0.group(self.INDEX_TX), m,"Locked" if wr0.group(self.INDEX_LOCK)=="1" else "Link down"))
+            (wr0.rx, wr0.tx, m,"Locked" if wr0.lock == 1 else "Link down"))
         else:
             sys.stdout.write("\033[1mwr0 : \033[1;31mLink down\033[0m\n\n")
             sync_info_valid -= 1
@@ -273,51 +233,30 @@ class VUART_shell():
         if wr1_enable:
             m = "WR Master" if mode == "master" or mode == "slave_wr0" else "WR Slave"
             sys.stdout.write("\033[1mwr1 :\033[92m Link up  \033[0m\033[2m(RX: %s, TX: %s), mode: \033[0m\033[1m%s \033[0m\033[1;92m%s\033[0m\n\n" %\
-            (wr1.group(self.INDEX_RX), wr1.group(self.INDEX_TX), m,"Locked" if wr1.group(self.INDEX_LOCK)=="1" else "Link down"))
+            (wr1.rx, wr1.tx, m,"Locked" if wr1.lock == 1 else "Link down"))
         else:
             sys.stdout.write("\033[1mwr1 : \033[1;31mLink down\033[0m\n\n")
             sync_info_valid -= 1
 
         show_fail = False
         if sync_info_valid >= 1:
-            rtt = self.rtt_regex.search(raw)
-            if rtt == None:
+            if st.mu is None:
                 show_fail = True
             else :
-                ss = self.ss_regex.search(raw).group(1)
-                syncs = self.syncs_regex.search(raw).group(1)
-
-                sys.stdout.write("\033[1mServo state:             %s\033[0m\n" % ss)
-                sys.stdout.write("\033[1mSynchronization source:  %s\033[0m\n\n" % syncs)
+                sys.stdout.write("\033[1mServo state:             %s\033[0m\n" % st.ss)
+                sys.stdout.write("\033[1mSynchronization source:  %s\033[0m\n\n" % st.syncs)
 
                 sys.stdout.write("\033[34mTiming parameters:\033[0m\n\n")
-                rtt = rtt.group(1)
-                sys.stdout.write("\033[2mRound-trip time (mu):    \033[0m\033[1;97m%s ps\033[0m\n" % rtt)
-
-                msdel = self.msdel_regex.search(raw).group(1)
-                sys.stdout.write("\033[2mMaster-slave delay:      \033[0m\033[1;97m%s ps\033[0m\n" % msdel)
-
-                mphydel_tx = self.mphydel_regex.search(raw).group(1)
-                mphydel_rx = self.mphydel_regex.search(raw).group(2)
+                sys.stdout.write("\033[2mRound-trip time (mu):    \033[0m\033[1;97m%s ps\033[0m\n" % st.mu)
+                sys.stdout.write("\033[2mMaster-slave delay:      \033[0m\033[1;97m%s ps\033[0m\n" % st.dms)
                 sys.stdout.write("\033[2mMaster PHY delays:       \033[0m\033[1;97mTX: %s ps, RX: %s ps\033[0m\n" %\
-                (mphydel_tx, mphydel_rx))
-
-                sphydel_tx = self.sphydel_regex.search(raw).group(1)
-                sphydel_rx = self.sphydel_regex.search(raw).group(2)
+                (st.dtxm, st.drxm))
                 sys.stdout.write("\033[2mSlave PHY delays:        \033[0m\033[1;97mTX: %s ps, RX: %s ps\033[0m\n" %\
-                (sphydel_tx, sphydel_rx))
-
-                asym = self.asym_regex.search(raw).group(1)
-                sys.stdout.write("\033[2mTotal Link asymmetry:    \033[0m\033[1;97m%s ps\033[0m\n" % asym)
-
-                crtt = self.crtt_regex.search(raw).group(1)
-                sys.stdout.write("\033[2mCable rtt delay:         \033[0m\033[1;97m%s ps\033[0m\n" % crtt)
-
-                cko = self.cko_regex.search(raw).group(1)
-                sys.stdout.write("\033[2mClock offset:            \033[0m\033[1;97m%s ps\033[0m\n" % cko)
-
-                psetp = self.psetp_regex.search(raw).group(1)
-                sys.stdout.write("\033[2mPhase setpoint:          \033[0m\033[1;97m%s ps\033[0m\n" % psetp)
+                (st.dtxs, st.drxs))
+                sys.stdout.write("\033[2mTotal Link asymmetry:    \033[0m\033[1;97m%s ps\033[0m\n" % st.asym)
+                sys.stdout.write("\033[2mCable rtt delay:         \033[0m\033[1;97m%s ps\033[0m\n" % st.crtt)
+                sys.stdout.write("\033[2mClock offset:            \033[0m\033[1;97m%s ps\033[0m\n" % st.cko)
+                sys.stdout.write("\033[2mPhase setpoint:          \033[0m\033[1;97m%s ps\033[0m\n" % st.setp)
 
                 sys.stdout.write("\033[2mUpdate interval:         \033[0m\033[1;97m%.1f sec\033[0m\n" % self.refresh)
         elif sync_info_valid < 2 or show_fail:
@@ -465,7 +404,7 @@ class VUART_shell():
                 sys.stdout.write("\033[1mRefresh rate : %.2f secs\033[0m\n\n" % self.refresh)
                 while True:
                     try:
-                        ret = self.vuart.sendCommand(cmd)
+                        ret = self.vuart.sendCommand(cmd, self.vuart.SHORT_TIMEOUT)
                     except Error as e:
                         sys.stdout.write("\033[1;31mError:\033[0mConnection with the WR-LEN is lost\n")
                         #print("See the manual for more deatils")
@@ -27,9 +27,11 @@ The class in this files are designed to ease the process to Read/Write to the el
 #                                  Import                                      --
 #------------------------------------------ -------------------------------------
 # Import system modules
+import contextlib
 
 # Import custom modules
 from core.p7sException import *
+from core.gendrvr import _monotonic
 
 
 class WBOperator(object):
@@ -38,8 +40,23 @@ class WBOperator(object):
 
     This class has been designed as an helper for other classes
     in order to ease the R/W process to specific bit/field in a register.
+
+    An optional shadow of the registers can be enabled (see set_policy()) to
+    avoid the read-modify-write round trips on each field access:
+        - VOLATILE: the register is always accessed on the bus (default).
+        - CACHED: reads are cached during ttl seconds, writes go through.
+        - SHADOWED: write-only register, its value is kept in the shadow and
+        the writes are postponed until flush() is called.
     """
 
+    #Shadow policies
+    VOLATILE=0
+    CACHED=1
+    SHADOWED=2
+
+    #Default time to live (sec) of a cached register
+    SHADOW_TTL=1.0
+
     def __init__(self, bus):
         """
         Constructor
@@ -49,18 +66,149 @@ class WBOperator(object):
         """
         self.bus=bus
         self.base_addr=0x0
+        self.policies={}  # offset -> (policy, ttl), VOLATILE if not set
+        self.shadow={}    # offset -> (value, timestamp)
+        self.dirty=set()  # SHADOWED offsets waiting for flush()
+
+    def set_policy(self, offset, policy, ttl=None, value=0):
+        """
+        Select the shadow policy of a register
+
+        Args:
+            offset: Offset of the register
+            policy: VOLATILE, CACHED or SHADOWED
+            ttl: Time to live (sec) of a CACHED value (SHADOW_TTL by default)
+            value: Initial value of a SHADOWED register (reset value)
+        """
+        if policy not in (self.VOLATILE, self.CACHED, self.SHADOWED):
+            raise ValueError("Unknown shadow policy %s" % (policy))
+        self.policies[offset]=(policy, self.SHADOW_TTL if ttl is None else ttl)
+        self.shadow.pop(offset, None)
+        self.dirty.discard(offset)
+        if policy==self.SHADOWED:
+            self.shadow[offset]=(value, _monotonic())
+
+    def get_policy(self, offset):
+        """
+        Return the shadow policy of a register
+        """
+        return self.policies.get(offset, (self.VOLATILE, 0))[0]
+
+    def _shadow_get(self, offset):
+        """
+        Return the shadowed value of a register or None if it must be read
+        """
+        if offset not in self.shadow:
+            return None
+        policy, ttl = self.policies.get(offset, (self.VOLATILE, 0))
+        value, stamp = self.shadow[offset]
+        if policy==self.SHADOWED or (policy==self.CACHED and _monotonic()-stamp < ttl):
+            return value
+        return None
+
+    def _shadow_set(self, offset, value):
+        """
+        Update the shadow of a register (if any) after a bus access
+        """
+        if self.get_policy(offset)!=self.VOLATILE:
+            self.shadow[offset]=(value, _monotonic())
 
     def read(self, offset):
         """
         Read a value from an offset
         """
-        return self.bus.read(self.base_addr+offset)
+        value=self._shadow_get(offset)
+        if value is None:
+            value=self.bus.read(self.base_addr+offset)
+            self._shadow_set(offset, value)
+        return value
 
     def write(self, offset, value):
         """
         Write a value to an offset
         """
+        if self.get_policy(offset)==self.SHADOWED:
+            self.shadow[offset]=(value, _monotonic())
+            self.dirty.add(offset)
+            return
         self.bus.write(self.base_addr+offset, value)
+        self._shadow_set(offset, value)
+
+    def read_many(self, offsets):
+        """
+        Read several offsets using a single batch on the bus
+
+        The registers available in the shadow are not read.
+        """
+        offsets=list(offsets)
+        values=[self._shadow_get(offset) for offset in offsets]
+        missing=[i for i, value in enumerate(values) if value is None]
+        if missing:
+            rd=self.bus.read_many([self.base_addr+offsets[i] for i in missing])
+            for i, value in zip(missing, rd):
+                values[i]=value
+                self._shadow_set(offsets[i], value)
+        return values
+
+    def write_many(self, pairs):
+        """
+        Write a list of (offset, value) using a single batch on the bus
+
+        The SHADOWED registers are only updated in the shadow.
+        """
+        direct=[]
+        for offset, value in pairs:
+            if self.get_policy(offset)==self.SHADOWED:
+                self.write(offset, value)
+            else:
+                direct.append((offset, value))
+        if direct:
+            self.bus.write_many([(self.base_addr+offset, value) for offset, value in direct])
+            for offset, value in direct:
+                self._shadow_set(offset, value)
+
+    def write_block(self, offset, values):
+        """
+        Write a list of values to contiguous offsets in a single block
+
+        The bus block write is used when the driver implements it, otherwise
+        the values are written as a batch.
+        """
+        values=list(values)
+        if any(self.get_policy(offset+4*i)!=self.VOLATILE for i in range(len(values))):
+            self.write_many([(offset+4*i, value) for i, value in enumerate(values)])
+            return
+        if getattr(self.bus, "blockwrite", False):
+            self.bus.devblockwrite(0, self.base_addr+offset, values)
+        else:
+            self.bus.write_many([(self.base_addr+offset+4*i, value) for i, value in enumerate(values)])
+
+    def flush(self):
+        """
+        Write all the pending SHADOWED registers in a single burst
+
+        Returns:
+            The number of registers written
+        """
+        dirty=sorted(self.dirty)
+        if dirty:
+            self.bus.write_many([(self.base_addr+offset, self.shadow[offset][0]) for offset in dirty])
+            self.dirty.clear()
+        return len(dirty)
+
+    def invalidate(self, offset=None):
+        """
+        Forget the CACHED values so that they are read again from the bus
+
+        The SHADOWED registers are kept as they can't be read back.
+
+        Args:
+            offset: Offset of the register (None for all the registers)
+        """
+        offsets=list(self.shadow.keys()) if offset is None else [offset]
+        for off in offsets:
+            if self.get_policy(off)!=self.SHADOWED:
+                self.shadow.pop(off, None)
 
 
     def wr_bit(self, addr, bit, value):
@@ -136,18 +284,19 @@ class WBPeriph(WBOperator):
     """
 
     def __init__(self, bus, base_addr,name):
-        self.bus = bus
+        WBOperator.__init__(self, bus)
         self.base_addr = base_addr
         self.name = name
         self.fields={}
         self.regs=[];
+        self.pending=None
 
     def append(self,wbfield):
         """
         Append a WBField to the WBperiph
         """
 
-        if self.fields.has_key(wbfield.name):
+        if wbfield.name in self.fields:
             raise NameError('Field name already used by this peripheral')
         #print wbfield
         i_reg=int(wbfield.offset/4)
@@ -158,28 +307,103 @@ class WBPeriph(WBOperator):
         reg.append(wbfield)
         self.regs.insert(i_reg, reg)
         self.fields[wbfield.name]=wbfield
+        if wbfield.policy is not None:
+            # The most conservative policy of the register fields is used
+            policy=wbfield.policy
+            if wbfield.offset in self.policies:
+                policy=min(policy, self.get_policy(wbfield.offset))
+            self.set_policy(wbfield.offset, policy, wbfield.ttl)
         return wbfield
 
 
     def wr_field(self,fldname,value):
         """
         Write to a field using its name
+
+        Inside a transaction() the value is only recorded until the commit.
         """
 
-        if self.fields.has_key(fldname):
-            return self.fields[fldname].write(value)
+        if fldname in self.fields:
+            fld=self.fields[fldname]
+            if self.pending is None:
+                return fld.write(value)
+            mask=(pow(2,fld.width)-1) << fld.pos
+            reg=self.pending.setdefault(fld.offset, [0, 0])
+            reg[0] |= mask
+            reg[1] = (reg[1] & ~mask) | ((value << fld.pos) & mask)
         else:
             raise PtsInvalid("field '%s' is does not exist" % (fldname))
 
     def rd_field(self,fldname):
         """
         Read to a field using its name
+
+        Inside a transaction() the values not yet committed are returned.
         """
-        if self.fields.has_key(fldname):
-            return self.fields[fldname].read()
+        if fldname in self.fields:
+            fld=self.fields[fldname]
+            mask=(pow(2,fld.width)-1) << fld.pos
+            if self.pending and fld.offset in self.pending and (self.pending[fld.offset][0] & mask)==mask:
+                return (self.pending[fld.offset][1] & mask) >> fld.pos
+            return fld.read()
         else:
             raise PtsInvalid("field '%s' is does not exist" % (fldname))
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Collect the wr_field() calls and write each register only once
+
+        The fields of the same register are merged, the register is read only
+        when the fields don't cover all its bits and the contiguous registers
+        are written using a block write. Nothing is written if an exception
+        is raised inside the block. Example:
+
+            with periph.transaction():
+                periph.wr_field("ENA", 1)
+                periph.wr_field("MODE", 3)
+        """
+        if self.pending is not None: # Nested: the outer transaction commits
+            yield self
+            return
+        self.pending={}
+        try:
+            yield self
+            pending=self.pending
+        finally:
+            self.pending=None
+        self.commit(pending)
+
+    def commit(self, pending):
+        """
+        Write a set of pending register updates
+
+        Args:
+            pending: dict of offset -> [mask, value]
+        """
+        offsets=sorted(pending)
+        partial=[off for off in offsets if pending[off][0] != 0xFFFFFFFF]
+        current=dict(zip(partial, self.read_many(partial))) if partial else {}
+        values=[]
+        for off in offsets:
+            mask, value = pending[off]
+            values.append((current.get(off, 0) & ~mask) | value)
+
+        # Split into runs of contiguous registers, the isolated ones go in a batch
+        single=[]
+        i=0
+        while i < len(offsets):
+            j=i+1
+            while j < len(offsets) and offsets[j]==offsets[j-1]+4:
+                j+=1
+            if j-i > 1:
+                self.write_block(offsets[i], values[i:j])
+            else:
+                single.append((offsets[i], values[i]))
+            i=j
+        if single:
+            self.write_many(single)
+
 
 
     def get_str(self,fldname=None):
@@ -192,8 +416,8 @@ class WBPeriph(WBOperator):
         retstr=""
         if fldname==None:
             retstr+="@0x%08x : %s" %(self.base_addr,self.name)
-            for reg in self.regs:
-                data=self.read(reg[0].offset)
+            values=self.read_many([reg[0].offset for reg in self.regs])
+            for reg, data in zip(self.regs, values):
                 retstr+='@0x%08X: 0x%08x' % (reg[0].offset, data)
             for fld in reg:
                 retstr+=fld
@@ -209,7 +433,7 @@ class WBField:
     """
 
 
-    def __init__(self,prh, offset, name, pos, width=1, desc=""):
+    def __init__(self,prh, offset, name, pos, width=1, desc="", policy=None, ttl=None):
         """
         Constructor method
 
@@ -220,6 +444,8 @@ class WBField:
             pos: Position of the field
             width: Width of the field (1 if the field is a bit)
             desc: Message to describe a little bit more about this field (used for debug/log)
+            policy: Shadow policy of the register (WBOperator.VOLATILE/CACHED/SHADOWED)
+            ttl: Time to live (sec) of the register when policy is CACHED
         """
 
         self.prh= prh
@@ -230,6 +456,8 @@ class WBField:
 
         self.width=width
         self.desc=desc
+        self.policy=policy
+        self.ttl=ttl
 
     def __str__(self):
         if self.width==1:
@@ -0,0 +1,132 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Parser for the output of the WRPC "stat" command.
+
+@file
+@copyright LGPL v2.1
+@ingroup core
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import string
+from collections import namedtuple
+
+
+# Link status of a WR port
+WRPortStat = namedtuple("WRPortStat", "lnk rx tx lock")
+
+# Fields of the "stat" output (None when they are not in the output).
+# ports is a dict port name -> WRPortStat, fields has all the key:value pairs.
+WRStat = namedtuple("WRStat", "mode ports ss syncs mu dms dtxm drxm dtxs drxs "
+                    "asym crtt cko setp temp fields")
+
+# Keys that belong to the port that precedes them
+PORT_KEYS = ("lnk", "rx", "tx", "lock")
+
+
+def _mode(token):
+    '''
+    Return the WR mode in a token or None
+
+    The mode is made of three words of letters joined by "_" (i.e: the
+    mode of "WR_SLAVE_WR1" is "WR_SLAVE_WR").
+    '''
+    parts = token.split("_")
+    for i in range(len(parts)-2):
+        first, mid, last = parts[i:i+3]
+        start = len(first)
+        while start > 0 and first[start-1] in string.ascii_letters:
+            start -= 1
+        end = 0
+        while end < len(last) and last[end] in string.ascii_letters:
+            end += 1
+        if start < len(first) and mid and end and all(c in string.ascii_letters for c in mid):
+            return "%s_%s_%s" % (first[start:], mid, last[:end])
+    return None
+
+
+def _port(token):
+    '''
+    Return the length of the port name ("wr" and digits) that starts a
+    token (i.e: "wr0", "wr1:", "wr0->lnk:1"), 0 if there is none
+    '''
+    if not token.startswith("wr"):
+        return 0
+    end = 2
+    while end < len(token) and token[end] in string.digits:
+        end += 1
+    return end if end > 2 else 0
+
+
+def _value(raw):
+    '''
+    Convert a value of the stat output to int, float or str (without quotes)
+    '''
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw.strip("'\"")
+
+
+def parse_stat(raw):
+    '''
+    Parse the output of the "stat" command in a single pass
+
+    The output is split in tokens: "key:value" tokens are converted to
+    int/float/str, a "wrN" prefix (alone, "wrN:" or "wrN->key:value")
+    selects the port of the following lnk/rx/tx/lock values and the WR
+    mode is the first token with three words joined by "_". Only string
+    methods are used (no regular expression per token).
+
+    Args:
+        raw (str) : Output of the stat command
+
+    Returns:
+        A WRStat namedtuple.
+    '''
+    fields = {}
+    ports = {}
+    port = None
+    mode = None
+    for token in raw.split():
+        if mode is None and token.count("_") >= 2:
+            mode = _mode(token)
+        end = _port(token)
+        if end:
+            port = token[:end]
+            token = token[end:].lstrip("-:>")
+        key, sep, val = token.partition(":")
+        if not sep:
+            continue
+        if key in PORT_KEYS:
+            ports.setdefault(port or "wr0", {})[key] = _value(val)
+        else:
+            fields[key] = _value(val)
+
+    get = fields.get
+    return WRStat(mode,
+                  dict((name, WRPortStat(p.get("lnk"), p.get("rx"), p.get("tx"), p.get("lock")))
+                       for name, p in ports.items()),
+                  get("ss"), get("syncs"), get("mu"), get("dms"), get("dtxm"), get("drxm"),
+                  get("dtxs"), get("drxs"), get("asym"), get("crtt"), get("cko"), get("setp"),
+                  get("temp"), fields)
@@ -0,0 +1,99 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tool for running a script of WRPC commands on several devices through virtual UART.
+
+@file
+@copyright LGPL v2.1
+@ingroup tools
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import argparse as arg
+import sys
+import datetime as dt
+
+from core.fleet import VUART_fleet
+from core.tools import load_ips
+from core.p7sException import Error
+
+
+def main():
+    '''
+    Tool for running a WRPC script on a list of WR-LEN.
+    '''
+
+    parser = arg.ArgumentParser(description='Run a VUART script on several WR-LEN')
+
+    parser.add_argument('IP', type=str, nargs='*', help='IP of the devices')
+    parser.add_argument('--list','-l',help='File with the IP of the devices (one by line)')
+    parser.add_argument('--input','-i',help='Input script of WRPC commands', required=True)
+    parser.add_argument('--output','-o',help='Save the output of the commands to a file')
+    parser.add_argument('--workers','-w',type=int, default=16,
+                        help='Max number of devices handled at the same time')
+    parser.add_argument('--timeout','-t',type=float, default=None,
+                        help='Max time (sec) to wait for the output of a command')
+    parser.add_argument('--refresh-sdb', action='store_true',
+                        help='Ignore the SDB cache and parse the devices again')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Verbose output')
+
+    args = parser.parse_args()
+
+    try:
+        ips = load_ips(args.IP, args.list)
+    except Error as e:
+        print("%s\n" % e.errmsg)
+        exit(1)
+
+    with open(args.input) as fin:
+        script = fin.readlines()
+    fout = open(args.output, 'a+') if args.output else None
+    if fout is not None:
+        fout.write("Output generated on %s\n\n" % (dt.datetime.now().strftime("%Y-%m-%d %H:%M")))
+
+    failed = set()
+    latencies = []
+    fleet = VUART_fleet(ips, workers=args.workers, verbose=args.verbose, timeout=args.timeout,
+                        sdb_refresh=args.refresh_sdb)
+    for res in fleet.run(script):
+        if res.error is not None:
+            failed.add(res.ip)
+            sys.stdout.write("\033[1;31m%-15s\033[0m #%d %s: %s\n" % (res.ip, res.index, res.cmd, res.error))
+            continue
+        latencies.append(res.latency)
+        sys.stdout.write("\033[1m%-15s\033[0m #%d %s (%.1f ms)\n" % (res.ip, res.index, res.cmd, 1000*res.latency))
+        if args.verbose:
+            print(res.output)
+        if fout is not None:
+            fout.write("@%s %s\n" % (res.ip, res.cmd))
+            fout.write("%s\n\n" % res.output)
+
+    if fout is not None:
+        fout.close()
+    latencies.sort()
+    print("\n%d devices, %d failed" % (len(ips), len(failed)))
+    if latencies:
+        print("Command latency: median %.1f ms, max %.1f ms" % (1000*latencies[len(latencies)//2], 1000*latencies[-1]))
+    for ip in sorted(failed):
+        print("  failed: %s" % ip)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -15,6 +15,186 @@ This File contains the SpiFlash class for programming a SPI Flash memory remotel
 
 import time
 import sys
+import os
+import array
+import binascii
+import hashlib
+import struct
+import threading
+
+from core.gendrvr import BusTimeout
+
+
+def _to_words(data):
+    """
+    Convert big-endian bytes to an array('I')
+
+    The last word is completed with 0xee if needed (as the MCS files are
+    written to the flash).
+    """
+    data = bytes(data)
+    words = array.array('I', data + b"\xee" * (-len(data) % 4))
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+class FlashImage(object):
+    """
+    FlashImage class
+
+    Compiled flash image: the words of a MCS file ready to be sent to the
+    SPI Flash programmer. On disk it is a header followed by the words in
+    big-endian. The header has a magic, the format version, the number of
+    words, the CRC32 of the words and the SHA-256 of the MCS file it was
+    compiled from, so it can be used as a cache of that file.
+
+    An image is either kept in memory (from_packets) or read from its
+    file each time the packets are requested (open, write), so the memory
+    used does not depend on the size of the image.
+    """
+
+    MAGIC=b"SFIM"
+    VERSION=1
+    HEADER=struct.Struct(">4sHHII32s")  #magic, version, reserved, nwords, crc32, sha256
+    CACHE_DIR=os.path.join(os.path.expanduser("~"), ".spiflash_cache")
+    CHUNK=1 << 20  #Bytes read at once when checking or hashing a file
+
+    def __init__(self, words, source_hash=b"\0"*32, fpath=None, nwords=0, crc=0):
+        """__init__ method
+
+        Args:
+            words (array) : array('I') with the words of the image (None if it is read from fpath)
+            source_hash (bytes) : SHA-256 digest of the MCS file
+            fpath (str) : image file with the words (see open)
+            nwords (int) : number of words in fpath
+            crc (int) : CRC32 of the words in fpath
+        """
+        self.words = words
+        self.source_hash = source_hash
+        self.fpath = fpath
+        self._nwords = nwords
+        self._crc = crc
+
+    def __len__(self):
+        if self.words is None:
+            return self._nwords
+        return len(self.words)
+
+    def _bigendian(self):
+        """Return the words as big-endian bytes"""
+        if self.words is None:
+            with open(self.fpath, "rb") as f:
+                f.seek(self.HEADER.size)
+                return f.read(4*self._nwords)
+        words = self.words
+        if sys.byteorder == 'little':
+            words = array.array('I', words)
+            words.byteswap()
+        return words.tobytes()
+
+    def crc(self):
+        """CRC32 of the words (big-endian)"""
+        if self.words is None:
+            return self._crc
+        return binascii.crc32(self._bigendian()) & 0xFFFFFFFF
+
+    def packets(self, pktwords=128):
+        """Generator of packets of pktwords words (the last one could be shorter)"""
+        if self.words is None:
+            with open(self.fpath, "rb") as f:
+                f.seek(self.HEADER.size)
+                for i in range(0, self._nwords, pktwords):
+                    yield _to_words(f.read(4*min(pktwords, self._nwords-i)))
+            return
+        for i in range(0, len(self.words), pktwords):
+            yield self.words[i:i+pktwords]
+
+    @classmethod
+    def write(cls, fpath, packets, source_hash=b"\0"*32):
+        """
+        Write the packets of SpiFlash.mcsToPackets to an image file (atomically)
+
+        The packets are written as they are generated, the header is
+        completed at the end.
+
+        Returns:
+            The FlashImage read from fpath (see open)
+        """
+        tmp = "%s.%d.%d.tmp" % (fpath, os.getpid(), threading.current_thread().ident)
+        nwords = 0
+        crc = 0
+        try:
+            with open(tmp, "wb") as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, 0, 0, source_hash))
+                for packet in packets:
+                    data = cls(packet)._bigendian()
+                    crc = binascii.crc32(data, crc)
+                    nwords += len(packet)
+                    f.write(data)
+                f.seek(0)
+                f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, nwords, crc & 0xFFFFFFFF, source_hash))
+            os.replace(tmp, fpath)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return cls(None, source_hash, fpath, nwords, crc & 0xFFFFFFFF)
+
+    @classmethod
+    def is_image(cls, fpath):
+        """Return True if the file is a compiled image"""
+        with open(fpath, "rb") as f:
+            return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+    @classmethod
+    def _read_header(cls, f, fpath):
+        """Read and check the header of an image file, returns (nwords, crc, source_hash)"""
+        header = f.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise ValueError("%s: not a flash image" % (fpath))
+        magic, version, _, nwords, crc, source_hash = cls.HEADER.unpack(header)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("%s: not a flash image (v%d)" % (fpath, cls.VERSION))
+        return nwords, crc, source_hash
+
+    @classmethod
+    def open(cls, fpath):
+        """
+        Check an image file without loading it, its packets are read from the file
+
+        Raises:
+            ValueError: When the file is not a valid image (bad header, size or CRC)
+        """
+        with open(fpath, "rb") as f:
+            nwords, crc, source_hash = cls._read_header(f, fpath)
+            size = 0
+            check = 0
+            for chunk in iter(lambda: f.read(cls.CHUNK), b""):
+                check = binascii.crc32(chunk, check)
+                size += len(chunk)
+        if size != 4*nwords:
+            raise ValueError("%s: truncated image (%d/%d words)" % (fpath, size//4, nwords))
+        if check & 0xFFFFFFFF != crc:
+            raise ValueError("%s: bad CRC" % (fpath))
+        return cls(None, source_hash, fpath, nwords, crc)
+
+    @classmethod
+    def from_packets(cls, packets, source_hash=b"\0"*32):
+        """Build an image from the packets of SpiFlash.mcsToPackets"""
+        words = array.array('I')
+        for packet in packets:
+            words.extend(packet)
+        return cls(words, source_hash)
+
+    @classmethod
+    def file_hash(cls, fpath):
+        """SHA-256 digest of a file"""
+        h = hashlib.sha256()
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK), b""):
+                h.update(chunk)
+        return h.digest()
+
 
 class SpiFlash:
     """
@@ -23,6 +203,10 @@ class SpiFlash:
     This class is used for programming a SPI Flash memory remotely through Etherbone
     """
 
+    #SDB identifiers of the WR-SPI-Flash-Update core
+    VENDOR_ID=0x7501    #SevenSolutions
+    DEVICE_ID=0xae5f
+
     #Registers Offsets
     CR_offset=0x0       #Control Register
     SR_offset=0x4       #Status Register
@@ -74,20 +258,32 @@ class SpiFlash:
 
     FIFO_WSIZE=256       #FIFO has 256 words
     PKTWORDS=int(FIFO_WSIZE/2) #We are sending packets of 128 words because the FIFO has 256 words
+    MIN_BURST=int(FIFO_WSIZE/4) #Min number of free words in the FIFO to send a burst
+    PRG_POLL_MIN=0.0002  #Min delay (s) between FIFO checks while programming
+    PRG_POLL_MAX=0.01    #Max delay (s) between FIFO checks while programming
+    WAIT_POLL_MAX=0.05   #Max delay (s) between SR checks while waiting erase/done
 
     
-    def __init__(self, bus, baseFlash, debug=False):
+    def __init__(self, bus, baseFlash, debug=False, cache=True):
         """__init__ method
 
         Args:
             bus (EthBone) : Communication bus
             baseFlash (int) : Base address for the WB-SPI-Flash-Update
             debug(bool): Boolean seting debug mode if True
+            cache(bool): Keep the compiled MCS files in FlashImage.CACHE_DIR
+
+        The mode, progress and cache messages are written with self.log
+        (print by default) and self.on_step (None by default) is called with
+        "erase", "program" and "done" when each step starts.
         """
 
         self.baseFlash = baseFlash
         self.bus = bus
         self.debug = debug
+        self.cache = cache
+        self.log = print
+        self.on_step = None
         #self.debug = True
 
         
@@ -102,6 +298,7 @@ class SpiFlash:
                 * vo: verification
                 * update: perform all the procedure
             mcs_file: in case the mode is "update" we must provide the mcs_file that we want to upload
+                (or its FlashImage, see updateMode)
         '''
 
         self.mode=mode
@@ -119,7 +316,7 @@ class SpiFlash:
         elif self.mode=="update":
             self.updateMode(mcs_file)
         else:
-            print("Not a valid Mode")
+            self.log("Not a valid Mode")
 
             
     def resetFlash(self):
@@ -149,7 +346,7 @@ class SpiFlash:
     def cidoMode(self):
         '''Method for performing the Check ID Only operation
         '''
-        print("Check ID Only mode")
+        self.log("Check ID Only mode")
         self.setFlashMode()
         self.endFlash()
 
@@ -157,7 +354,7 @@ class SpiFlash:
     def voMode(self):
         '''Method for performing the Verify Only operation
         '''
-        print("Verify Only mode")
+        self.log("Verify Only mode")
         self.setFlashMode()
         self.endFlash()
 
@@ -191,32 +388,32 @@ class SpiFlash:
         
     def updateMode(self, mcs_file):
         '''Method for performing the Update operation
-        '''
-        print("UPDATE mode")
-
-        f = open(mcs_file, "rb")
-        lines = f.readlines()
 
-        # this function selects the useful lines,
-        # extracts the 32 bit data from each of those
-        # lines and returns a list of packets
-        # of 128 words of 32 bits.
-        flash_packets = []
-        self.linesToPackets(lines, flash_packets)
+        Args:
+            mcs_file: MCS file, compiled image or FlashImage already loaded
+        '''
+        self.log("UPDATE mode")
 
-        if self.debug:
-            print('updateMode()')
-            print("num packets:", len(flash_packets))
-            print("last packet length:", len(flash_packets[-1]))
+        # the mcs file is compiled once to a binary image
+        # which is cached and split in packets of 128 words
+        if isinstance(mcs_file, FlashImage):
+            image = mcs_file
+        else:
+            image = self.loadImage(mcs_file, self.cache, self.debug, self.log)
+        flash_packets = image.packets(self.PKTWORDS)
 
         self.setFlashMode()
         self.eraseFlash()
         self.programFlash(flash_packets)
+        if self.debug:
+            self.log('updateMode()')
+            self.log("num bursts: %d" % (self.nbursts))
+            self.log("num words: %d" % (self.nwords))
         try:
             self.endFlash()
         except Exception as e:
             wc=self.bus.read(self.baseFlash+self.RWC_offset)
-            print("Received words=%d (0x%08x), expected=%d" % (wc,wc,(len(flash_packets)-1)*self.PKTWORDS+len(flash_packets[-1])))
+            self.log("Received words=%d (0x%08x), expected=%d" % (wc,wc,self.nwords))
             raise
 
 
@@ -224,79 +421,87 @@ class SpiFlash:
         '''Method that checks the development of the Flash memory erasure
         '''
         # wait for Erase OK
-        print("Erasing")
+        self._step("erase")
+        self.log("Erasing")
 
-        status_reg=self.bus.read(self.baseFlash+self.SR_offset)
+        on_change = (lambda sr: self.log(self.SR_to_str(sr))) if self.debug else None
+        try:
+            status_reg = self.bus.wait_until(self.baseFlash+self.SR_offset, self.msk_EOK | self.msk_ERR,
+                                             timeout=self.ERASE_TO, poll_min=self.PRG_POLL_MIN,
+                                             poll_max=self.WAIT_POLL_MAX, on_change=on_change)
+        except BusTimeout:
+            raise NameError('Timeout while erasing SPI (> %d s)' % (self.ERASE_TO))
         EOK=(self.msk_EOK & int(status_reg))
-        ERROR=(self.msk_ERR & int(status_reg))
-        old_SR=status_reg
-        count=0
-        while EOK==0 and ERROR==0:
-            status_reg=self.bus.read(self.baseFlash+self.SR_offset)
-            EOK=(self.msk_EOK & int(status_reg))
-            if self.debug:
-                new_SR=self.bus.read(self.baseFlash+self.SR_offset)
-                if new_SR != old_SR:
-                    print(self.SR_to_str(new_SR))
-                    old_SR=new_SR
-            if count > self.ERASE_TO:
-                raise NameError('Timeout while erasing SPI (> %d s)' % (self.ERASE_TO))
-            time.sleep(1)
-            count=count+1
-            #sys.stdout.write(".")
-            #sys.stdout.flush()
         if EOK:
-            print("Erase OK")
+            self.log("Erase OK")
         else:
-            print("Erase Failed")
+            self.log("Erase Failed")
 
 
     def programFlash(self, flash_packets):
         '''Method for sending the update data to the Flash memory
+
+        SR and FSR are read in a single cycle and the free space of the FIFO
+        is filled with one burst of words. When there is not enough free
+        space the delay between checks is doubled (up to PRG_POLL_MAX) and
+        after each burst it is halved, so it follows the programming speed.
+
+        Args:
+            flash_packets: list or generator of packets of words (see mcsToPackets)
         '''
-        j = 0
-        print("Programming")
-        status_reg = self.bus.read(self.baseFlash+self.SR_offset)
-        POK = (self.msk_POK & int(status_reg))
-        ERROR = (self.msk_ERR & int(status_reg))
-        old_SR = status_reg & 0xfffe # ready_busy switch is not interesting
-        self.bus.wrcr = 0
-        while POK == 0 and ERROR == 0:
+        self._step("program")
+        self.log("Programming")
+        self.nbursts = 0
+        self.nwords = 0
+        SR_addr = self.baseFlash+self.SR_offset
+        FSR_addr = self.baseFlash+self.FSR_offset
+        DR_addr = self.baseFlash+self.DR_offset
+        packets = iter(flash_packets)
+        words = array.array('I')  # words read from the packets but not sent
+        last = False
+        delay = self.PRG_POLL_MIN
+        t0 = time.time()
+        while True:
             
-            # Check Writing Done
-            status_reg = self.bus.read(self.baseFlash+self.SR_offset)
+            # Check Writing Done and FIFO
+            status_reg, FIFO_status_reg = self.bus.read_many([SR_addr, FSR_addr])
             POK = (self.msk_POK & int(status_reg))
             ERROR = (self.msk_ERR & int(status_reg))
-            
-            # Check FIFO
-            FIFO_status_reg = self.bus.read(self.baseFlash+self.FSR_offset)
-            FCount = (self.msk_WC & int(FIFO_status_reg))
-            
-            #if self.debug:
-                #print(j, FCount, self.PKTWORDS)
-                #print(j, status_reg, POK, ERROR)
-                
-            if (FCount < self.PKTWORDS):
-                if j < len(flash_packets):
-                    self.bus.devblockwrite(0, self.baseFlash+self.DR_offset, flash_packets[j], 0x0)
-                    time.sleep(0.001) # Sleep 1 milliseconds to avoid charging the network
-                    j = j+1
-                    #if j%100==0:
-                    #    sys.stdout.write(".")
-                    #    sys.stdout.flush()
-                        
-                elif (j > len(flash_packets)):
-                    raise NameError('ERROR: Overflowing packets (%d > %d s)' % (j,len(flash_packets)))
-
-                elif j == len(flash_packets):
-                    break
+            if POK or ERROR:
+                break
+            if FIFO_status_reg & self.msk_WF:
+                free = 0
+            else:
+                free = self.FIFO_WSIZE - (self.msk_WC & int(FIFO_status_reg))
+
+            # at least MIN_BURST words are buffered: only the last burst can be shorter
+            while not last and len(words) < max(free, self.MIN_BURST):
+                packet = next(packets, None)
+                if packet is None:
+                    last = True
+                else:
+                    words.extend(packet)
+            if last and not words:
+                break
+
+            if free > 0 and free >= min(self.MIN_BURST, len(words)):
+                n = min(free, len(words))
+                self.bus.devblockwrite_buffer(0, DR_addr, words[:n], 0x0)
+                del words[:n]
+                self.nbursts += 1
+                self.nwords += n
+                delay = max(self.PRG_POLL_MIN, delay/2)
+            else:
+                time.sleep(delay)
+                delay = min(self.PRG_POLL_MAX, delay*2)
 
+        elapsed = time.time()-t0
+        self.log("Programmed %d words in %.1f s (%d words/s)" % (self.nwords, elapsed, self.nwords/elapsed if elapsed > 0 else 0))
         if self.debug:
-            print('programFlash()')
-            print('POK =', POK, '\nERROR =', ERROR)
-            print("Programming Finished (CRC=0x%08x)" %(self.bus.wcrc & 0xFFFFFFFF))
-            print('Number of Packers:', len(flash_packets))
-            print("Packets Written:", j)
+            self.log('programFlash()')
+            self.log('POK = %d\nERROR = %d' % (POK, ERROR))
+            self.log("Programming Finished (CRC=0x%08x)" %(self.bus.wcrc & 0xFFFFFFFF))
+            self.log("Bursts Written: %d" % (self.nbursts))
 
             
     def endFlash(self):
@@ -304,25 +509,19 @@ class SpiFlash:
 
         If performing Update operation the board is Rebooted at the end runing IPROG_reboot
         '''
-        if self.debug:  print("Waiting DONE... %s" %(self.SR_to_str()))
-        status_reg=self.bus.read(self.baseFlash+self.SR_offset)
-        DONE=(self.msk_DN & int(status_reg))
-        old_SR=status_reg
-        count=0
-        while DONE==0:
-            status_reg=self.bus.read(self.baseFlash+self.SR_offset)
-            DONE=(self.msk_DN & int(status_reg))
-            if status_reg != old_SR:
-                if self.debug:  print(self.SR_to_str())
-                old_SR=status_reg
-                count=0
-            if count > self.ENDPRGM_TO:
-                raise NameError('Timeout while waiting DONE > %d s (%s)' % (self.ENDPRGM_TO,self.SR_to_str()))
-            time.sleep(1)
-            count=count+1
-        print("DONE")
+        self._step("done")
+        if self.debug:  self.log("Waiting DONE... %s" %(self.SR_to_str()))
+        # the timeout is restarted each time SR changes
+        on_change = (lambda sr: self.log(self.SR_to_str(sr))) if self.debug else None
+        try:
+            status_reg = self.bus.wait_until(self.baseFlash+self.SR_offset, self.msk_DN,
+                                             timeout=self.ENDPRGM_TO, poll_min=self.PRG_POLL_MIN,
+                                             poll_max=self.WAIT_POLL_MAX, on_change=on_change, restart=True)
+        except BusTimeout:
+            raise NameError('Timeout while waiting DONE > %d s (%s)' % (self.ENDPRGM_TO,self.SR_to_str()))
+        self.log("DONE")
         if self.debug:
-            print(self.SR_to_str())
+            self.log(self.SR_to_str())
 
         ERROR=(self.msk_ERR & int(status_reg))
         PSWOK=(self.msk_PSWOK & int(status_reg))
@@ -331,10 +530,17 @@ class SpiFlash:
             raise NameError("An error was detected %s" % (self.SR_to_str(status_reg & 0xF8)))
 
         if PSWOK:
-            print("REBOOTING")
+            self.log("REBOOTING")
             self.IPROG_reboot()
 
 
+    def _step(self, step):
+        '''Notify the start of a step to self.on_step
+        '''
+        if self.on_step is not None:
+            self.on_step(step)
+
+
     def IPROG_reboot(self):
         '''Method for rebooting the board
 
@@ -372,99 +578,89 @@ class SpiFlash:
         return sWord
 
     
-    def linesToData(self, lines_list, data_lines):
-        """ 
-        This method takes the lines from the mcs file and extracts 
-        the useful data. Returns a list of lines once removed start code, 
-        byte count, address, record type, checksum...
-        Only the useful data is left.
-        """
+    @classmethod
+    def loadImage(cls, fpath, cache=True, debug=False, log=print):
+        '''Method that returns the FlashImage of a MCS file or a compiled image
 
-        for i in range(0, len(lines_list)-1):                       # the last line is left untouched as it is the checksum
-            record_type = int(lines_list[i][7:9], 16)               # two hex digits indicating the record type
-            if record_type == 0:                                    # DATA type
-                mod_line = lines_list[i][9:len(lines_list[i])-3]    # take away the first 10 hex digits and the last 3
-                data_lines.append(mod_line)
-            else:
-                if self.debug: print('!!0', str(i).zfill(6), lines_list[i])
-                
-        return data_lines
+        The compiled MCS files are stored in the cache, with the SHA-256 of
+        the MCS file as name, and reused while the file does not change.
+        Compiled images and cached files are read packet by packet while
+        programming, only a MCS file compiled without cache is kept in memory.
 
-    
-    def linesToPackets(self, lines, flash_packets):
+        Args:
+            fpath: MCS file or image compiled with compileImage
+            cache: Keep the compiled MCS files in FlashImage.CACHE_DIR
+            debug, log: see mcsToPackets
+        '''
+        if FlashImage.is_image(fpath):
+            return FlashImage.open(fpath)
+
+        source_hash = FlashImage.file_hash(fpath)
+        cached = os.path.join(FlashImage.CACHE_DIR, "%s.bin" % (binascii.hexlify(source_hash).decode("ascii")))
+        if cache and os.path.exists(cached):
+            try:
+                image = FlashImage.open(cached)
+                if image.source_hash == source_hash:
+                    if debug: log("Using the cached image %s" % (cached))
+                    return image
+            except ValueError as e:
+                log("Ignoring the cached image: %s" % (e))
+
+        if cache:
+            try:
+                if not os.path.isdir(FlashImage.CACHE_DIR):
+                    os.makedirs(FlashImage.CACHE_DIR)
+                return FlashImage.write(cached, cls.mcsToPackets(fpath, debug=debug, log=log), source_hash)
+            except (IOError, OSError) as e:
+                log("Could not save the cached image: %s" % (e))
+        return FlashImage.from_packets(cls.mcsToPackets(fpath, debug=debug, log=log), source_hash)
+
+
+    @classmethod
+    def compileImage(cls, mcs_file, img_file, debug=False, log=print):
+        '''Method that compiles a MCS file to a binary image file
+
+        Returns:
+            The FlashImage
+        '''
+        return FlashImage.write(img_file, cls.mcsToPackets(mcs_file, debug=debug, log=log),
+                                FlashImage.file_hash(mcs_file))
+
+
+    @classmethod
+    def mcsToPackets(cls, mcs_file, pktwords=None, debug=False, log=print):
         """
-        Method for packing a list of lines of a MCS file into a list 
-        of packets of words. This method extract four 32 bit words for 
-        each usefull line of the mcs file and packs it in packets of 
-        128 words of 32 bits.
+        Generator that reads a MCS (Intel HEX) file and yields packets of
+        pktwords (PKTWORDS by default) words of 32 bits as array('I').
+
+        The records are decoded one by one, so the memory used does not
+        depend on the size of the file. Only the DATA records are used, the
+        words are big-endian and the last word is completed with 0xee if
+        needed. The last packet could be shorter. The skipped records are
+        written with log when debug is set.
         """
-        if self.debug: print('linesToPackets()')
-        if self.debug: print("Lines:", len(lines))
-        
-        # lines after removing the start code, byte count,
-        # address, record type, checksum...
-        # only the 32 bit useful data is left
-        data_lines = []
-        self.linesToData(lines, data_lines)
-        if self.debug: print("Data lines:", len(data_lines))
-        
-        # turn the Data lines strings into byte arrays
-        bytearray_lines = []
-        self.bus.dataToByteArray(data_lines, bytearray_lines)
-        if self.debug: print("Byte Arrays:", len(bytearray_lines))
-        
-        # create a single list with all the bytes
-        subcount = 0
-        valcount = 0
-        bytes_list = []
-        for sublist in bytearray_lines:
-            subcount += 1
-            for val in sublist:
-                valcount += 1
-                bytes_list.append(val)
-                
-            if self.debug and subcount == 1:
-                print('sublist:', sublist)
-                print('bytes_list:', bytes_list)
-            
-        if self.debug: print('sublists:', subcount, 'values:', valcount)
-        if self.debug: print("Bytes:", len(bytes_list))
-        
-        #for j in range(-10,0):
-        #    print "0x%02x" % bytes_list[j]
-
-        # Group the bytes into 4 Bytes words
-        flash_words = []
-        for j in range(0, len(bytes_list), 4):
-            if (j<len(bytes_list)-(len(bytes_list)%4)):
-                tmpWord = (bytes_list[j]<<24 | bytes_list[j+1] << 16 | bytes_list[j+2] << 8 | bytes_list[j+3])
-                flash_words.append(tmpWord)
-                if self.debug and j>(len(bytes_list)-4*10):
-                    #print('!!1', "@x%03x: 0x%08x" %(j, flash_words[-1] & 0xFFFFFFFF))
-                    print('!!1', "%08d: 0x%08x" %(j, flash_words[-1] & 0xFFFFFFFF))
-                    
-            # the last word is completed with 0xee if needed
-            else:
-                if len(bytes_list)%4==3:
-                    last_word=(bytes_list[j]<<24 | bytes_list[j+1] << 16 | bytes_list[j+2] << 8 | 0xee)
-                elif len(bytes_list)%4==2:
-                    last_word=(bytes_list[j]<<24 | bytes_list[j+1] << 16 | 0xee << 8 | 0xee)
-                elif len(bytes_list)%4==1:
-                    last_word=(bytes_list[j]<<24 | 0xee << 16 | 0xee << 8 | 0xee)
-                flash_words.append(last_word)
-                if self.debug:
-                    #print('!!2', "@x%03x: 0x%08x" %(j, flash_words[-1] & 0xFFFFFFFF))
-                    print('!!2', "%08d: 0x%08x" %(j, flash_words[-1] & 0xFFFFFFFF))
-                
-        if self.debug: print("Words:", len(flash_words))
-        
-        # the 4 bytes words are grouped in self.PKTWORDS words packets
-        self.bus.wordsToPackets(flash_words, flash_packets, self.PKTWORDS)
-        if self.debug: print("Packets:", len(flash_packets))
-        
-        return flash_packets
-
+        if pktwords is None:
+            pktwords = cls.PKTWORDS
+        pktbytes = 4*pktwords
+        data = bytearray()
+        with open(mcs_file, "rb") as f:
+            for i, line in enumerate(f):
+                line = line.strip()
+                if not line.startswith(b":"):
+                    continue
+                record_type = int(line[7:9], 16)                    # two hex digits indicating the record type
+                if record_type != 0:                                # not DATA type
+                    if debug: log("Skipping record type %d at line %d" % (record_type, i+1))
+                    continue
+                count = int(line[1:3], 16)                          # byte count
+                data += binascii.unhexlify(line[9:9+2*count])       # skip start code, byte count, address and type
+                while len(data) >= pktbytes:
+                    yield _to_words(data[:pktbytes])
+                    del data[:pktbytes]
+        if data:
+            yield _to_words(data)
 
+    
     def eb_sw_loader(self,RAM_file,RAM_offset=0x0,SYSCON_offset=0x30400,pktwords=256):
         '''
         Method for loading new SW to the LM32 soft processor
@@ -489,13 +685,10 @@ class SpiFlash:
         print(data_lines[1])
 
         #Convert from str to int
-        int_lines=[]
-        for i in range(0, len(data_lines)):
-            tmp_line=int(data_lines[i],16)
-            int_lines.append(tmp_line)
-        #from lines to 128 word packets
-        data_packets=[]
-        self.bus.wordsToPackets(int_lines, data_packets,pktwords)
+        int_lines=array.array('I', [int(line,16) for line in data_lines])
+        #from lines to packets of pktwords words
+        pktwords=int(pktwords)
+        data_packets=[int_lines[i:i+pktwords].tolist() for i in range(0, len(int_lines), pktwords)]
         #disable the processor
         self.bus.devwrite(0, SYSCON_offset, 4, 0x1deadbee)
         #Write the new sw at the ram memory
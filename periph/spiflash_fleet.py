@@ -0,0 +1,182 @@
+#!   /usr/bin/env   python
+# -*- coding: utf-8 -*
+'''
+This File contains the SpiFlashFleet class for updating the SPI Flash of several boards at the same time
+
+@file
+@copyright LGPL v2.1
+@see http://www.ohwr.org
+@see http://www.sevensols.com
+@ingroup periph
+'''
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bridges.ethbone import EBSession
+from bridges.sdb import SDBCache
+from periph.ipc_spiflash import SpiFlash, FlashImage
+
+
+class FlashJob(object):
+    """
+    FlashJob class
+
+    State of the update of one board. The states are, in order:
+    wait, open, erase, program, done (waiting DONE) and then ok or failed.
+    """
+
+    STATES = ("wait", "open", "erase", "program", "done", "ok", "failed")
+
+    def __init__(self, ip, verbose=False):
+        self.ip = ip
+        self.verbose = verbose
+        self.state = "wait"
+        self.error = None
+        self.flash = None
+        self.messages = []
+        self.times = {}     # seconds spent in each state
+        self.t_state = None
+        self.t_start = None
+        self.t_end = None
+
+    def set_state(self, state):
+        """Move to a new state, accounting the time spent in the previous one"""
+        now = time.time()
+        if self.t_state is not None:
+            self.times[self.state] = self.times.get(self.state, 0) + now - self.t_state
+        else:
+            self.t_start = now
+        if state in ("ok", "failed"):
+            self.t_end = now
+        self.state = state
+        self.t_state = now
+
+    def log(self, msg):
+        """Keep a message of the SpiFlash (printed in verbose mode)"""
+        self.messages.append(msg)
+        if self.verbose: print("%-15s %s" % (self.ip, msg))
+
+    @property
+    def words(self):
+        """Number of words programmed"""
+        return getattr(self.flash, "nwords", 0)
+
+    @property
+    def elapsed(self):
+        """Seconds since the update of the board started"""
+        if self.t_start is None:
+            return 0.0
+        return (self.t_end or time.time()) - self.t_start
+
+
+class SpiFlashFleet(object):
+    """
+    SpiFlashFleet class
+
+    This class runs the same SPI Flash operation on a list of boards. The
+    image is parsed once and shared by all of them. Each board is handled by
+    a worker of a bounded thread pool that moves its FlashJob through the
+    states, so the erase of a board overlaps with the programming of the
+    others. All the boards share one Etherbone session, the accesses to
+    different boards do not wait for each other (one lock per device). Example:
+
+        fleet = SpiFlashFleet(["192.168.7.10", "192.168.7.11"], "wr-len.mcs")
+        for job in fleet.run():
+            print(job.ip, job.state, job.error)
+    """
+
+    def __init__(self, ips, fpath=None, mode="update", workers=8, debug=False,
+                 verbose=False, session=None, refresh_sdb=False, progress=None):
+        """__init__ method
+
+        Args:
+            ips (list) : IP addresses of the boards
+            fpath (str or FlashImage) : MCS file, compiled image or FlashImage (update mode)
+            mode (str) : cido, vo or update (see SpiFlash.flash_update)
+            workers (int) : Max number of boards handled at the same time
+            debug (bool) : Debug output of SpiFlash
+            verbose (bool) : Print the progress messages of every board
+            session (EBSession) : Etherbone session to use (a new one by default)
+            refresh_sdb (bool) : Ignore the SDB cache and parse the boards again
+            progress : function called with the FlashJob on every state change
+        """
+        if mode not in ("cido", "vo", "update"):
+            raise ValueError("Not a valid Mode: %s" % (mode))
+        self.ips = list(ips)
+        self.mode = mode
+        self.workers = max(1, min(workers, len(self.ips) or 1))
+        self.debug = debug
+        self.verbose = verbose
+        self.refresh_sdb = refresh_sdb
+        self.progress = progress
+        self.session, self.own_session = EBSession.for_workers(session, self.workers, debug)
+        self.jobs = [FlashJob(ip, verbose) for ip in self.ips]
+        self.image = None
+        if mode == "update":
+            if isinstance(fpath, FlashImage):
+                self.image = fpath
+            else:
+                self.image = SpiFlash.loadImage(fpath, debug=debug)
+
+    def run(self):
+        """
+        Update all the boards
+
+        Returns:
+            The list of FlashJob (one per board, in the same order as the IPs)
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for job in self.jobs:
+                pool.submit(self._run_board, job)
+        finally:
+            pool.shutdown(wait=True)
+            if self.own_session:
+                self.session.close()
+        return self.jobs
+
+    def _set_state(self, job, state):
+        job.set_state(state)
+        if self.progress is not None:
+            self.progress(job)
+
+    def _run_board(self, job):
+        """
+        Worker: state machine of the update of a board
+        """
+        lun = "udp/%s" % job.ip
+        try:
+            self._set_state(job, "open")
+            bus = self.session.get(lun)
+            sdb = SDBCache(debug=self.debug).get(bus, lun, refresh=self.refresh_sdb, lazy=True)
+            found = sdb.findProduct(SpiFlash.VENDOR_ID, SpiFlash.DEVICE_ID, first=True)
+            if not found:
+                raise NameError("WR-SPI-Flash-Update core not found")
+            spi_base = found[0][1]
+            flash = SpiFlash(bus, spi_base, self.debug, cache=False)
+            flash.log = job.log
+            flash.on_step = lambda step: self._set_state(job, step)
+            job.flash = flash
+            flash.flash_update(self.mode, self.image)
+            self._set_state(job, "ok")
+        except Exception as e:
+            job.error = e
+            self._set_state(job, "failed")
+        finally:
+            self.session.release(lun)
+
+    def summary(self):
+        """
+        Return the summary of the boards as a list of lines
+        """
+        lines = []
+        for job in self.jobs:
+            times = " ".join("%s:%.1fs" % (st, job.times[st]) for st in FlashJob.STATES if st in job.times)
+            line = "%-15s %-7s %9d words %6.1f s  (%s)" % (job.ip, job.state, job.words, job.elapsed, times)
+            if job.error is not None:
+                line += "  %s" % (job.error)
+            lines.append(line)
+        failed = sum(1 for job in self.jobs if job.state != "ok")
+        lines.append("%d boards, %d failed" % (len(self.jobs), failed))
+        return lines
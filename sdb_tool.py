@@ -20,11 +20,8 @@ import subprocess
 import argparse as arg
 
 from bridges.ethbone import *
-from bridges.wb_uart import *
 from bridges.sdb import *
-from core.ptsexcept import *
-from core.ptslogger import PTSLogger
-from core.tools import KeyInput
+from bridges.sdbimage import SDBImage
 
 def auto_int(x):
     """ Convert hexadecimal to int """
@@ -37,9 +34,11 @@ def main():
     parser.add_argument('--debug','-d',help="Enable debug output",action='store_true')
     parser.add_argument('--verbose','-v',help="Print Sdb in full version",action='store_true')
     parser.add_argument('--address', '-a', help="SDB Bus address (Hex format)",type=auto_int,default=None)
-    parser.add_argument('--bus','-b',help='communication bus', choices=['EB','UART'],required=True)
-    parser.add_argument('--lun','-l',help='Logical unit Number (Bus Index / SerialPort / IP)',type=str, required=True)
+    parser.add_argument('--bus','-b',help='communication bus (IMAGE to replay a file exported with --export)', choices=['EB','UART','IMAGE'],required=True)
+    parser.add_argument('--lun','-l',help='Logical unit Number (Bus Index / SerialPort / IP / image file)',type=str, required=True)
     parser.add_argument('--find','-f',help='Find a specific device vendor_id:dev_id',default=None)
+    parser.add_argument('--refresh','-r',help='Ignore the SDB cache and parse the device again',action='store_true')
+    parser.add_argument('--export','-e',help='Export the SDB tables and tree to an image file',default=None)
 
 
 
@@ -50,31 +49,43 @@ def main():
         if args.bus.lower() == "eb":
             bus = EthBone(args.lun,args.debug)
         elif args.bus.lower() == "uart":
-            plog=PTSLogger("/tmp/info.log","/tmp/error.log",args.debug)
-            bus = wb_UART(plog)
+            from bridges.wb_uart import wb_UART # needs pyserial
+            bus = wb_UART(args.debug)
             bus.open(args.lun)
+        elif args.bus.lower() == "image":
+            bus = SDBImage(args.lun)
         else:
             print("Unknown bus")
-            return
-    except BusException, e:
+            return 1
+    except BusException as e:
         print("Fatal: %s" % (e))
+        return 1
 
     ##TODO: add sdb to detect where we should load on any bus.
 
-    sdbroot=SDBNode(bus,args.address)
-    sdbroot.debug=args.debug
-    sdbroot.parse()
+    if args.bus.lower() == "image":
+        sdbroot=SDBNode(bus,bus.root if args.address==None else args.address,debug=args.debug)
+        sdbroot.parse()
+    else:
+        ## Same key as the other tools for EB ("udp/<IP>")
+        key=args.lun if args.bus.lower()=="eb" else "uart:%s" %(args.lun)
+        sdbroot=SDBCache(debug=args.debug).get(bus,key,args.refresh,args.address)
+
+    if args.export!=None:
+        SDBImage.export(sdbroot,args.export,args.lun)
+        print("SDB image saved to %s" %(args.export))
 
     if args.find==None:
         sdbroot.ls(args.verbose)
     else:
         ids=str.split(args.find,":")
-        prods=sdbroot.findProduct(long(ids[0],0),int(ids[1],0))
+        prods=sdbroot.findProduct(int(ids[0],0),int(ids[1],0))
         for p in prods:
             SDBNode.ls_oneline(p[0],p[1],p[2])
 
 
     print()
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
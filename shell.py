@@ -44,6 +44,8 @@ def main():
     parser.add_argument('IP', type=str, help='IP of the device')
     parser.add_argument('--input','-i',help='Execute an input script of WRPC commands')
     parser.add_argument('--output','-o',help='Save the output of an input script to a file')
+    parser.add_argument('--refresh-sdb', action='store_true',
+                        help='Ignore the SDB cache and parse the device again')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Verbose output')
 
@@ -56,7 +58,7 @@ def main():
         exit(1)
 
     try:
-        shell = VUART_shell(ip=args.IP, verbose=args.verbose)
+        shell = VUART_shell(ip=args.IP, verbose=args.verbose, sdb_refresh=args.refresh_sdb)
         if args.input:
             #print('debug1')
             fin = open(args.input, 'r')
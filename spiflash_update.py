@@ -8,6 +8,16 @@ need to write something like:
 
     ./spiflash_update --bus=EB --lun=udp/192.168.7.54 --mode=update --file=wr-len-v2.x.mcs
 
+The MCS file is compiled to a binary image the first time and the image is
+reused from the cache (~/.spiflash_cache) while the MCS file does not change.
+It can be also compiled once and the image passed with --file:
+
+    ./spiflash_update --file=wr-len-v2.x.mcs --compile=wr-len-v2.x.sfim
+
+Several boards can be updated at the same time with a file with their IPs:
+
+    ./spiflash_update --fleet=rack1.txt --workers=16 --mode=update --file=wr-len-v2.x.mcs
+
 
 @file
 @date Created on Jun 16, 2015
@@ -27,8 +37,11 @@ from optparse import OptionParser
 
 from bridges.ethbone import EthBone
 from periph.ipc_spiflash import *
-from bridges.sdb import SDBNode
+from periph.spiflash_fleet import SpiFlashFleet
+from bridges.sdb import SDBNode, SDBCache
 from core.gendrvr import BusException
+from core.tools import load_ips
+from core.p7sException import Error
 
 
 def main():
@@ -49,10 +62,25 @@ def main():
     parser.add_option("-d", "--debug", help="Debug Flag", dest="debug", default=False, action="store_true")
     parser.add_option("-s", "--silent", help="Silent Flag", dest="silent", default=False, action="store_true")
     parser.add_option("-m", "--mode", help="cido: Check ID Only," "vo: Verify Only," "update: update flash image", dest="mode", default="cido")
-    parser.add_option("-f", "--file", help="MCS file", dest="file")
+    parser.add_option("-f", "--file", help="MCS file or compiled image", dest="file")
+    parser.add_option("-c", "--compile", help="Compile the MCS file to a binary image file and exit", dest="compile")
+    parser.add_option("-n", "--no-cache", help="Do not use the cache of compiled MCS files", dest="cache", default=True, action="store_false")
+    parser.add_option("-F", "--fleet", help="File with the IP of several boards (one by line) to update at the same time", dest="fleet")
+    parser.add_option("-w", "--workers", help="Max number of boards handled at the same time with --fleet", dest="workers", type="int", default=8)
+    parser.add_option("-r", "--refresh-sdb", help="Ignore the SDB cache and parse the device again", dest="refresh_sdb", default=False, action="store_true")
 
     options, args = parser.parse_args()
 
+    if options.compile:
+        if not options.file:
+            parser.error("--compile needs the MCS file given with --file")
+        image = SpiFlash.compileImage(options.file, options.compile, options.debug)
+        print("%s: %d words (CRC=0x%08x)" % (options.compile, len(image), image.crc()))
+        return 0
+
+    if options.fleet:
+        return fleet_update(options)
+
     ## Opening Bus connection
     try:
         if options.bus_type.lower() == "eb":
@@ -65,9 +93,7 @@ def main():
         print("Fatal: %s" % (e))
         return 1
 
-    sdb = SDBNode(bus, None)
-    sdb.base = sdb.scan()
-    sdb.parse()
+    sdb = SDBCache(debug=options.debug).get(bus, "udp/%s" % options.lun, refresh=options.refresh_sdb)
     blockrams = sdb.findProduct(VENDOR_ID_CERN, WR_MININIC_RAM)
     spi_base = sdb.findProduct(VENDOR_ID_7SOLS, WR_SPI_FLASH)[0][1]
 
@@ -85,11 +111,39 @@ def main():
         return 0
 
     # This address must be changed if the layout changes.
-    flash=SpiFlash(bus,spi_base,options.debug)
+    flash=SpiFlash(bus,spi_base,options.debug,options.cache)
 
     flash.flash_update(options.mode,options.file)
 
 
+def fleet_update(options):
+    '''
+    Run the operation on all the boards of the --fleet file and print a summary
+    '''
+    try:
+        ips = load_ips(fpath=options.fleet)
+    except Error as e:
+        print("Fatal: %s" % (e.errmsg))
+        return 1
+
+    def progress(job):
+        msg = "%-15s %s" % (job.ip, job.state)
+        if job.error is not None: msg += ": %s" % (job.error)
+        print(msg)
+
+    image = options.file
+    if options.mode == "update":
+        image = SpiFlash.loadImage(options.file, options.cache, options.debug)
+        print("Image: %d words (CRC=0x%08x)" % (len(image), image.crc()))
+
+    fleet = SpiFlashFleet(ips, image, options.mode, options.workers, options.debug,
+                          refresh_sdb=options.refresh_sdb, progress=progress)
+    fleet.run()
+    print("")
+    for line in fleet.summary():
+        print(line)
+    return 0 if all(job.state == "ok" for job in fleet.jobs) else 1
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Minimal Etherbone slave over UDP used by the tests of bridges/ethbone.py
+
+It answers the probe of eb_device_open() and the read/write records of the
+cycles from a dict of 32bits words, so libetherbone can be exercised
+without a WR device.
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import platform
+import socket
+import struct
+import threading
+
+
+# libetherbone shipped in lib/ for this machine
+LIBETHERBONE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "lib", "libetherbone.so_%s" % platform.machine())
+
+EB_MAGIC = 0x4E6F
+
+
+class EBSim(threading.Thread):
+    '''
+    Etherbone slave listening on 127.0.0.1 (random port)
+
+    Attributes:
+        mem (dict) : address -> 32bits word
+        hooks (dict) : address -> (read function, write function), either can be None
+        drop (bool) : ignore the cycles (the probes are still answered)
+        npkts (int) : number of cycle packets received
+    '''
+
+    def __init__(self, mem=None, hooks=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.mem = mem if mem is not None else {}
+        self.hooks = hooks or {}
+        self.drop = False
+        self.npkts = 0
+        self.running = True
+        self.start()
+
+    @property
+    def lun(self):
+        return "udp/127.0.0.1/%d" % (self.port)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.sock.close()
+
+    def run(self):
+        while self.running:
+            try:
+                pkt, peer = self.sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            resp = self.handle(pkt)
+            if resp:
+                self.sock.sendto(resp, peer)
+
+    def read(self, addr):
+        hook = self.hooks.get(addr)
+        if hook and hook[0]:
+            return hook[0]() & 0xFFFFFFFF
+        return self.mem.get(addr, 0)
+
+    def write(self, addr, value):
+        hook = self.hooks.get(addr)
+        if hook and hook[1]:
+            hook[1](value)
+        else:
+            self.mem[addr] = value
+
+    def handle(self, pkt):
+        magic, flags, sizes = struct.unpack('>HBB', pkt[:4])
+        if magic != EB_MAGIC:
+            return None
+        if flags & 1: # probe
+            return struct.pack('>HBB', EB_MAGIC, 0x10 | 2, 0x44) + pkt[4:]
+        if self.drop:
+            return None
+        self.npkts += 1
+        out = [struct.pack('>HBB', EB_MAGIC, 0x10, 0x44)]
+        i = 4
+        while i + 4 <= len(pkt):
+            fl, be, wc, rc = struct.unpack('>BBBB', pkt[i:i+4])
+            i += 4
+            if wc:
+                base, = struct.unpack('>I', pkt[i:i+4])
+                i += 4
+                for k in range(wc):
+                    value, = struct.unpack('>I', pkt[i:i+4])
+                    i += 4
+                    if not fl & 0x04:   # not a config space write
+                        self.write(base, value)
+                    if not fl & 0x02:   # not a FIFO write
+                        base += 4
+            if rc:
+                ret, = struct.unpack('>I', pkt[i:i+4])
+                i += 4
+                values = []
+                for k in range(rc):
+                    addr, = struct.unpack('>I', pkt[i:i+4])
+                    i += 4
+                    values.append(0 if fl & 0x40 else self.read(addr))
+                # the reply writes the values to the return address
+                rfl = (0x04 if fl & 0x80 else 0) | (0x02 if fl & 0x20 else 0) | (fl & 0x08)
+                out.append(struct.pack('>BBBBI', rfl, be, rc, 0, ret) +
+                           b''.join(struct.pack('>I', v) for v in values))
+        return b''.join(out)
@@ -0,0 +1,127 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Bus driver in memory used by the tests
+
+@file
+@copyright LGPL v2.1
+'''
+
+from core.gendrvr import GenDrvr, BusCritical, BusWarning
+
+
+class FakeBus(GenDrvr):
+    '''
+    GenDrvr backed by a dict of 32bits words that records every access
+
+    Attributes:
+        mem (dict) : address -> 32bits word
+        hooks (dict) : address -> (read function, write function), either can be None
+        ops (list) : one tuple per bus access: ("read", addr), ("write", addr, value),
+        ("blockread", addr, nwords), ("blockwrite", addr, values),
+        ("read_many", addrs) or ("write_many", pairs)
+        unmapped (bool) : the addresses not in mem raise BusWarning (read as 0 otherwise)
+    '''
+
+    def __init__(self, mem=None, hooks=None, unmapped=False):
+        self.mem = dict(mem or {})
+        self.hooks = dict(hooks or {})
+        self.ops = []
+        self.unmapped = unmapped
+        self.libname = "fakebus"
+
+    def count(self, *kinds):
+        '''Number of accesses of the given kinds'''
+        return sum(1 for op in self.ops if op[0] in kinds)
+
+    def _read(self, addr):
+        hook = self.hooks.get(addr)
+        if hook and hook[0]:
+            return hook[0]() & 0xFFFFFFFF
+        if self.unmapped and addr not in self.mem:
+            raise BusWarning("Address 0x%08x is not mapped" % (addr))
+        return self.mem.get(addr, 0)
+
+    def _write(self, addr, value):
+        hook = self.hooks.get(addr)
+        if hook and hook[1]:
+            hook[1](value & 0xFFFFFFFF)
+        else:
+            self.mem[addr] = value & 0xFFFFFFFF
+
+    def open(self, LUN):
+        pass
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def scan(options=None):
+        return []
+
+    def devread(self, bar, offset, width):
+        self.ops.append(("read", offset))
+        return self._read(offset)
+
+    def devwrite(self, bar, offset, width, datum):
+        self.ops.append(("write", offset, datum))
+        self._write(offset, datum)
+
+    def read_many(self, addresses):
+        addresses = list(addresses)
+        self.ops.append(("read_many", addresses))
+        return [self._read(addr) for addr in addresses]
+
+    def write_many(self, pairs):
+        pairs = list(pairs)
+        self.ops.append(("write_many", pairs))
+        for addr, datum in pairs:
+            self._write(addr, datum)
+
+
+class FakeBlockBus(FakeBus):
+    '''
+    FakeBus with block reads and writes
+    '''
+
+    blockread = True
+    blockwrite = True
+    silent = False # EthBone attribute (see SpiFlash.IPROG_reboot)
+
+    def devblockread(self, bar, offset, bsize, incr=0x4):
+        self.ops.append(("blockread", offset, bsize//4))
+        return [self._read(offset+i*incr) for i in range(bsize//4)]
+
+    def devblockwrite(self, bar, offset, ldata, incr=0x4):
+        ldata = [int(d) for d in ldata]
+        self.ops.append(("blockwrite", offset, ldata))
+        for i, datum in enumerate(ldata):
+            self._write(offset+i*incr, datum)
+        return 0
+
+
+class FakeSession(object):
+    '''
+    EBSession handing out FakeBus devices
+
+    Attributes:
+        buses (dict) : LUN -> bus (get() raises BusCritical for the others)
+        refs (dict) : LUN -> number of users
+    '''
+
+    def __init__(self, buses=None):
+        self.buses = dict(buses or {})
+        self.refs = {}
+
+    def get(self, lun, verbose=False):
+        if lun not in self.buses:
+            raise BusCritical("Could not open %s" % (lun))
+        self.refs[lun] = self.refs.get(lun, 0)+1
+        return self.buses[lun]
+
+    def release(self, lun):
+        if lun in self.refs:
+            self.refs[lun] = max(0, self.refs[lun]-1)
+
+    def close(self):
+        pass
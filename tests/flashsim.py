@@ -0,0 +1,85 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+WR-SPI-Flash-Update core behind the registers of a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+from periph.ipc_spiflash import SpiFlash
+
+
+class FlashSim(object):
+    '''
+    Erases, programs from the FIFO and signals DONE as the core does, one
+    step for each read of SR
+
+    Attributes:
+        nwords (int) : words to receive before ProgramOK
+        drain (int) : words moved from the FIFO to the flash at each read of SR
+        erase_reads, done_reads (int) : reads of SR before EraseOK and Done
+        fifo (list) : words in the FIFO
+        flash (list) : words programmed
+        overflow (int) : words written when the FIFO was full (lost)
+        error (bool) : set the Error and Done bits of SR
+        iprog (list) : words written to the ICAPE2 input register
+    '''
+
+    def __init__(self, bus, base=0x20700, nwords=0, drain=64, erase_reads=3, done_reads=3):
+        self.nwords = nwords
+        self.drain = drain
+        self.erase_reads = erase_reads
+        self.done_reads = done_reads
+        self.fifo = []
+        self.flash = []
+        self.overflow = 0
+        self.error = False
+        self.iprog = []
+        self.state = "reset"
+        self.sr = 0
+        self.reads = 0
+        bus.hooks[base+SpiFlash.CR_offset] = (None, self._cr_write)
+        bus.hooks[base+SpiFlash.SR_offset] = (self._sr_read, None)
+        bus.hooks[base+SpiFlash.DR_offset] = (None, self._dr_write)
+        bus.hooks[base+SpiFlash.FSR_offset] = (self._fsr_read, self._fsr_write)
+        bus.hooks[base+SpiFlash.IIR_offset] = (None, self.iprog.append)
+        bus.hooks[base+SpiFlash.RWC_offset] = (lambda: len(self.flash), None)
+
+    def _cr_write(self, value):
+        self.reads = 0
+        self.sr = SpiFlash.msk_ST if value else 0
+        self.state = {SpiFlash.mod_UPDATE: "erase", SpiFlash.mod_CIDO: "done",
+                      SpiFlash.mod_VO: "done"}.get(value, "reset")
+
+    def _sr_read(self):
+        self.reads += 1
+        if self.state == "erase" and self.reads >= self.erase_reads:
+            self.sr |= SpiFlash.msk_EOK
+            self.state = "program"
+        elif self.state == "program":
+            n = min(self.drain, len(self.fifo), self.nwords-len(self.flash))
+            self.flash += self.fifo[:n]
+            del self.fifo[:n]
+            if len(self.flash) >= self.nwords:
+                self.sr |= SpiFlash.msk_POK
+                self.state = "done"
+                self.reads = 0
+        elif self.state == "done" and self.reads >= self.done_reads:
+            self.sr |= SpiFlash.msk_DN | (SpiFlash.msk_PSWOK if SpiFlash.msk_POK & self.sr else 0)
+        # the core stops with Done and Error set
+        return self.sr | (SpiFlash.msk_ERR | SpiFlash.msk_DN if self.error else 0)
+
+    def _dr_write(self, value):
+        if len(self.fifo) >= SpiFlash.FIFO_WSIZE:
+            self.overflow += 1
+        else:
+            self.fifo.append(value)
+
+    def _fsr_read(self):
+        n = len(self.fifo)
+        return (n & SpiFlash.msk_WC) | (SpiFlash.msk_WF if n >= SpiFlash.FIFO_WSIZE else 0)
+
+    def _fsr_write(self, value):
+        if not value & SpiFlash.msk_RST_N:
+            self.fifo = []
@@ -0,0 +1,68 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Raw SDB tables used by the tests of bridges/sdb.py
+
+The records are built big-endian as they are read on the bus, words() gives
+the memory of a FakeBus holding them.
+
+@file
+@copyright LGPL v2.1
+'''
+
+import struct
+
+from bridges.sdb import SDB_MAGIC
+
+
+def product(vendor, device, name, rtype):
+    return struct.pack(">QIII", vendor, device, 1, 0x20240101) + name.encode().ljust(19, b" ") + bytes([rtype])
+
+def component(first, end, vendor, device, name, rtype):
+    return struct.pack(">QQ", first, end) + product(vendor, device, name, rtype)
+
+def interconnect(nrec, first, end):
+    return struct.pack(">IHBB", SDB_MAGIC, nrec, 1, 0) + component(first, end, 0x651, 0xe6a542c9, "WB4-Crossbar-GSI", 0x00)
+
+def device(first, end, vendor, device_id, name):
+    return struct.pack(">HBBI", 0, 1, 0, 4) + component(first, end, vendor, device_id, name, 0x01)
+
+def bridge(child, first, end):
+    return struct.pack(">Q", child) + component(first, end, 0x651, 0xeef0b198, "WB4-Bridge-GSI", 0x02)
+
+def synthesis(commit="deadbeefcafe1234", date=0x20240315):
+    return (b"wr_len_top".ljust(16, b"\0") + commit.encode().ljust(16, b"\0") + b"ISE".ljust(8, b"\0")
+            + struct.pack(">II", 0x147, date) + b"mkauer".ljust(15, b"\0") + bytes([0x82]))
+
+def words(tables):
+    '''Memory (address -> 32bits word) holding the tables (address -> bytes)'''
+    mem = {}
+    for base, raw in tables.items():
+        for i in range(0, len(raw), 4):
+            mem[base+i] = struct.unpack(">I", raw[i:i+4])[0]
+    return mem
+
+
+# Root table at 0x30000 with a UART, the SPI Flash core, a bridge to a
+# crossbar at 0x40000 (table at 0x3f00) and the synthesis record
+ROOT = 0x30000
+CHILD = 0x3f00
+UART = (0xce42, 0xe2d13d04)
+SPIFLASH = (0x7501, 0xae5f)
+BLOCKRAM = (0xce42, 0x66cfeb52)
+ROOT_TABLE = (interconnect(5, 0, 0xfffff)
+              + device(0x20500, 0x205ff, UART[0], UART[1], "WR-Periph-UART")
+              + device(0x20700, 0x207ff, SPIFLASH[0], SPIFLASH[1], "WR-SPI-Flash-Upd")
+              + bridge(CHILD, 0x40000, 0x4ffff)
+              + synthesis())
+CHILD_TABLE = (interconnect(2, 0, 0xffff)
+               + device(0x8000, 0xbfff, BLOCKRAM[0], BLOCKRAM[1], "WB4-BlockRAM"))
+TABLES = {ROOT: ROOT_TABLE, CHILD: CHILD_TABLE}
+
+# Larger design with its root table at 0x60000 and the wr_core crossbar
+# behind a bridge, its nested table is at 0x30000 (the address of ROOT above)
+OUTER = 0x60000
+OUTER_TABLES = {OUTER: (interconnect(2, 0, 0xfffff)
+                        + bridge(ROOT, 0x0, 0x3ffff)),
+                ROOT: (interconnect(2, 0, 0x3ffff)
+                       + device(0x20500, 0x205ff, UART[0], UART[1], "WR-Periph-UART"))}
@@ -0,0 +1,100 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the register batches of GenDrvr and of the serial bridges
+
+@file
+@copyright LGPL v2.1
+'''
+
+import unittest
+
+from fakebus import FakeBus
+from core.gendrvr import GenDrvr
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+
+class TestGenDrvr(unittest.TestCase):
+
+    def test_fallback(self):
+        bus = FakeBus({0x10: 1, 0x20: 2})
+        self.assertEqual(GenDrvr.read_many(bus, [0x20, 0x10, 0x30]), [2, 1, 0])
+        GenDrvr.write_many(bus, [(0x30, 3), (0x10, 4)])
+        self.assertEqual(bus.mem, {0x10: 4, 0x20: 2, 0x30: 3})
+        # one bus access per register
+        self.assertEqual(bus.count("read"), 3)
+        self.assertEqual(bus.count("write"), 2)
+
+
+class FakeConsole(object):
+    '''
+    Serial port of a WRPC console: echoes the commands and answers "wb read"
+    '''
+
+    def __init__(self, mem):
+        self.mem = mem
+        self.nwrites = 0
+        self.pending = b""
+        self.lines = []
+
+    def write(self, data):
+        self.nwrites += 1
+        self.pending += data
+        while b"\r" in self.pending:
+            cmd, self.pending = self.pending.split(b"\r", 1)
+            self.lines.append(cmd + b"\r\n")
+            args = cmd.decode('ascii').split()
+            if args[:2] == ["wb", "read"]:
+                self.lines.append(b"0x%x\r\n" % (self.mem.get(int(args[2], 0), 0)))
+            elif args[:2] == ["wb", "write"]:
+                self.mem[int(args[2], 0)] = int(args[3], 0)
+        return len(data)
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+    def flushInput(self):
+        pass
+
+    def flushOutput(self):
+        pass
+
+    def flush(self):
+        pass
+
+
+@unittest.skipIf(serial is None, "pyserial not available")
+class TestSerialScript(unittest.TestCase):
+
+    def setUp(self):
+        from bridges.serial_script import SerialScript
+
+        class Bridge(SerialScript):
+            verbose = False
+            INTERCHARTIMEOUT = 0
+            WRTIMEOUT = 0
+
+        self.mem = {0x100: 0xCAFE, 0x200: 0}
+        self.bridge = Bridge()
+        self.bridge._serial = FakeConsole(self.mem)
+
+    def test_read_many(self):
+        self.assertEqual(self.bridge.read_many([0x200, 0x100]), [0, 0xCAFE])
+
+    def test_write_many(self):
+        self.bridge.write_many([(0x200, 5), (0x300, 6)])
+        self.assertEqual(self.mem, {0x100: 0xCAFE, 0x200: 5, 0x300: 6})
+
+    def test_missing_values(self):
+        from core.p7sException import Retry
+        self.bridge._serial.readline = lambda: b""
+        with self.assertRaises(Retry):
+            self.bridge.read_many([0x100])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the Etherbone driver (bridges/ethbone.py) against the EBSim slave
+
+They need the libetherbone of lib/ for this machine (skipped otherwise).
+
+@file
+@copyright LGPL v2.1
+'''
+
+import array
+import asyncio
+import binascii
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ebsim import EBSim, LIBETHERBONE
+from bridges.ethbone import EthBone, EBSession
+from core.gendrvr import BusWarning
+
+
+def setUpModule():
+    try:
+        EBSession(LIBETHERBONE).close()
+    except OSError as e:
+        raise unittest.SkipTest("libetherbone not available: %s" % (e))
+
+
+class EthBoneTestCase(unittest.TestCase):
+    '''
+    One simulated device opened through a session
+    '''
+
+    def setUp(self):
+        self.mem = dict((0x1000+4*i, (0x5A000000 | i)) for i in range(3000))
+        self.sim = EBSim(self.mem)
+        self.session = EBSession(LIBETHERBONE)
+        self.dev = self.session.get(self.sim.lun)
+
+    def tearDown(self):
+        self.session.close()
+        self.sim.stop()
+
+
+class TestBlockRead(EthBoneTestCase):
+
+    def test_buffer(self):
+        # more words than EB_CYCLE_WORDS*EB_PIPELINE_DEPTH
+        words = self.dev.devblockread_buffer(0, 0x1000, 4*3000)
+        self.assertIsInstance(words, memoryview)
+        self.assertEqual(words.format, 'I')
+        self.assertEqual(words.tolist(), [self.mem[0x1000+4*i] for i in range(3000)])
+        self.assertEqual(self.dev.devblockread(0, 0x1000+4*10, 8), [0x5A00000A, 0x5A00000B])
+
+    def test_fifo(self):
+        fifo = iter(range(100))
+        self.sim.hooks[0x20] = (lambda: next(fifo), None)
+        self.assertEqual(self.dev.devblockread(0, 0x20, 4*100, incr=0), list(range(100)))
+
+    def test_timeout(self):
+        self.dev.EB_CYCLE_TIMEOUT = 0.2
+        self.sim.drop = True
+        with self.assertRaises(BusWarning):
+            self.dev.devblockread_buffer(0, 0x1000, 4*300)
+        # the cycles still in flight are kept until libetherbone calls back
+        self.assertEqual(set(self.session.cycles), set(self.session.orphans))
+        self.sim.drop = False
+        self.assertEqual(self.dev.read(0x1000), 0x5A000000)
+
+    def test_wall_clock_step(self):
+        # the deadlines use the monotonic clock: a jump of the wall clock is ignored
+        clock = iter(range(0, 10**9, 3600))
+        with mock.patch("time.time", lambda: next(clock)):
+            self.assertEqual(self.dev.devblockread(0, 0x1000, 8), [0x5A000000, 0x5A000001])
+
+
+class TestBlockWrite(EthBoneTestCase):
+
+    def test_buffer(self):
+        words = array.array('I', range(0x100, 0x100+2000))
+        self.dev.wcrc = 0
+        self.dev.devblockwrite_buffer(0, 0x10000, words)
+        self.dev.read(0x10000) # the writes are silent: wait until they are done
+        self.assertEqual([self.mem[0x10000+4*i] for i in range(2000)], words.tolist())
+        # same running CRC as devblockwrite() with lists (one cycle each)
+        crc = self.dev.wcrc
+        self.dev.wcrc = 0
+        for i in range(0, len(words), 100):
+            self.dev.devblockwrite(0, 0x20000, words[i:i+100].tolist())
+        self.assertEqual(self.dev.wcrc, crc)
+        self.assertEqual(crc, binascii.crc32(words.tobytes()))
+
+    def test_bytes_and_fifo(self):
+        fifo = []
+        self.sim.hooks[0x30] = (None, fifo.append)
+        data = array.array('I', [1, 2, 3, 0xFFFFFFFF])
+        self.dev.devblockwrite_buffer(0, 0x30, data.tobytes(), incr=0)
+        self.dev.devblockwrite_buffer(0, 0x30, [4, 5], incr=0)
+        self.dev.read(0x30)
+        self.assertEqual(fifo, [1, 2, 3, 0xFFFFFFFF, 4, 5])
+
+
+class TestAsync(EthBoneTestCase):
+
+    def test_outstanding_reads(self):
+        futures = [self.dev.read_async(0x1000+4*i) for i in range(200)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [self.mem[0x1000+4*i] for i in range(200)])
+        self.assertEqual(self.session.futures, {})
+
+    def test_write_then_read(self):
+        self.assertIsNone(self.dev.write_async(0x40, 0x1234).result(timeout=5))
+        self.assertEqual(self.mem[0x40], 0x1234)
+
+    def test_asyncio(self):
+        async def read():
+            return await asyncio.wrap_future(self.dev.read_async(0x1004))
+        self.assertEqual(asyncio.run(read()), 0x5A000001)
+
+    def test_timeout(self):
+        self.dev.EB_CYCLE_TIMEOUT = 0.2
+        self.sim.drop = True
+        fut = self.dev.read_async(0x1000)
+        with self.assertRaises(BusWarning):
+            fut.result(timeout=5)
+        self.assertEqual(self.session.futures, {})
+        self.assertEqual(set(self.session.cycles), set(self.session.orphans))
+
+
+class TestBatches(EthBoneTestCase):
+
+    def test_read_many(self):
+        npkts = self.sim.npkts
+        addresses = [0x1000+4*i for i in (7, 0, 2999, 40)]
+        self.assertEqual(self.dev.read_many(addresses), [self.mem[addr] for addr in addresses])
+        self.assertEqual(self.sim.npkts - npkts, 1)
+
+    def test_write_many(self):
+        pairs = [(0x50000+0x100*i, i) for i in range(10)]
+        npkts = self.sim.npkts
+        self.dev.write_many(pairs)
+        self.assertEqual(self.sim.npkts - npkts, 1)
+        self.dev.read(0x50000)
+        self.assertEqual([self.mem[addr] for addr, datum in pairs], list(range(10)))
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.sims = [EBSim({0x0: n}) for n in range(3)]
+        self.session = EBSession(LIBETHERBONE, max_devices=2)
+
+    def tearDown(self):
+        self.session.close()
+        for sim in self.sims:
+            sim.stop()
+
+    def test_shared_device(self):
+        lun = self.sims[0].lun
+        dev = self.session.get(lun)
+        self.assertIs(self.session.get(lun), dev)
+        self.assertEqual(self.session.refs[lun], 2)
+        self.session.release(lun)
+        self.session.release(lun)
+        self.assertEqual(self.session.refs[lun], 0)
+        self.assertIn(lun, self.session) # kept opened for the next get()
+
+    def test_evict_unused(self):
+        a, b, c = [sim.lun for sim in self.sims]
+        self.session.get(a)
+        self.session.get(b)
+        self.session.get(c) # a and b are in use: nothing is closed
+        self.assertEqual(len(self.session), 3)
+        self.session.release(a)
+        self.session.release(c)
+        self.session.get(b) # evicts down to max_devices, least recently used first
+        self.assertNotIn(a, self.session)
+        self.assertEqual([self.session.get(lun).read(0) for lun in (b, c)], [1, 2])
+
+    def test_close_idle(self):
+        a, b = self.sims[0].lun, self.sims[1].lun
+        self.session.get(a)
+        self.session.get(b)
+        self.session.release(a)
+        self.assertEqual(self.session.close_idle(0), 1)
+        self.assertNotIn(a, self.session)
+        self.assertIn(b, self.session)
+
+    def test_slow_device(self):
+        # the reads of a slow device do not block the other devices of the session
+        self.sims[0].hooks[0x4] = (lambda: time.sleep(0.3) or 7, None)
+        slow, fast = self.session.get(self.sims[0].lun), self.session.get(self.sims[1].lun)
+        done = []
+        t = threading.Thread(target=lambda: done.append(slow.devblockread(0, 0x4, 4*3, incr=0)))
+        t.start()
+        time.sleep(0.05)
+        for i in range(20):
+            self.assertEqual(fast.read(0), 1)
+        self.assertEqual(done, [])
+        t.join()
+        self.assertEqual(done, [[7, 7, 7]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the VUART script runner on several devices (core/fleet.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fakebus import FakeBlockBus, FakeSession
+from sdbdata import TABLES, words
+from vuartsim import VUARTSim
+
+try:
+    from bridges.VUART_bridge import VUART_bridge
+    from bridges.sdb import SDBCache
+    from core.fleet import VUART_fleet
+except ImportError: # pyserial is needed by ConsoleBridge
+    VUART_fleet = None
+
+
+def setUpModule():
+    if VUART_fleet is None:
+        raise unittest.SkipTest("pyserial not available")
+
+
+class TestFleet(unittest.TestCase):
+
+    IPS = ["192.168.7.10", "192.168.7.11", "192.168.7.12"]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patches = [mock.patch.object(SDBCache, "PATH", os.path.join(self.dir, "sdb_cache.json")),
+                   mock.patch.object(VUART_bridge, "MAX_TIMEOUT", 0.1)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.sims = {}
+        buses = {}
+        for ip in self.IPS[:2]: # the last one does not answer
+            bus = FakeBlockBus(words(TABLES))
+            self.sims[ip] = VUARTSim(bus, commands={"ver": "wrc %s" % ip})
+            buses["udp/"+ip] = bus
+        self.session = FakeSession(buses)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_run(self):
+        fleet = VUART_fleet(self.IPS, workers=3, session=self.session)
+        results = list(fleet.run(["# comment", "ver", "", "stat"]))
+        ok = sorted((r.ip, r.index, r.cmd, r.output) for r in results if r.error is None)
+        self.assertEqual(ok, [(self.IPS[0], 0, "ver", "wrc "+self.IPS[0]), (self.IPS[0], 1, "stat", ""),
+                              (self.IPS[1], 0, "ver", "wrc "+self.IPS[1]), (self.IPS[1], 1, "stat", "")])
+        failed = [r for r in results if r.error is not None]
+        self.assertEqual([(r.ip, r.index) for r in failed], [(self.IPS[2], -1)])
+        # commands sent in order, devices given back to the session
+        self.assertEqual(self.sims[self.IPS[0]].sent, b"\x1b\rver\rstat\r")
+        self.assertEqual(set(self.session.refs.values()), {0})
+
+    def test_not_ready(self):
+        sim = self.sims[self.IPS[0]]
+        sim.commands["ver"] = lambda: setattr(sim, "ready", False) or "wrc"
+        fleet = VUART_fleet(self.IPS[:1], session=self.session)
+        results = list(fleet.run(["ver", "stat", "ip"]))
+        # the commands after the failed one are skipped
+        self.assertEqual([(r.index, r.error is None) for r in results], [(0, True), (1, False)])
+        self.assertIn(VUART_bridge.NOT_READY, str(results[1].error))
+
+
+if __name__ == '__main__':
+    unittest.main()
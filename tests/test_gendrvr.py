@@ -0,0 +1,72 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the register wait of GenDrvr (core/gendrvr.py) on a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+import time
+import unittest
+from unittest import mock
+
+from fakebus import FakeBus
+from core.gendrvr import BusTimeout
+
+
+class TestWaitUntil(unittest.TestCase):
+
+    def setUp(self):
+        self.values = []
+        self.bus = FakeBus(hooks={0x10: (self.next_value, None)})
+
+    def next_value(self):
+        return self.values.pop(0) if len(self.values) > 1 else self.values[0]
+
+    def test_any_bit(self):
+        self.values = [0, 0x100, 0x104]
+        self.assertEqual(self.bus.wait_until(0x10, 0x6, poll_min=0.001), 0x104)
+        self.assertEqual(self.bus.count("read"), 3)
+
+    def test_value(self):
+        self.values = [0x1, 0x3, 0xF5, 0x7]
+        self.assertEqual(self.bus.wait_until(0x10, 0xF, value=0x5, poll_min=0.001), 0xF5)
+
+    def test_backoff(self):
+        self.values = [0]*6 + [1]
+        with mock.patch("time.sleep") as sleep:
+            self.bus.wait_until(0x10, 0x1, poll_min=0.001, poll_max=0.004)
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [0.001, 0.002, 0.004, 0.004, 0.004, 0.004])
+
+    def test_timeout(self):
+        self.values = [0x20]
+        start = time.time()
+        with self.assertRaises(BusTimeout) as ctx:
+            self.bus.wait_until(0x10, 0x1, timeout=0.1, poll_max=0.02)
+        elapsed = time.time()-start
+        self.assertTrue(0.1 <= elapsed < 0.5, elapsed)
+        self.assertLess(self.bus.count("read"), 15)
+        self.assertIn("last 0x00000020", str(ctx.exception))
+
+    def test_on_change(self):
+        self.values = [0x10, 0x10, 0x20, 0x20, 0x30, 0x31]
+        changes = []
+        self.bus.wait_until(0x10, 0x1, poll_min=0.001, on_change=changes.append)
+        # the first value is not a change
+        self.assertEqual(changes, [0x20, 0x30])
+
+    def test_restart(self):
+        # the register keeps changing: the wait lasts more than the timeout
+        self.values = list(range(2, 40, 2)) + [1]
+        with self.assertRaises(BusTimeout):
+            self.bus.wait_until(0x10, 0x1, timeout=0.02, poll_min=0.005, poll_max=0.005)
+        self.values = list(range(2, 40, 2)) + [1]
+        start = time.time()
+        self.assertEqual(self.bus.wait_until(0x10, 0x1, timeout=0.02, poll_min=0.005, poll_max=0.005,
+                                             restart=True), 1)
+        self.assertGreater(time.time()-start, 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the MCS parser and the flash programming (periph/ipc_spiflash.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fakebus import FakeBlockBus
+from flashsim import FlashSim
+from periph.ipc_spiflash import SpiFlash, FlashImage
+
+
+def mcs_lines(data, linelen=16):
+    '''Intel HEX records of data (the checksums are not checked by the parser)'''
+    lines = [":020000040000FA"]
+    for i in range(0, len(data), linelen):
+        chunk = data[i:i+linelen]
+        lines.append(":%02X%04X00%s00" % (len(chunk), i & 0xFFFF, chunk.hex().upper()))
+    lines.append(":00000001FF")
+    return "\n".join(lines) + "\n"
+
+
+class SpiFlashTestCase(unittest.TestCase):
+    '''
+    MCS file of 1000 bytes in a temporary directory
+    '''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # 1000 bytes: 250 words, the last data line is shorter
+        self.data = bytes(bytearray((7*i + 3) & 0xFF for i in range(1000)))
+        self.mcs = self.path("a.mcs")
+        with open(self.mcs, "w") as f:
+            f.write(mcs_lines(self.data))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def words(self, data):
+        return [int.from_bytes(data[i:i+4], "big") for i in range(0, len(data), 4)]
+
+
+class TestMCS(SpiFlashTestCase):
+
+    def test_mcs_to_packets(self):
+        packets = list(SpiFlash.mcsToPackets(self.mcs, pktwords=64))
+        self.assertEqual([len(p) for p in packets], [64, 64, 64, 58])
+        self.assertEqual([w for p in packets for w in p], self.words(self.data))
+
+    def test_mcs_last_word_padding(self):
+        with open(self.mcs, "w") as f:
+            f.write(mcs_lines(b"\x01\x02\x03\x04\x05\x06"))
+        packets = list(SpiFlash.mcsToPackets(self.mcs))
+        self.assertEqual([list(p) for p in packets], [[0x01020304, 0x0506eeee]])
+
+    def test_mcs_streaming(self):
+        packets = SpiFlash.mcsToPackets(self.mcs, pktwords=64)
+        self.assertEqual(len(next(packets)), 64) # generator: one packet at a time
+        self.assertEqual(sum(len(p) for p in packets), 250-64)
+
+    def test_mcs_debug_log(self):
+        logs = []
+        list(SpiFlash.mcsToPackets(self.mcs, debug=True, log=logs.append))
+        # the extended address and end of file records are skipped
+        self.assertEqual(logs, ["Skipping record type 4 at line 1",
+                                "Skipping record type 1 at line %d" % (len(self.data)//16+3)])
+
+
+
+class TestFlashImage(SpiFlashTestCase):
+
+    def test_open_streams_packets(self):
+        image = SpiFlash.compileImage(self.mcs, self.path("a.img"))
+        opened = FlashImage.open(self.path("a.img"))
+        self.assertIsNone(opened.words)
+        self.assertEqual(len(opened), 250)
+        self.assertEqual(opened.crc(), image.crc())
+        self.assertEqual(opened.source_hash, FlashImage.file_hash(self.mcs))
+        self.assertEqual([len(p) for p in opened.packets(100)], [100, 100, 50])
+        self.assertEqual([w for p in opened.packets(100) for w in p], self.words(self.data))
+
+    def test_bad_crc(self):
+        SpiFlash.compileImage(self.mcs, self.path("a.img"))
+        with open(self.path("a.img"), "r+b") as f:
+            f.seek(FlashImage.HEADER.size + 10)
+            f.write(b"\xff")
+        with self.assertRaisesRegex(ValueError, "bad CRC"):
+            FlashImage.open(self.path("a.img"))
+
+    def test_truncated(self):
+        SpiFlash.compileImage(self.mcs, self.path("a.img"))
+        with open(self.path("a.img"), "r+b") as f:
+            f.truncate(FlashImage.HEADER.size + 100)
+        with self.assertRaisesRegex(ValueError, "truncated"):
+            FlashImage.open(self.path("a.img"))
+
+    def test_threads(self):
+        # the fleet workers can compile the same MCS file at the same time
+        errors = []
+        def compile():
+            try:
+                SpiFlash.compileImage(self.mcs, self.path("a.img"))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=compile) for i in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["a.img", "a.mcs"])
+        self.assertEqual(len(FlashImage.open(self.path("a.img"))), 250)
+
+    def test_not_an_image(self):
+        self.assertFalse(FlashImage.is_image(self.mcs))
+        with self.assertRaises(ValueError):
+            FlashImage.open(self.mcs)
+
+
+    def test_cache(self):
+        with mock.patch.object(FlashImage, "CACHE_DIR", self.path("cache")):
+            image = SpiFlash.loadImage(self.mcs)
+            self.assertEqual(len(os.listdir(self.path("cache"))), 1)
+            with mock.patch.object(SpiFlash, "mcsToPackets") as parse:
+                cached = SpiFlash.loadImage(self.mcs)
+                parse.assert_not_called() # the MCS file is not parsed again
+            self.assertEqual(cached.crc(), image.crc())
+            # a modified MCS file is compiled again
+            with open(self.mcs, "w") as f:
+                f.write(mcs_lines(self.data[:100]))
+            self.assertEqual(len(SpiFlash.loadImage(self.mcs)), 25)
+
+
+
+class TestProgram(unittest.TestCase):
+
+    SR = 0x20700+SpiFlash.SR_offset
+    FSR = 0x20700+SpiFlash.FSR_offset
+    DR = 0x20700+SpiFlash.DR_offset
+
+    def setUp(self):
+        self.bus = FakeBlockBus()
+        self.words = list(range(0x1000, 0x1000+2000))
+        self.sim = FlashSim(self.bus, nwords=len(self.words), drain=100)
+        self.sim.state = "program"
+        self.flash = SpiFlash(self.bus, 0x20700)
+        self.flash.log = lambda msg: None
+
+    def packets(self):
+        return [self.words[i:i+SpiFlash.PKTWORDS] for i in range(0, len(self.words), SpiFlash.PKTWORDS)]
+
+    def test_fill_fifo(self):
+        self.flash.programFlash(iter(self.packets()))
+        # the last words are still in the FIFO
+        self.assertEqual(self.sim.flash + self.sim.fifo, self.words)
+        self.assertEqual(self.sim.overflow, 0)
+        bursts = [len(op[2]) for op in self.bus.ops if op[0] == "blockwrite"]
+        # the empty FIFO is filled at once, then the space freed by the core
+        self.assertEqual(bursts[0], SpiFlash.FIFO_WSIZE)
+        self.assertTrue(all(n >= SpiFlash.MIN_BURST for n in bursts[:-1]))
+        self.assertEqual((sum(bursts), len(bursts)), (len(self.words), self.flash.nbursts))
+        self.assertEqual(self.flash.nwords, len(self.words))
+        # SR and FSR are read together, the words go to the FIFO (incr=0)
+        self.assertEqual(set(op[0] for op in self.bus.ops), {"read_many", "blockwrite"})
+        self.assertTrue(all(op[1] == [self.SR, self.FSR] for op in self.bus.ops if op[0] == "read_many"))
+        self.assertTrue(all(op[1] == self.DR for op in self.bus.ops if op[0] == "blockwrite"))
+
+    def test_slow_core(self):
+        # the core frees less than MIN_BURST words at each check: the bursts wait for space
+        self.sim.drain = 10
+        self.flash.PRG_POLL_MAX = 0.001
+        self.flash.programFlash(self.packets())
+        self.assertEqual(self.sim.flash + self.sim.fifo, self.words)
+        bursts = [len(op[2]) for op in self.bus.ops if op[0] == "blockwrite"]
+        self.assertTrue(all(n >= SpiFlash.MIN_BURST for n in bursts[:-1]))
+
+    def test_error(self):
+        self.sim.drain = 1
+        self.sim.error = True
+        self.flash.programFlash(self.packets())
+        self.assertEqual(self.bus.ops, [("read_many", [self.SR, self.FSR])])
+
+
+
+class TestWait(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBlockBus()
+        self.sim = FlashSim(self.bus, erase_reads=5, done_reads=5)
+        self.flash = SpiFlash(self.bus, 0x20700)
+        self.logs = []
+        self.flash.log = self.logs.append
+
+    def test_erase(self):
+        self.sim.state = "erase"
+        start = time.time()
+        self.flash.eraseFlash()
+        # EraseOK is seen without a full second of polling
+        self.assertLess(time.time()-start, 0.5)
+        self.assertEqual(self.logs, ["Erasing", "Erase OK"])
+        self.assertEqual(self.bus.count("read"), 5)
+
+    def test_erase_timeout(self):
+        self.sim.state = "erase"
+        self.sim.erase_reads = 10**6
+        self.flash.ERASE_TO = 0.1
+        with self.assertRaisesRegex(NameError, "Timeout while erasing"):
+            self.flash.eraseFlash()
+
+    def test_erase_debug(self):
+        self.sim.state = "erase"
+        self.flash.debug = True
+        self.flash.eraseFlash()
+        # SR is read once per check (not twice in debug mode)
+        self.assertEqual(self.bus.count("read"), 5)
+        self.assertEqual(self.logs, ["Erasing", "Erase OK"])
+
+    def test_done(self):
+        self.sim.sr = SpiFlash.msk_POK
+        self.sim.state = "done"
+        self.flash.endFlash()
+        self.assertEqual(self.logs, ["DONE", "REBOOTING"])
+        self.assertEqual(len(self.sim.iprog), 8)
+
+    def test_done_error(self):
+        self.sim.error = True
+        with self.assertRaisesRegex(NameError, "An error was detected"):
+            self.flash.endFlash()
+        self.assertEqual(self.sim.iprog, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
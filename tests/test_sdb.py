@@ -0,0 +1,82 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the raw SDB decoder (bridges/sdb.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakebus import FakeBus
+from sdbdata import ROOT, CHILD, ROOT_TABLE, CHILD_TABLE, TABLES, words
+from bridges.sdb import SDBCache, SDBDecoder, SDBInterconnect, SDBDevice, SDBBridge, SDBSynthesis
+
+
+class TestSDBDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.dec = SDBDecoder(TABLES)
+
+    def test_decode_record(self):
+        rec = SDBDecoder.decode_record(ROOT_TABLE, 2*SDBDecoder.RECORD_SIZE)
+        self.assertIsInstance(rec, SDBDevice)
+        self.assertEqual((rec.vendor_id, rec.device_id), (0x7501, 0xae5f))
+        self.assertEqual((rec.addr_first, rec.addr_end), (0x20700, 0x207ff))
+        self.assertEqual(rec.name.strip(), "WR-SPI-Flash-Upd")
+
+    def test_decode_table(self):
+        records = SDBDecoder.decode_table(ROOT_TABLE)
+        self.assertIsInstance(records[0], SDBInterconnect)
+        self.assertEqual(records[0].sdb_records, 5)
+        self.assertEqual([type(r) for r in records[1:]], [SDBDevice, SDBDevice, SDBBridge, SDBSynthesis])
+        syn = records[4]
+        self.assertEqual((syn.syn_name, syn.commit_id, syn.tool_name, syn.user_name),
+                         ("wr_len_top", "deadbeefcafe1234", "ISE", "mkauer"))
+
+    def test_bad_magic(self):
+        with self.assertRaises(ValueError):
+            SDBDecoder.decode_table(b"\0"*64 + ROOT_TABLE)
+
+    def test_walk(self):
+        items = [(rec.name.strip(), addr, buspath) for rec, addr, buspath in self.dec.walk(ROOT)]
+        self.assertEqual(items, [("WR-Periph-UART", 0x20500, "1"),
+                                 ("WR-SPI-Flash-Upd", 0x20700, "2"),
+                                 ("WB4-Bridge-GSI", 0x40000, "3"),
+                                 ("WB4-BlockRAM", 0x48000, "3.1")])
+
+    def test_missing_table(self):
+        with self.assertRaises(KeyError):
+            self.dec.table(0x10000)
+
+    def test_from_file(self):
+        image = bytearray(0x200)
+        image[0:len(CHILD_TABLE)] = CHILD_TABLE
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(image)
+            records = SDBDecoder.from_file(path, base=CHILD).table(CHILD)
+        finally:
+            os.remove(path)
+        self.assertEqual(records[1].name.strip(), "WB4-BlockRAM")
+
+    def test_from_cache(self):
+        # same tree as the one parsed from the bus
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "sdb_cache.json")
+            root = SDBCache(path).get(FakeBus(words(TABLES)), "udp/192.168.1.2")
+            dec = SDBDecoder.from_cache("udp/192.168.1.2", path)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual([(addr, path) for rec, addr, path in dec.walk(ROOT)],
+                         [(addr, path) for e, addr, path in root.walk()])
+
+
+if __name__ == '__main__':
+    unittest.main()
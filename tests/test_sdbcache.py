@@ -0,0 +1,112 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the persistent cache of the SDB trees (bridges/sdb.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakebus import FakeBlockBus
+from sdbdata import ROOT, TABLES, OUTER, OUTER_TABLES, UART, words
+from bridges.sdb import SDBCache
+
+LUN = "udp/192.168.1.2"
+# date of the synthesis record (5th record of the root table)
+SYNTHESIS_DATE = ROOT + 4*64 + 44
+
+
+class TestSDBCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = SDBCache(os.path.join(self.dir, "sdb_cache.json"))
+        self.bus = FakeBlockBus(words(TABLES))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reads(self):
+        n = len(self.bus.ops)
+        self.bus.ops = []
+        return n
+
+    def test_hit(self):
+        root = self.cache.get(self.bus, LUN)
+        self.assertEqual(root.base, ROOT)
+        self.assertGreater(self.reads(), 4)
+        cached = self.cache.get(self.bus, LUN)
+        # only the interconnect header and the synthesis commit/date are read back
+        self.assertEqual(self.bus.ops, [("blockread", ROOT, 16), ("blockread", ROOT+4*64+16, 8)])
+        self.assertEqual(cached.tables(), root.tables())
+        self.assertEqual(cached.findProduct(0xce42, 0x66cfeb52)[0][1], 0x48000)
+
+    def test_outdated(self):
+        self.cache.get(self.bus, LUN)
+        self.bus.mem[SYNTHESIS_DATE] = 0x20250101
+        self.reads()
+        root = self.cache.get(self.bus, LUN)
+        # validate() + the header of the last root + the full parse
+        self.assertEqual(self.bus.count("read"), 0)
+        self.assertEqual(self.bus.count("blockread"), 2 + 1 + 4)
+        self.assertEqual(root.elements[3][0].getTypedRecord().date, 0x20250101)
+        self.reads()
+        self.cache.get(self.bus, LUN)
+        self.assertEqual(self.reads(), 2) # the new tree was stored
+
+    def test_refresh(self):
+        self.cache.get(self.bus, LUN)
+        self.reads()
+        self.cache.get(self.bus, LUN, refresh=True)
+        # the header of the last root + the full parse
+        self.assertEqual(self.bus.count("blockread"), 1 + 4)
+
+    def test_invalidate(self):
+        self.cache.get(self.bus, LUN)
+        self.cache.get(self.bus, "udp/192.168.1.3")
+        self.cache.invalidate(LUN)
+        with open(self.cache.path) as f:
+            self.assertEqual(list(json.load(f)), ["udp/192.168.1.3"])
+        self.reads()
+        self.cache.get(self.bus, LUN)
+        # found with the root of the other device (see test_hint_table)
+        self.assertEqual(self.bus.count("blockread"), 1 + 4)
+        self.cache.invalidate()
+        with open(self.cache.path) as f:
+            self.assertEqual(json.load(f), {})
+
+    def test_hint_table(self):
+        # a new device with a known gateware is found without scan
+        self.cache.get(self.bus, LUN)
+        bus = FakeBlockBus(words(TABLES), unmapped=True)
+        root = self.cache.get(bus, "udp/192.168.1.3")
+        self.assertEqual(root.base, ROOT)
+        self.assertEqual(bus.count("read"), 0)
+        self.assertEqual(bus.ops[0], ("blockread", ROOT, 16))
+
+    def test_hint_table_nested(self):
+        # the root of the cached gateware holds a nested crossbar on this device
+        self.cache.get(self.bus, LUN)
+        bus = FakeBlockBus(words(OUTER_TABLES), unmapped=True)
+        root = self.cache.get(bus, "udp/192.168.1.3")
+        self.assertEqual(root.base, OUTER)
+        self.assertEqual(root.findProduct(*UART)[0][1:], (0x20500, "1.1"))
+        hints = self.cache.hints(bus, self.cache._load())
+        self.assertEqual(sorted(n.base for n in hints), [ROOT, OUTER])
+
+    def test_not_saved(self):
+        # the cache path can not be replaced: the temporary file is removed
+        os.mkdir(self.cache.path)
+        root = self.cache.get(self.bus, LUN)
+        self.assertEqual(root.base, ROOT)
+        self.assertEqual(os.listdir(self.dir), ["sdb_cache.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
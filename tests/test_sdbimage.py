@@ -0,0 +1,66 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the SDB image export and replay (bridges/sdbimage.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakebus import FakeBus
+from sdbdata import ROOT, CHILD, TABLES, BLOCKRAM, words
+from bridges.sdb import SDBNode
+from bridges.sdbimage import SDBImage
+from core.gendrvr import BusWarning
+
+
+class TestSDBImage(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.dir, "board.sdb.json")
+        self.root = SDBNode(FakeBus(words(TABLES)), ROOT)
+        self.root.parse(lazy=True)
+        SDBImage.export(self.root, self.fpath, "udp/192.168.1.2")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_export(self):
+        with open(self.fpath) as f:
+            image = json.load(f)
+        self.assertEqual((image["version"], image["lun"], image["root"]), (SDBImage.VERSION, "udp/192.168.1.2", ROOT))
+        # the placeholders are expanded before the export
+        self.assertEqual(sorted(int(addr, 0) for addr in image["tables"]), [CHILD, ROOT])
+        self.assertEqual(len(image["tree"]), 4)
+        self.assertTrue(image["tree"][3].startswith("3.1"))
+        self.assertTrue(image["tree"][3].endswith("WB4-BlockRAM"))
+
+    def test_replay(self):
+        bus = SDBImage(self.fpath)
+        self.assertEqual(bus.root, ROOT)
+        self.assertEqual(bus.read_many(range(ROOT, ROOT+8, 4)), [words(TABLES)[ROOT], words(TABLES)[ROOT+4]])
+        root = SDBNode(bus, None)
+        root.parse() # found by the scan
+        self.assertEqual(root.tables(), TABLES)
+        self.assertEqual(root.findProduct(*BLOCKRAM)[0][1], 0x48000)
+
+    def test_unmapped(self):
+        bus = SDBImage(self.fpath)
+        with self.assertRaises(BusWarning):
+            bus.read(0x20500)
+        with self.assertRaises(BusWarning):
+            bus.devblockread(0, ROOT+5*64-4, 8)
+        # the writes are kept in memory
+        bus.write(0x20500, 0x1234)
+        self.assertEqual(bus.read(0x20500), 0x1234)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the SDB tree parsed from the bus (bridges/sdb.py) on a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakebus import FakeBus, FakeBlockBus
+from sdbdata import ROOT, CHILD, TABLES, OUTER, OUTER_TABLES, UART, SPIFLASH, BLOCKRAM, words
+from bridges.sdb import SDBNode, SDBCache, SDBError, SDB_MAGIC
+from core.gendrvr import BusWarning
+
+
+class TestReadBlock(unittest.TestCase):
+
+    def test_block_read(self):
+        bus = FakeBlockBus(words(TABLES))
+        SDBNode(bus, ROOT).parse()
+        # interconnect + one block read for the records of each table
+        self.assertEqual(bus.ops, [("blockread", ROOT, 16), ("blockread", ROOT+64, 4*16),
+                                   ("blockread", CHILD, 16), ("blockread", CHILD+64, 16)])
+
+    def test_read_many(self):
+        bus = FakeBus(words(TABLES))
+        root = SDBNode(bus, ROOT)
+        root.parse()
+        self.assertEqual(bus.count("read_many"), 4)
+        self.assertEqual(bus.ops[1], ("read_many", list(range(ROOT+64, ROOT+5*64, 4))))
+        self.assertEqual([(addr, path) for e, addr, path in root.walk()],
+                         [(0x20500, "1"), (0x20700, "2"), (0x40000, "3"), (0x48000, "3.1")])
+
+    def test_bus_error(self):
+        # a NameError raised by the driver is not taken for a missing block read
+        bus = FakeBlockBus(words(TABLES))
+        def broken(*args):
+            raise NameError("broken driver")
+        bus.devblockread = broken
+        with self.assertRaises(NameError):
+            SDBNode(bus, ROOT).parse()
+        self.assertEqual(bus.ops, [])
+
+
+class TestScan(unittest.TestCase):
+
+    def test_hint(self):
+        bus = FakeBus(words(TABLES), unmapped=True)
+        last = SDBNode(bus, ROOT)
+        last.parse()
+        node = SDBNode(bus, None)
+        self.assertEqual(node.scan(hints=[last]), ROOT)
+        # only the interconnect record of the hint is read
+        self.assertEqual((node.probes, node.failures), (1, 0))
+
+    def test_scan(self):
+        bus = FakeBus({0x0E000000: SDB_MAGIC}, unmapped=True)
+        node = SDBNode(bus, None)
+        self.assertEqual(node.scan(), 0x0E000000)
+        # the 15 addresses of the first level and 15 of the second one
+        self.assertEqual((node.probes, node.failures), (30, 29))
+
+    def test_nested_at_hint(self):
+        # 0x30000 holds a nested crossbar, the root is found by the scan
+        bus = FakeBus(words(OUTER_TABLES), unmapped=True)
+        self.assertEqual(SDBNode(bus, None).scan(), OUTER)
+        # a tree learned on a design with the root at 0x30000 is not taken
+        last = SDBNode(FakeBus(words(TABLES)), ROOT)
+        last.parse()
+        last.bus = bus
+        node = SDBNode(bus, None)
+        self.assertEqual(node.scan(hints=[last]), OUTER)
+        node.parse()
+        self.assertEqual([(addr, path) for e, addr, path in node.findProduct(*UART)], [(0x20500, "1.1")])
+
+    def test_not_found(self):
+        bus = FakeBus(unmapped=True)
+        node = SDBNode(bus, None)
+        with self.assertRaises(SDBError) as ctx:
+            node.scan(mask=0x1000)
+        self.assertEqual(node.probes, node.failures)
+        self.assertIn("after %d probes (%d failed)" % (node.probes, node.failures), str(ctx.exception))
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBus(words(TABLES))
+        self.root = SDBNode(self.bus, ROOT)
+        self.root.parse()
+        self.bus.ops = []
+
+    def test_find_product(self):
+        prods = self.root.findProduct(*BLOCKRAM)
+        self.assertEqual([(addr, path) for e, addr, path in prods], [(0x48000, "3.1")])
+        self.assertEqual(self.root.findProduct(*SPIFLASH, first=True)[0][1], 0x20700)
+        self.assertEqual(self.root.findProduct(0x1, 0x2), [])
+        # appended to the given list
+        prods = self.root.findProduct(*UART, prods=prods)
+        self.assertEqual([addr for e, addr, path in prods], [0x48000, 0x20500])
+        self.assertEqual(self.bus.ops, [])
+
+    def test_same_as_walk(self):
+        # the index gives the result of a walk of the tree
+        self.root.index = None
+        self.assertEqual([addr for e, addr, path in self.root.findProduct(*BLOCKRAM)], [0x48000])
+
+    def test_find_address(self):
+        self.assertEqual(self.root.findAddress(0x20500)[1:], (0x20500, "1"))
+        self.assertEqual(self.root.findAddress(0x207ff)[1:], (0x20700, "2"))
+        self.assertEqual(self.root.findAddress(0x4bfff)[1:], (0x48000, "3.1"))
+        for addr in (0x0, 0x20600, 0x4c000, 0xFFFFFFFF):
+            self.assertIsNone(self.root.findAddress(addr))
+        self.assertEqual(self.bus.ops, [])
+
+
+class TestLazy(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBus(words(TABLES), unmapped=True)
+        self.root = SDBNode(self.bus, ROOT)
+        self.root.parse(lazy=True)
+
+    def test_placeholder(self):
+        self.assertEqual(self.bus.count("read_many"), 2) # root table only
+        child = self.root.elements[2][1]
+        self.assertTrue(child.placeholder)
+        self.assertFalse(self.root.is_expanded())
+        self.assertIsNone(self.root.index)
+
+    def test_first_match(self):
+        # the walk stops at the UART: the nested crossbar is not read
+        self.assertEqual(self.root.findProduct(*UART, first=True)[0][1], 0x20500)
+        self.assertEqual(self.bus.count("read_many"), 2)
+        self.assertEqual(self.root.findProduct(*BLOCKRAM)[0][1:], (0x48000, "3.1"))
+        self.assertEqual(self.bus.count("read_many"), 4)
+        self.assertTrue(self.root.is_expanded())
+        # expanded once
+        self.root.findProduct(*BLOCKRAM)
+        self.assertEqual(self.bus.count("read_many"), 4)
+
+    def test_expand_error(self):
+        mem = dict(self.bus.mem)
+        for addr in range(CHILD, CHILD+2*64, 4):
+            del self.bus.mem[addr]
+        with self.assertRaises(BusWarning):
+            self.root.findProduct(*BLOCKRAM)
+        child = self.root.elements[2][1]
+        self.assertTrue(child.placeholder)
+        self.assertEqual(child.elements, [])
+        self.bus.mem = mem
+        self.assertEqual(len(self.root.findProduct(*BLOCKRAM)), 1)
+
+    def test_cache(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            cache = SDBCache(os.path.join(tmp, "sdb_cache.json"))
+            root = cache.get(self.bus, "udp/192.168.1.2", lazy=True)
+            self.assertFalse(root.is_expanded())
+            root.findProduct(*BLOCKRAM)
+            # the expanded tree is stored and used by the next get()
+            self.bus.ops = []
+            cached = cache.get(self.bus, "udp/192.168.1.2", lazy=True)
+            self.assertTrue(cached.is_expanded())
+            self.assertEqual(cached.findProduct(*BLOCKRAM)[0][1], 0x48000)
+            self.assertEqual(self.bus.count("read_many"), 2) # validate() only
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
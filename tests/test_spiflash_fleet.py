@@ -0,0 +1,92 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the SPI Flash update of several boards (periph/spiflash_fleet.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fakebus import FakeBlockBus, FakeSession
+from flashsim import FlashSim
+from sdbdata import TABLES, words
+from bridges.sdb import SDBCache
+from periph.ipc_spiflash import FlashImage
+from periph.spiflash_fleet import SpiFlashFleet
+
+
+class TestSpiFlashFleet(unittest.TestCase):
+
+    IPS = ["192.168.7.10", "192.168.7.11", "192.168.7.12", "192.168.7.13"]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patch = mock.patch.object(SDBCache, "PATH", os.path.join(self.dir, "sdb_cache.json"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.words = list(range(0x100, 0x100+1000))
+        self.image = FlashImage.from_packets([self.words])
+        self.sims = {}
+        buses = {}
+        for ip in self.IPS[:3]: # the last board does not answer
+            bus = FakeBlockBus(words(TABLES))
+            self.sims[ip] = FlashSim(bus, nwords=len(self.words))
+            buses["udp/"+ip] = bus
+        self.sims[self.IPS[2]].error = True
+        self.session = FakeSession(buses)
+        self.states = dict((ip, []) for ip in self.IPS)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def progress(self, job):
+        self.states[job.ip].append(job.state)
+
+    def test_update(self):
+        fleet = SpiFlashFleet(self.IPS, self.image, workers=4, session=self.session, progress=self.progress)
+        jobs = fleet.run()
+        self.assertEqual([job.ip for job in jobs], self.IPS)
+        self.assertEqual([job.state for job in jobs], ["ok", "ok", "failed", "failed"])
+        for ip in self.IPS[:2]:
+            self.assertEqual(self.states[ip], ["open", "erase", "program", "done", "ok"])
+            self.assertEqual(self.sims[ip].flash, self.words)
+            self.assertEqual(len(self.sims[ip].iprog), 8) # rebooted
+        # an error of the core is raised while waiting DONE
+        self.assertEqual(self.states[self.IPS[2]][-2:], ["done", "failed"])
+        self.assertEqual(self.states[self.IPS[3]], ["open", "failed"])
+        self.assertEqual(jobs[0].words, len(self.words))
+        self.assertIn("Erase OK", jobs[0].messages)
+        self.assertEqual(set(self.session.refs.values()), {0})
+        summary = fleet.summary()
+        self.assertEqual(summary[-1], "4 boards, 2 failed")
+        self.assertTrue(summary[0].startswith("%-15s ok" % self.IPS[0]))
+
+    def test_image_parsed_once(self):
+        mcs = os.path.join(self.dir, "a.mcs")
+        with open(mcs, "w") as f:
+            f.write(":020000040000FA\n:0400000001020304F2\n:00000001FF\n")
+        with mock.patch.object(FlashImage, "CACHE_DIR", os.path.join(self.dir, "cache")):
+            fleet = SpiFlashFleet(self.IPS[:2], mcs, session=self.session)
+        self.assertEqual([list(p) for p in fleet.image.packets()], [[0x01020304]])
+        for ip in self.IPS[:2]:
+            self.sims[ip].nwords = 1
+        self.assertEqual([job.state for job in fleet.run()], ["ok", "ok"])
+        self.assertEqual([self.sims[ip].flash for ip in self.IPS[:2]], [[0x01020304]]*2)
+
+    def test_check_id(self):
+        fleet = SpiFlashFleet(self.IPS[:1], mode="cido", session=self.session)
+        self.assertIsNone(fleet.image)
+        self.assertEqual(fleet.run()[0].state, "ok")
+        self.assertEqual(self.sims[self.IPS[0]].flash, [])
+        with self.assertRaises(ValueError):
+            SpiFlashFleet(self.IPS, mode="erase", session=self.session)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the stat sampling of several devices (core/telemetry.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fakebus import FakeBlockBus, FakeSession
+from sdbdata import TABLES, words
+from vuartsim import VUARTSim
+from test_wrstat import STAT_LEN
+
+try:
+    from bridges.VUART_bridge import VUART_bridge
+    from bridges.sdb import SDBCache
+    from core.telemetry import RingBuffer, WRTelemetry, NUMERIC_FIELDS
+    from core.p7sException import Error
+    from core.wrstat import parse_stat
+except ImportError: # pyserial is needed by ConsoleBridge
+    WRTelemetry = None
+
+
+def setUpModule():
+    if WRTelemetry is None:
+        raise unittest.SkipTest("pyserial not available")
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def test_wrap(self):
+        buf = RingBuffer(4)
+        for v in range(6):
+            buf.append(v)
+        self.assertEqual(len(buf), 4)
+        self.assertEqual(buf.values().tolist(), [2, 3, 4, 5])
+
+    def test_stats(self):
+        buf = RingBuffer(10)
+        for v in (4, None, 1, 3, 2):
+            buf.append(v)
+        st = buf.stats(percentiles=(0, 50, 90))
+        self.assertEqual((st["count"], st["min"], st["max"], st["mean"]), (4, 1, 4, 2.5))
+        self.assertEqual((st["p0"], st["p50"], st["p90"]), (1, 2.5, 3.7))
+        self.assertTrue(math.isnan(buf.values()[1]))
+
+    def test_empty(self):
+        st = RingBuffer(3).stats()
+        self.assertEqual(st, {"count": 0, "min": None, "max": None, "mean": None,
+                              "p50": None, "p90": None, "p99": None})
+
+
+class TestTelemetry(unittest.TestCase):
+
+    IPS = ["192.168.7.10", "192.168.7.11"]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patches = [mock.patch.object(SDBCache, "PATH", os.path.join(self.dir, "sdb_cache.json")),
+                   mock.patch.object(VUART_bridge, "MAX_TIMEOUT", 0.1)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        bus = FakeBlockBus(words(TABLES))
+        self.sim = VUARTSim(bus, commands={"stat": STAT_LEN.strip()})
+        # the second device does not answer
+        self.session = FakeSession({"udp/"+self.IPS[0]: bus})
+        self.tm = WRTelemetry(self.IPS, rate=100, size=8, metrics=("mu", "cko", "temp"), session=self.session)
+
+    def tearDown(self):
+        self.tm.close()
+        shutil.rmtree(self.dir)
+
+    def test_metrics(self):
+        self.assertNotIn("syncs", NUMERIC_FIELDS)
+        for metric in ("syncs", "ss"):
+            with self.assertRaises(Error):
+                WRTelemetry(self.IPS, metrics=("mu", metric), session=self.session)
+
+    def test_record(self):
+        self.tm.record(self.IPS[0], parse_stat("mu:10 cko:bad"), timestamp=5.0)
+        self.tm.record(self.IPS[0], None, timestamp=6.0)
+        bufs = self.tm.buffers[self.IPS[0]]
+        self.assertEqual(bufs["time"].values().tolist(), [5.0, 6.0])
+        self.assertEqual(bufs["mu"].values()[0], 10)
+        # not numeric or missing values are stored as NaN
+        self.assertTrue(math.isnan(bufs["cko"].values()[0]))
+        self.assertTrue(math.isnan(bufs["temp"].values()[0]))
+        self.assertEqual(self.tm.stats(self.IPS[0], "mu")["count"], 1)
+
+    def test_sample(self):
+        with self.assertRaises(Error):
+            self.tm.sample()
+        self.tm.open()
+        self.assertEqual(list(self.tm.open_errors), [self.IPS[1]])
+        self.tm.run(samples=3)
+        st = self.tm.stats(self.IPS[0], "mu")
+        self.assertEqual((st["count"], st["min"], st["max"]), (3, 735776, 735776))
+        self.assertEqual(self.tm.stats(self.IPS[0], "temp")["p50"], 52.625)
+        self.assertEqual(self.tm.errors, {self.IPS[0]: 0, self.IPS[1]: 3})
+        self.assertEqual(self.tm.stats(self.IPS[1], "mu")["count"], 0)
+        self.assertEqual(len(self.tm.buffers[self.IPS[1]]["time"]), 3)
+
+    def test_sample_error(self):
+        # a device raising an unexpected error does not stop the others
+        bus = FakeBlockBus(words(TABLES))
+        VUARTSim(bus, commands={"stat": STAT_LEN.strip()})
+        self.session.buses["udp/"+self.IPS[1]] = bus
+        self.tm.open()
+        self.assertEqual(self.tm.open_errors, {})
+        self.tm.vuarts[self.IPS[0]].sendCommand = mock.Mock(side_effect=ValueError("substring not found"))
+        self.tm.run(samples=2)
+        self.assertEqual(self.tm.errors, {self.IPS[0]: 2, self.IPS[1]: 0})
+        self.assertEqual(self.tm.stats(self.IPS[0], "mu")["count"], 0)
+        self.assertEqual(self.tm.stats(self.IPS[1], "mu")["count"], 2)
+
+    def test_csv(self):
+        self.tm.record(self.IPS[0], parse_stat("mu:10 cko:-2 temp:40.5"), timestamp=5.0)
+        self.tm.record(self.IPS[1], None, timestamp=5.0)
+        fpath = os.path.join(self.dir, "servo.csv")
+        self.tm.to_csv(fpath)
+        with open(fpath) as f:
+            self.assertEqual(f.read().splitlines(), ["ip,time,mu,cko,temp",
+                                                     "%s,5.000000,10,-2,40.5" % self.IPS[0],
+                                                     "%s,5.000000,,," % self.IPS[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
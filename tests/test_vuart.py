@@ -0,0 +1,139 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the Virtual UART driver (bridges/VUART_bridge.py) on a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+import time
+import unittest
+
+from fakebus import FakeBlockBus
+from vuartsim import VUARTSim, TX_REG, RX_REG
+
+try:
+    from bridges.VUART_bridge import VUART_bridge
+except ImportError: # pyserial is needed by ConsoleBridge
+    VUART_bridge = None
+
+TX_REG += 0x20500
+RX_REG += 0x20500
+
+
+def setUpModule():
+    if VUART_bridge is None:
+        raise unittest.SkipTest("pyserial not available")
+
+
+class VUARTTestCase(unittest.TestCase):
+    '''
+    VUART_bridge on a FakeBlockBus with the UART at 0x20500
+    '''
+
+    def setUp(self):
+        self.bus = FakeBlockBus()
+        self.sim = VUARTSim(self.bus, commands={"ver": "wrc 4.2", "stat": "lnk:1 rx:12 tx:12"})
+        self.vuart = VUART_bridge("eth", "192.168.1.2")
+        self.vuart.bus = self.bus
+        self.vuart.VUART_OFFSET = 0x20500
+
+
+class TestTransmit(VUARTTestCase):
+
+    def test_ready_read_with_write(self):
+        self.assertTrue(self.vuart.transmit(bytearray(b"stat\r")))
+        # the ready bit is read once before the command and after each write
+        ops = [("read", TX_REG)]
+        for b in b"stat":
+            ops += [("write", TX_REG, b), ("read", TX_REG)]
+        ops.append(("write", TX_REG, ord("\r")))
+        self.assertEqual(self.bus.ops, ops)
+        self.sim.flush()
+        self.assertEqual(self.sim.sent, b"stat\r")
+
+    def test_no_byte_lost(self):
+        # the LM32 takes each byte after a few polls of the ready bit
+        self.sim.tx_busy = 3
+        data = bytearray(b"sfp add AXGE-1254-0531 1 46407 167843 -73622176\r")
+        self.assertTrue(self.vuart.transmit(data))
+        self.sim.flush()
+        self.assertEqual(self.sim.lost, b"")
+        self.assertEqual(self.sim.sent, data)
+        # the ready bit is polled again while the LM32 has not taken a byte
+        self.assertEqual(self.bus.count("read"), 1+(self.sim.tx_busy+1)*(len(data)-1))
+
+    def test_not_ready(self):
+        self.sim.ready = False
+        self.vuart.MAX_TIMEOUT = 0.05
+        self.assertFalse(self.vuart.transmit(bytearray(b"ver\r")))
+        self.assertEqual(self.bus.count("write"), 0)
+        self.assertEqual(self.vuart.sendCommand("ver"), self.vuart.NOT_READY)
+
+
+class TestReceive(VUARTTestCase):
+
+    def test_empty(self):
+        self.assertEqual(self.vuart.receive(), b"")
+        self.assertEqual(self.bus.ops, [("read", RX_REG)])
+
+    def test_drain(self):
+        self.sim.rx += bytes(range(32, 127))
+        self.assertEqual(self.vuart.receive(), bytes(range(32, 127)))
+        # the first read gives the count, the others are read with one block read
+        self.assertEqual(self.bus.ops, [("read", RX_REG), ("blockread", RX_REG, 126-32)])
+        self.assertEqual(self.sim.rx, b"")
+
+    def test_received_meanwhile(self):
+        self.sim.rx += b"0123456789"
+        read = self.sim._rx_read
+        def rx_read():
+            if self.sim.rx == b"9":
+                self.sim.rx += b"abc" # arrive while the block is read
+            return read()
+        self.bus.hooks[RX_REG] = (rx_read, None)
+        self.assertEqual(self.vuart.receive(), b"0123456789abc")
+        self.assertEqual(self.bus.ops, [("read", RX_REG), ("blockread", RX_REG, 9), ("blockread", RX_REG, 3)])
+
+
+class TestReadUntil(VUARTTestCase):
+
+    def test_command(self):
+        self.assertEqual(self.vuart.sendCommand("stat"), "lnk:1 rx:12 tx:12")
+        self.assertEqual(self.vuart.sendCommand("ver"), "wrc 4.2")
+        self.assertEqual(self.vuart.sendCommand("init erase"), "")
+        self.assertEqual(self.sim.sent, b"stat\rver\rinit erase\r")
+
+    def test_split_prompt(self):
+        # the prompt is found when it comes in several reads
+        chunks = [b"gui\r\nline1\r\nw", b"r", b"c# "]
+        read = self.sim._rx_read
+        def rx_read():
+            if not self.sim.rx and chunks:
+                self.sim.rx += chunks.pop(0)
+                return 0
+            return read()
+        self.bus.hooks[RX_REG] = (rx_read, None)
+        self.assertEqual(self.vuart.read_until(b"wrc#", timeout=5), b"gui\r\nline1\r\nwrc# ")
+        self.assertEqual(chunks, [])
+
+    def test_deadline(self):
+        self.sim.rx += b"partial output"
+        start = time.time()
+        self.assertEqual(self.vuart.read_until(b"wrc#", timeout=0.2), b"partial output")
+        elapsed = time.time()-start
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 1)
+        # the polls are spaced up to VUART_POLL_MAX
+        self.assertLess(self.bus.count("read"), 0.2/self.vuart.VUART_POLL_MIN)
+
+    def test_no_prompt(self):
+        # the whole output is returned when the prompt does not come
+        self.vuart.MAX_TIMEOUT = 0.1
+        self.sim.PROMPT = b""
+        self.assertEqual(self.vuart.sendCommand("stat"), "stat\r\nlnk:1 rx:12 tx:12\r\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the register helpers of core/wbtree.py on a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+import unittest
+from unittest import mock
+
+from fakebus import FakeBus, FakeBlockBus
+from core.wbtree import WBOperator, WBPeriph, WBField
+
+
+class TestShadow(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBus({0x100: 1, 0x104: 2, 0x108: 3})
+        self.op = WBOperator(self.bus)
+        self.op.base_addr = 0x100
+
+    def test_volatile(self):
+        self.assertEqual(self.op.get_policy(0x0), WBOperator.VOLATILE)
+        self.op.read(0x0)
+        self.op.read(0x0)
+        self.op.wr_rfld(0x0, 1, 4)
+        self.assertEqual(self.bus.ops, [("read", 0x100), ("read", 0x100), ("read", 0x100),
+                                        ("write", 0x100, 0x11)])
+
+    def test_cached(self):
+        self.op.set_policy(0x4, WBOperator.CACHED, ttl=10)
+        with mock.patch("core.wbtree._monotonic", return_value=1000.0):
+            self.assertEqual(self.op.read(0x4), 2)
+            self.bus.mem[0x104] = 5
+            self.assertEqual(self.op.read(0x4), 2) # from the shadow
+            self.op.wr_rfld(0x4, 1, 8) # read-modify-write without read
+        self.assertEqual(self.bus.ops, [("read", 0x104), ("write", 0x104, 0x102)])
+        # the written value is cached, until the ttl expires
+        with mock.patch("core.wbtree._monotonic", return_value=1009.0):
+            self.assertEqual(self.op.read(0x4), 0x102)
+        with mock.patch("core.wbtree._monotonic", return_value=1011.0):
+            self.assertEqual(self.op.read(0x4), 0x102)
+        self.assertEqual(self.bus.count("read"), 2)
+
+    def test_cached_read_many(self):
+        self.op.set_policy(0x0, WBOperator.CACHED)
+        self.op.read(0x0)
+        self.assertEqual(self.op.read_many([0x0, 0x4, 0x8]), [1, 2, 3])
+        self.assertEqual(self.bus.ops[-1], ("read_many", [0x104, 0x108]))
+
+    def test_shadowed(self):
+        self.op.set_policy(0x0, WBOperator.SHADOWED, value=0x10)
+        self.op.set_policy(0x8, WBOperator.SHADOWED)
+        self.op.wr_rfld(0x0, 1, 0)
+        self.op.wr_rfld(0x0, 1, 1)
+        self.op.write_many([(0x8, 7), (0x4, 9)])
+        self.assertEqual(self.op.rd_rfld(0x0, 0, 8), 0x13)
+        # only the VOLATILE register went to the bus
+        self.assertEqual(self.bus.ops, [("write_many", [(0x104, 9)])])
+        self.assertEqual(self.op.flush(), 2)
+        self.assertEqual(self.bus.ops[-1], ("write_many", [(0x100, 0x13), (0x108, 7)]))
+        self.assertEqual(self.op.flush(), 0)
+        self.assertEqual(len(self.bus.ops), 2)
+
+    def test_invalidate(self):
+        self.op.set_policy(0x0, WBOperator.CACHED)
+        self.op.set_policy(0x4, WBOperator.CACHED)
+        self.op.set_policy(0x8, WBOperator.SHADOWED, value=0x30)
+        self.op.read_many([0x0, 0x4])
+        self.bus.mem.update({0x100: 10, 0x104: 20})
+        self.op.invalidate(0x0)
+        self.assertEqual(self.op.read_many([0x0, 0x4]), [10, 2])
+        self.op.invalidate()
+        self.assertEqual(self.op.read_many([0x0, 0x4, 0x8]), [10, 20, 0x30])
+        # a SHADOWED register is never read back
+        self.assertNotIn(("read", 0x108), self.bus.ops)
+        self.assertEqual(self.bus.count("read_many"), 3)
+
+    def test_bad_policy(self):
+        with self.assertRaises(ValueError):
+            self.op.set_policy(0x0, 3)
+
+
+class TestTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBlockBus({0x200: 0xFF000000, 0x204: 0, 0x208: 0, 0x210: 0})
+        self.prh = WBPeriph(self.bus, 0x200, "test")
+        self.prh.append(WBField(self.prh, 0x0, "ENA", 0))
+        self.prh.append(WBField(self.prh, 0x0, "MODE", 1, 3))
+        self.prh.append(WBField(self.prh, 0x4, "LOW", 0, 16))
+        self.prh.append(WBField(self.prh, 0x6, "HIGH", 0, 16))
+        self.prh.append(WBField(self.prh, 0x8, "CNT", 0, 32))
+        self.prh.append(WBField(self.prh, 0x10, "CTRL", 0, 8))
+
+    def test_duplicated_field(self):
+        with self.assertRaises(NameError):
+            self.prh.append(WBField(self.prh, 0x0, "ENA", 4))
+
+    def test_field(self):
+        self.prh.wr_field("MODE", 5)
+        self.assertEqual(self.bus.mem[0x200], 0xFF00000A)
+        self.assertEqual(self.prh.rd_field("MODE"), 5)
+        self.assertEqual(self.prh.rd_field("ENA"), 0)
+
+    def test_coalesce(self):
+        with self.prh.transaction():
+            self.prh.wr_field("ENA", 1)
+            self.prh.wr_field("MODE", 3)
+            self.assertEqual(self.prh.rd_field("MODE"), 3) # not yet written
+            self.assertEqual(self.bus.ops, [])
+        # the partial register is read once and written once
+        self.assertEqual(self.bus.ops, [("read_many", [0x200]), ("write_many", [(0x200, 0xFF000007)])])
+
+    def test_full_registers(self):
+        with self.prh.transaction():
+            self.prh.wr_field("LOW", 0x1234)
+            self.prh.wr_field("HIGH", 0x5678)
+            self.prh.wr_field("CNT", 42)
+            self.prh.wr_field("CTRL", 9)
+        # fully covered registers are not read, contiguous ones go in a block
+        self.assertEqual(self.bus.ops, [("read_many", [0x210]),
+                                        ("blockwrite", 0x204, [0x56781234, 42]),
+                                        ("write_many", [(0x210, 9)])])
+
+    def test_no_block_write(self):
+        self.prh.bus = bus = FakeBus(self.bus.mem)
+        with self.prh.transaction():
+            self.prh.wr_field("LOW", 1)
+            self.prh.wr_field("HIGH", 2)
+            self.prh.wr_field("CNT", 3)
+        self.assertEqual(bus.ops, [("write_many", [(0x204, 0x20001), (0x208, 3)])])
+
+    def test_exception(self):
+        with self.assertRaises(RuntimeError):
+            with self.prh.transaction():
+                self.prh.wr_field("CNT", 1)
+                raise RuntimeError()
+        self.assertEqual(self.bus.ops, [])
+        self.assertIsNone(self.prh.pending)
+
+    def test_field_policy(self):
+        self.prh.append(WBField(self.prh, 0x20, "GO", 0, policy=WBOperator.SHADOWED))
+        self.prh.append(WBField(self.prh, 0x20, "RST", 1, policy=WBOperator.CACHED))
+        # the most conservative policy of the fields is kept
+        self.assertEqual(self.prh.get_policy(0x20), WBOperator.CACHED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tests of the parser of the WRPC "stat" command (core/wrstat.py)
+
+@file
+@copyright LGPL v2.1
+'''
+
+import unittest
+
+from core.wrstat import parse_stat
+
+
+# Output of a WR-LEN in slave mode (one port, no port name)
+STAT_LEN = ("WR_SLAVE_WR1 lnk:1 rx:3954 tx:3958 lock:1 sv:1 ss:'TRACK_PHASE' aux:0 sec:1489 "
+            "nsec:123406968 mu:735776 dms:367888 dtxm:227379 drxm:221063 dtxs:227379 "
+            "drxs:221063 asym:0 crtt:59813 cko:2 setp:16207 hd:64262 md:25367 ad:65535 "
+            "temp:52.625 C\r\n")
+
+# Output with a line by port
+STAT_PORTS = ("wr0 -> lnk:1 rx:1021 tx:1030 lock:1 \r\n"
+              "wr1: lnk:0 rx:0 tx:12 lock:0 \r\n"
+              "sv:1 ss:'TRACK_PHASE' mu:735776 cko:-3 setp:16207 temp:41.250 C\r\n")
+
+
+class TestParseStat(unittest.TestCase):
+
+    def test_len_output(self):
+        st = parse_stat(STAT_LEN)
+        self.assertEqual(st.mode, "WR_SLAVE_WR")
+        self.assertEqual(st.ss, "TRACK_PHASE")
+        self.assertEqual((st.mu, st.dms, st.crtt, st.cko, st.setp), (735776, 367888, 59813, 2, 16207))
+        self.assertEqual(st.temp, 52.625)
+        self.assertEqual(st.ports["wr0"], (1, 3954, 3958, 1))
+        self.assertEqual(st.fields["nsec"], 123406968)
+
+    def test_port_names(self):
+        st = parse_stat(STAT_PORTS)
+        self.assertEqual(sorted(st.ports), ["wr0", "wr1"])
+        self.assertEqual(st.ports["wr0"], (1, 1021, 1030, 1))
+        self.assertEqual(st.ports["wr1"], (0, 0, 12, 0))
+        self.assertEqual(st.cko, -3)
+        self.assertIsNone(st.mode)
+
+    def test_port_prefix_in_token(self):
+        st = parse_stat("wr0->lnk:1 rx:5 wr1->lnk:0 rx:7")
+        self.assertEqual(st.ports["wr0"].rx, 5)
+        self.assertEqual(st.ports["wr1"], (0, 7, None, None))
+        self.assertNotIn("wr0->lnk", st.fields)
+
+    def test_mode_and_port_tokens(self):
+        st = parse_stat("mode:WR_MASTER_WR1x wr12:lnk:1 wrx:3 ss:'TRACK_PHASE'")
+        self.assertEqual(st.mode, "WR_MASTER_WR")
+        self.assertEqual(st.ports["wr12"].lnk, 1)
+        # "wrx" is not a port name
+        self.assertEqual(st.fields["wrx"], 3)
+
+    def test_empty_output(self):
+        st = parse_stat("")
+        self.assertEqual(st.ports, {})
+        self.assertIsNone(st.mu)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+WRPC console behind the Virtual UART registers of a FakeBus
+
+@file
+@copyright LGPL v2.1
+'''
+
+# Registers of the Virtual UART (see VUART_bridge)
+TX_REG = 0x10
+RX_REG = 0x14
+RDY_MSK = 0x100
+
+
+class VUARTSim(object):
+    '''
+    Answers the commands written to the TX register with the output of the
+    WRPC console (echo of the command, output and prompt) in the RX FIFO
+
+    Attributes:
+        commands (dict) : command -> output (str or function returning a str)
+        ready (bool) : value of the ready bit of the TX register
+        tx_busy (int) : reads of the TX register before the LM32 takes the
+        byte of the holding register (the ready bit is clear meanwhile)
+        sent (bytearray) : all the bytes taken from the TX register
+        lost (bytearray) : bytes written while the holding register was full
+        rx (bytearray) : characters waiting in the RX FIFO
+    '''
+
+    PROMPT = b"wrc# "
+
+    def __init__(self, bus, base=0x20500, commands=None):
+        self.commands = dict(commands or {})
+        self.ready = True
+        self.tx_busy = 0
+        self.tx_hold = None
+        self.tx_wait = 0
+        self.sent = bytearray()
+        self.lost = bytearray()
+        self.line = bytearray()
+        self.rx = bytearray()
+        bus.hooks[base+TX_REG] = (self._tx_read, self._tx_write)
+        bus.hooks[base+RX_REG] = (self._rx_read, None)
+
+    def _tx_read(self):
+        if self.tx_hold is not None:
+            if self.tx_wait > 0:
+                self.tx_wait -= 1
+                return 0
+            c, self.tx_hold = self.tx_hold, None
+            self._take(c)
+        return RDY_MSK if self.ready else 0
+
+    def _tx_write(self, value):
+        if self.tx_hold is not None:
+            self.lost.append(value & 0xFF)
+            return
+        self.tx_hold = value & 0xFF
+        self.tx_wait = self.tx_busy
+
+    def flush(self):
+        '''Let the LM32 take the byte left in the holding register'''
+        if self.tx_hold is not None:
+            c, self.tx_hold = self.tx_hold, None
+            self._take(c)
+
+    def _take(self, c):
+        self.sent.append(c)
+        if c == 0x1b: # ESC: stops the periodic commands
+            self.rx += b"\r\n" + self.PROMPT
+        elif c != ord("\r"):
+            self.line.append(c)
+        else:
+            cmd = self.line.decode()
+            self.line = bytearray()
+            out = self.commands.get(cmd, "")
+            if callable(out):
+                out = out()
+            self.rx += cmd.encode() + b"\r\n" + (out.encode() + b"\r\n" if out else b"") + self.PROMPT
+
+    def _rx_read(self):
+        self.flush()
+        if not self.rx:
+            return 0
+        count = len(self.rx)
+        c = self.rx.pop(0)
+        return RDY_MSK | (count << 9) | c
@@ -0,0 +1,100 @@
+#!   /usr/bin/env   python
+#    coding: utf8
+'''
+Tool for recording the WR servo parameters of several devices through virtual UART.
+
+@file
+@copyright LGPL v2.1
+@ingroup tools
+'''
+
+
+#------------------------------------------------------------------------------|
+#                   GNU LESSER GENERAL PUBLIC LICENSE                          |
+#                 ------------------------------------                         |
+# This source file is free software; you can redistribute it and/or modify it  |
+# under the terms of the GNU Lesser General Public License as published by the |
+# Free Software Foundation; either version 2.1 of the License, or (at your     |
+# option) any later version. This source is distributed in the hope that it    |
+# will be useful, but WITHOUT ANY WARRANTY; without even the implied warrant   |
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser   |
+# General Public License for more details. You should have received a copy of  |
+# the GNU Lesser General Public License along with this  source; if not,       |
+# download it from http://www.gnu.org/licenses/lgpl-2.1.html                   |
+#------------------------------------------------------------------------------|
+
+# Imports
+import argparse as arg
+import sys
+
+from core.telemetry import WRTelemetry, METRICS
+from core.tools import load_ips
+from core.p7sException import Error
+
+
+def main():
+    '''
+    Tool for sampling the stat command of a list of WR-LEN.
+    '''
+
+    parser = arg.ArgumentParser(description='Record the servo parameters of several WR-LEN')
+
+    parser.add_argument('IP', type=str, nargs='*', help='IP of the devices')
+    parser.add_argument('--list','-l',help='File with the IP of the devices (one by line)')
+    parser.add_argument('--rate','-r',type=float, default=1.0, help='Samples per second')
+    parser.add_argument('--duration','-d',type=float, default=None,
+                        help='Seconds to record (ctrl-c to stop otherwise)')
+    parser.add_argument('--size','-s',type=int, default=3600,
+                        help='Number of samples kept for each metric')
+    parser.add_argument('--metrics','-m',default=",".join(METRICS),
+                        help='Comma separated list of stat fields to record')
+    parser.add_argument('--csv',help='Save the samples to a CSV file')
+    parser.add_argument('--npz',help='Save the samples to a numpy .npz file')
+    parser.add_argument('--refresh-sdb', action='store_true',
+                        help='Ignore the SDB cache and parse the devices again')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Verbose output')
+
+    args = parser.parse_args()
+
+    try:
+        ips = load_ips(args.IP, args.list)
+    except Error as e:
+        print("%s\n" % e.errmsg)
+        exit(1)
+
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    try:
+        tm = WRTelemetry(ips, rate=args.rate, size=args.size, metrics=metrics, verbose=args.verbose,
+                         sdb_refresh=args.refresh_sdb)
+    except Error as e:
+        print("%s\n" % e.errmsg)
+        exit(1)
+    tm.open()
+    for ip, e in tm.open_errors.items():
+        print("%s could not be opened: %s" % (ip, e))
+    try:
+        tm.run(duration=args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tm.close()
+
+    for ip in ips:
+        sys.stdout.write("\033[1m%s\033[0m (%d samples, %d errors)\n" % (ip, len(tm.buffers[ip]["time"]), tm.errors[ip]))
+        for m in metrics:
+            st = tm.stats(ip, m)
+            if st["count"] == 0:
+                print("  %-5s -" % m)
+                continue
+            print("  %-5s min %.0f max %.0f mean %.1f p50 %.0f p90 %.0f p99 %.0f" %
+                  (m, st["min"], st["max"], st["mean"], st["p50"], st["p90"], st["p99"]))
+    if args.csv:
+        tm.to_csv(args.csv)
+    if args.npz:
+        tm.to_npz(args.npz)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -55,10 +55,11 @@ def main():
     parser.add_argument('--lun','-l', help='Logical Unit (IP/Serial Port)', type=str, required=True)
     parser.add_argument('--input','-i', help='Input .ini file', type=str, required=True)
     parser.add_argument('--debug','-d', help='Enable debug output', action="store_true", default=False)
+    parser.add_argument('--refresh-sdb', help='Ignore the SDB cache and parse the device again (ethbone)', action="store_true", default=False)
     args = parser.parse_args()
 
     if args.bus == 'ethbone':
-        uart = VUART_bridge('eth', args.lun, args.debug)
+        uart = VUART_bridge('eth', args.lun, args.debug, sdb_refresh=args.refresh_sdb)
     else:
         uart = Serial_bridge(port="/dev/ttyUSB%s" % args.lun, verbose=args.debug)
     uart.open()